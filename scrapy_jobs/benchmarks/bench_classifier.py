@@ -0,0 +1,80 @@
+"""
+Benchmark the job category classifiers
+
+Compares jobs/sec and accuracy of the keyword matcher, the TF-IDF model one
+job at a time and the TF-IDF model on batches. Run from the Scrapy project
+directory:
+
+    python -m benchmarks.bench_classifier --jobs 20000
+    python -m benchmarks.bench_classifier --data labelled_jobs.csv
+"""
+
+import time
+import argparse
+
+from scrapy_jobs.classifier import JobCategoryClassifier, job_text, keyword_categories, load_training_data
+from benchmarks.synthetic import make_job_ads
+
+
+def timed(func, jobs):
+    started = time.perf_counter()
+    predictions = func()
+    elapsed = time.perf_counter() - started
+    return predictions, jobs / elapsed
+
+
+def accuracy(predictions, labels):
+    return sum(p == t for p, t in zip(predictions, labels)) / len(labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark job category classification')
+    parser.add_argument('--data', help='Labelled CSV or JSON lines file (default: synthetic ads)')
+    parser.add_argument('--jobs', type=int, default=20000, help='Number of synthetic ads to generate')
+    parser.add_argument('--batch-size', type=int, default=256, help='Batch size for vectorised inference')
+    args = parser.parse_args()
+    
+    if args.data:
+        texts, labels = load_training_data(args.data)
+    else:
+        ads = make_job_ads(args.jobs)
+        texts = [job_text(ad['title'], ad['description']) for ad in ads]
+        labels = [ad['category_id'] for ad in ads]
+    
+    split = int(len(texts) * 0.8)
+    train_texts, test_texts = texts[:split], texts[split:]
+    train_labels, test_labels = labels[:split], labels[split:]
+    
+    started = time.perf_counter()
+    classifier = JobCategoryClassifier.train(train_texts, train_labels)
+    print(f"Trained on {len(train_texts)} jobs in {time.perf_counter() - started:.1f}s, "
+          f"evaluating on {len(test_texts)}")
+    
+    def keyword_single():
+        return [keyword_categories([text])[0] for text in test_texts]
+    
+    def keyword_batched():
+        return keyword_categories(test_texts)
+    
+    def model_single():
+        return [classifier.predict([text])[0] for text in test_texts]
+    
+    def model_batched():
+        predictions = []
+        for start in range(0, len(test_texts), args.batch_size):
+            predictions.extend(classifier.predict(test_texts[start:start + args.batch_size]))
+        return predictions
+    
+    print(f"{'classifier':<28}{'jobs/sec':>12}{'accuracy':>10}")
+    for name, func in [
+        ('keywords, per job', keyword_single),
+        ('keywords, one pass', keyword_batched),
+        ('tf-idf model, per job', model_single),
+        (f'tf-idf model, batch {args.batch_size}', model_batched),
+    ]:
+        predictions, rate = timed(func, len(test_texts))
+        print(f"{name:<28}{rate:>12.0f}{accuracy(predictions, test_labels):>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
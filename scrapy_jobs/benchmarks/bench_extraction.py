@@ -0,0 +1,90 @@
+"""
+Extraction benchmarks: the single-scan ExtractionEngine against the
+pattern-by-pattern re.search loop it replaced
+
+Both run over the same corpus, and the engine must return exactly what the
+old loop did, so a faster combined regex can't quietly change which
+salary or company name a description yields.
+"""
+
+import re
+import random
+
+import pytest
+
+from scrapy_jobs.extraction import JOB_EXTRACTOR
+from benchmarks.synthetic import make_job_ads
+
+# The spider's extract_salary / extract_company_name patterns before the engine
+REFERENCE_SALARY_PATTERNS = [
+    r'R\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?(?:\s*[-–]\s*R?\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?)?(?:\s*per\s*month|pm|/month)?',
+    r'\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?\s*[-–]\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?(?:\s*per\s*month|pm)',
+    r'salary[:\s]*R?\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?',
+]
+REFERENCE_COMPANY_PATTERNS = [
+    r'Company[:\s]+([A-Za-z\s&]+)',
+    r'Employer[:\s]+([A-Za-z\s&]+)',
+    r'([A-Za-z\s&]+)\s+is\s+looking\s+for',
+    r'Join\s+([A-Za-z\s&]+)',
+    r'([A-Za-z\s&]+)\s+seeks?',
+]
+
+# Sentences mixed into descriptions so patterns of both fields compete in one text
+FRAGMENTS = [
+    'Company: Acme Holdings', 'Employer: Sun Foods', 'Bright Cleaning is looking for staff',
+    'Join our team today', 'Join Metro Retail', 'Kwazi Logistics seeks drivers', 'Salary: 4500',
+    'Salary R 6 500 per month', 'Bonus R 1 000', '4 500 - 6 000 pm', '12,500 - 14,000 per month',
+    'Hours 8-5', 'Call 082 555 1234', 'Start 1 March', 'Apply with CV', 'No experience needed',
+]
+
+CRAFTED_TEXTS = [
+    'Join our team today. Company: Acme Holdings.',
+    'Salary: 4500. Hours 8-5. Bonus R 1 000',
+    'Salary: R5000 - R6000 per month. Employer: Sun Foods & Sons',
+    'We are hiring. Pay 3 000 - 4 000 pm, salary 3500',
+]
+
+
+def reference_extract(text):
+    results = {}
+    for pattern in REFERENCE_SALARY_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            results['salary'] = match.group(0).strip()
+            break
+    for pattern in REFERENCE_COMPANY_PATTERNS:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            results['company'] = match.group(1).strip()
+            break
+    return results
+
+
+def engine_extract(text):
+    return {field: extraction.value for field, extraction in JOB_EXTRACTOR.scan(text).items()}
+
+
+@pytest.fixture(scope='module')
+def descriptions():
+    rng = random.Random(5)
+    texts = list(CRAFTED_TEXTS)
+    for ad in make_job_ads(2000, seed=5):
+        sentences = ad['description'].split('. ')
+        for fragment in rng.sample(FRAGMENTS, rng.randint(0, 4)):
+            sentences.insert(rng.randint(0, len(sentences)), fragment)
+        texts.append('. '.join(sentences))
+    return texts
+
+
+def bench_extraction_matches_reference(bench, descriptions):
+    mismatches = [
+        (text, reference_extract(text), engine_extract(text))
+        for text in descriptions if reference_extract(text) != engine_extract(text)
+    ]
+    assert not mismatches, f"{len(mismatches)} texts differ, e.g. {mismatches[0]}"
+    
+    bench('extraction/engine_scan', lambda text: len(JOB_EXTRACTOR.scan(text)) or 1, descriptions)
+
+
+def bench_extraction_reference(bench, descriptions):
+    bench('extraction/reference_search', lambda text: len(reference_extract(text)) or 1, descriptions)
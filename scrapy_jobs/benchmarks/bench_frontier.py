@@ -0,0 +1,96 @@
+"""
+Behaviour check for the shared frontier of a sharded crawl
+
+Two worker processes each run a ShardedScheduler against one SQLite
+frontier file, the way ``run_shards`` starts them, but feed it requests
+directly instead of running a crawl. Both discover the same URLs, so every
+URL goes through the hand-over between shards.
+"""
+
+import time
+import multiprocessing
+from types import SimpleNamespace
+
+from scrapy import Spider
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import Request
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from scrapy_jobs.frontier import SharedFrontier, ShardedScheduler
+
+URL_COUNT = 400
+
+
+def job_url(number):
+    return f'https://www.gumtree.co.za/a/job/{number % URL_COUNT}'
+
+
+def claim_urls(frontier_path, shards, shard_index, connection, timeout=60):
+    """Worker process: crawl like the engine would and send back the URLs this shard was given"""
+    crawler = SimpleNamespace(settings=Settings(), signals=SimpleNamespace(connect=lambda *args, **kwargs: None))
+    crawler.stats = MemoryStatsCollector(crawler)
+    spider = Spider(name='jobs')
+    spider.crawler = crawler
+    scheduler = ShardedScheduler(crawler, RFPDupeFilter(), frontier_path, shards, shard_index,
+                                 batch_size=16, flush_interval=0)
+    scheduler.open(spider)
+    # Both workers start from every URL, as if they had parsed the same listing pages
+    for number in range(URL_COUNT):
+        scheduler.enqueue_request(Request(job_url(number)))
+    
+    claimed = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        request = scheduler.next_request()
+        if request is not None:
+            claimed.append(request.url)
+            # Each page links to a couple of others, most of them owned by the other shard
+            number = int(request.url.rsplit('/', 1)[1])
+            for link in (number * 7 + 3, number + 1):
+                scheduler.enqueue_request(Request(job_url(link)))
+            continue
+        try:
+            scheduler.spider_idle(spider)
+        except DontCloseSpider:
+            time.sleep(0.01)
+            continue
+        break
+    else:
+        # Mark the timeout, so the check fails rather than waiting forever
+        claimed.append(None)
+    scheduler.close('finished')
+    connection.send(claimed)
+    connection.close()
+
+
+def bench_two_workers_claim_each_url_once(tmp_path):
+    frontier_path = str(tmp_path / 'frontier.sqlite')
+    shards = 2
+    # Register every worker before any of them can finish, as run_shards does
+    SharedFrontier(frontier_path, shards).close()
+    
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    for shard_index in range(shards):
+        connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(target=claim_urls, args=(frontier_path, shards, shard_index, child_connection))
+        process.start()
+        child_connection.close()
+        workers.append((process, connection))
+    claimed = []
+    for process, connection in workers:
+        claimed.append(connection.recv())
+        process.join()
+        assert process.exitcode == 0
+    
+    all_claimed = claimed[0] + claimed[1]
+    assert None not in all_claimed, 'a worker timed out waiting for the crawl to finish'
+    assert sorted(all_claimed) == sorted(job_url(number) for number in range(URL_COUNT))
+    # Both shards got a share of the work
+    assert claimed[0] and claimed[1]
+    frontier = SharedFrontier(frontier_path, shards)
+    assert not frontier.pending(0) and not frontier.pending(1)
+    assert frontier.is_finished()
+    frontier.close()
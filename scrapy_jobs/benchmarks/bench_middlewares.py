@@ -0,0 +1,348 @@
+"""
+Behaviour checks for the retry, rate limit and proxy middlewares
+
+These aren't timed: they drive HostTokenBucket, RetryMiddleware and
+ProxyMiddleware with a fake clock and a stand-in crawler, so the backoff
+schedule, AIMD rate changes and proxy handling can be checked without a
+reactor or a network.
+"""
+
+import random
+from types import SimpleNamespace
+from collections import Counter
+
+import pytest
+from scrapy import Spider
+from scrapy.exceptions import IgnoreRequest
+from scrapy.http import Request, Response
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+from twisted.internet.error import TimeoutError
+
+from scrapy_jobs.middlewares import HostTokenBucket, ProxyMiddleware, ProxyPool, RetryMiddleware
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+    
+    def __call__(self):
+        return self.now
+    
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def make_crawler(**settings):
+    crawler = SimpleNamespace(settings=Settings(settings), crawled=[])
+    crawler.stats = MemoryStatsCollector(crawler)
+    crawler.engine = SimpleNamespace(crawl=crawler.crawled.append)
+    return crawler
+
+
+def make_spider(crawler):
+    spider = Spider(name='jobs')
+    spider.crawler = crawler
+    return spider
+
+
+def make_retry_middleware(crawler, clock):
+    middleware = RetryMiddleware(crawler)
+    middleware.clock = clock
+    # Releases are driven by hand rather than by reactor timers
+    middleware.schedule_release = lambda: None
+    return middleware
+
+
+def send(middleware, request, spider):
+    """Run RetryMiddleware.process_request, which must not have to wait for a token"""
+    coroutine = middleware.process_request(request, spider)
+    with pytest.raises(StopIteration):
+        coroutine.send(None)
+
+
+def bench_token_bucket_paces_requests():
+    clock = FakeClock()
+    bucket = HostTokenBucket(rate=4.0, burst=4, clock=clock)
+    
+    assert [bucket.take() for _ in range(4)] == [0.0] * 4
+    assert bucket.take() == pytest.approx(0.25)
+    clock.advance(0.25)
+    assert bucket.take() == 0.0
+    # A long idle spell refills the bucket up to the burst, no further
+    clock.advance(60)
+    assert [bucket.take() for _ in range(5)] == [0.0] * 4 + [pytest.approx(0.25)]
+
+
+def bench_token_bucket_pause_sends_one_request_after():
+    clock = FakeClock()
+    bucket = HostTokenBucket(rate=4.0, burst=4, clock=clock)
+    
+    bucket.pause(10)
+    assert bucket.take() == pytest.approx(10)
+    clock.advance(10)
+    assert bucket.take() == 0.0
+    assert bucket.take() == pytest.approx(0.25)
+
+
+def bench_token_bucket_aimd():
+    clock = FakeClock()
+    bucket = HostTokenBucket(rate=4.0, min_rate=0.5, max_rate=10.0, increase=1.0, latency_factor=3.0, clock=clock)
+    
+    # Slow start until the first throttle
+    bucket.succeeded(0.1, clock())
+    assert bucket.rate == pytest.approx(4.5)
+    sent_at = clock()
+    clock.advance(1)
+    assert bucket.throttled(sent_at)
+    assert bucket.rate == pytest.approx(2.25)
+    # Responses to requests sent before that decrease don't halve the rate again
+    assert not bucket.throttled(sent_at)
+    assert bucket.rate == pytest.approx(2.25)
+    # Then additive increase: ``increase`` requests/s over a second's worth of responses
+    bucket.succeeded(0.1, clock())
+    assert bucket.rate == pytest.approx(2.25 + 1 / 2.25)
+    rate = bucket.rate
+    
+    # Latency well above its lowest counts as congestion
+    clock.advance(1)
+    bucket.succeeded(2.0, clock())
+    bucket.succeeded(2.0, clock())
+    assert bucket.rate == pytest.approx((rate + 1 / rate) / 2)
+    
+    for _ in range(10):
+        clock.advance(1)
+        bucket.throttled(clock())
+    assert bucket.rate == 0.5
+    bucket.rate = 9.9
+    bucket.succeeded(None, None)
+    assert bucket.rate == 10.0
+
+
+def bench_retry_backoff_schedule():
+    crawler = make_crawler(RETRY_BACKOFF_BASE=1.0, RETRY_BACKOFF_MAX=8.0, RETRY_AFTER_MAX=30.0)
+    middleware = make_retry_middleware(crawler, FakeClock())
+    
+    for _ in range(200):
+        # Exponential with jitter: between half and all of base * 2 ** (attempt - 1), up to the max
+        assert 0.5 <= middleware.backoff(1) <= 1.0
+        assert 2.0 <= middleware.backoff(3) <= 4.0
+        assert 4.0 <= middleware.backoff(10) <= 8.0
+        # Retry-After wins when longer, up to RETRY_AFTER_MAX
+        assert middleware.backoff(1, retry_after=20) == 20
+        assert middleware.backoff(1, retry_after=600) == 30
+        assert 2.0 <= middleware.backoff(3, retry_after=0.1) <= 4.0
+
+
+def bench_retry_delays_and_ignores_original():
+    crawler = make_crawler(RETRY_TIMES=3, RETRY_BACKOFF_BASE=1.0)
+    clock = FakeClock()
+    middleware = make_retry_middleware(crawler, clock)
+    spider = make_spider(crawler)
+    request = Request('https://www.gumtree.co.za/a/1')
+    send(middleware, request, spider)
+    
+    with pytest.raises(IgnoreRequest):
+        middleware.process_response(request, Response(request.url, status=503, request=request), spider)
+    assert crawler.crawled == []
+    [(due, _, retry_request)] = middleware.delayed
+    assert retry_request is not request
+    assert retry_request.url == request.url
+    assert retry_request.meta['retry_times'] == 1
+    assert 0.5 <= due - clock() <= 1.0
+    
+    # Nothing goes back to the scheduler before it is due
+    middleware.release()
+    assert crawler.crawled == []
+    clock.advance(1.0)
+    middleware.release()
+    assert crawler.crawled == [retry_request]
+    assert middleware.delayed == []
+    
+    # Due times, not arrival order, decide the release order
+    later = Request('https://www.gumtree.co.za/a/2', meta={'retry_times': 2})
+    sooner = Request('https://www.gumtree.co.za/a/3')
+    for failed in (later, sooner):
+        with pytest.raises(IgnoreRequest):
+            middleware.process_exception(failed, TimeoutError(), spider)
+    clock.advance(1.0)
+    middleware.release()
+    assert [retried.url for retried in crawler.crawled[1:]] == [sooner.url]
+    clock.advance(3.0)
+    middleware.release()
+    assert [retried.url for retried in crawler.crawled[1:]] == [sooner.url, later.url]
+    
+    # Once RETRY_TIMES is used up, the failure goes through
+    exhausted = Request('https://www.gumtree.co.za/a/4', meta={'retry_times': 3})
+    response = Response(exhausted.url, status=503, request=exhausted)
+    assert middleware.process_response(exhausted, response, spider) is response
+    assert crawler.stats.get_value('retry/max_reached') == 1
+    assert crawler.stats.get_value('retry/delayed') == 3
+
+
+def bench_retry_halves_host_rate_on_throttling():
+    crawler = make_crawler(RATE_LIMIT_START_RATE=8.0)
+    clock = FakeClock()
+    middleware = make_retry_middleware(crawler, clock)
+    spider = make_spider(crawler)
+    request = Request('https://www.gumtree.co.za/a/1')
+    send(middleware, request, spider)
+    other_host = Request('https://example.com/')
+    send(middleware, other_host, spider)
+    
+    clock.advance(1)
+    with pytest.raises(IgnoreRequest):
+        middleware.process_response(request, Response(request.url, status=429, request=request), spider)
+    assert middleware.buckets['www.gumtree.co.za'].rate == 4.0
+    assert middleware.buckets['example.com'].rate == 8.0
+    assert crawler.stats.get_value('ratelimit/throttled') == 1
+    
+    # A 404 isn't throttling or retried, and counts as a healthy response
+    response = Response(other_host.url, status=404, request=other_host)
+    assert middleware.process_response(other_host, response, spider) is response
+    assert middleware.buckets['example.com'].rate == 8.5
+
+
+def bench_429_throttles_host_not_proxy():
+    crawler = make_crawler(RETRY_AFTER_MAX=300.0)
+    clock = FakeClock()
+    retry_middleware = make_retry_middleware(crawler, clock)
+    pool = ProxyPool(['http://p1:8080', 'http://p2:8080'], max_failures=1, clock=clock)
+    proxy_middleware = ProxyMiddleware(pool, [403, 407], crawler.stats)
+    spider = make_spider(crawler)
+    
+    # Requests go out through RetryMiddleware (950) then ProxyMiddleware (960),
+    # responses come back the other way
+    request = Request('https://www.gumtree.co.za/a/1')
+    send(retry_middleware, request, spider)
+    proxy_middleware.process_request(request, spider)
+    proxy = pool.get(request.meta['proxy_pool_endpoint'])
+    response = Response(request.url, status=429, headers={'Retry-After': '120'}, request=request)
+    
+    assert proxy_middleware.process_response(request, response, spider) is response
+    assert proxy.quarantined_until == 0.0
+    assert proxy.failures_in_row == 0
+    assert crawler.stats.get_value('proxy/retries') is None
+    
+    with pytest.raises(IgnoreRequest):
+        retry_middleware.process_response(request, response, spider)
+    bucket = retry_middleware.buckets['www.gumtree.co.za']
+    assert bucket.take() == pytest.approx(120)
+    [(due, _, retry_request)] = retry_middleware.delayed
+    assert due - clock() == pytest.approx(120)
+    assert 'proxy_failed_endpoint' not in retry_request.meta
+
+
+def bench_proxy_pool_scores_health():
+    clock = FakeClock()
+    pool = ProxyPool(['http://fast:8080', 'http://slow:8080', 'http://flaky:8080'], clock=clock)
+    fast, slow, flaky = (pool.get(name) for name in ('fast:8080', 'slow:8080', 'flaky:8080'))
+    pool.succeeded(fast, 0.1)
+    pool.succeeded(slow, 1.0)
+    pool.succeeded(flaky, 0.1)
+    for _ in range(2):
+        pool.failed(flaky)
+    
+    assert fast.score(1.0) > flaky.score(1.0) > slow.score(1.0)
+    random.seed(23)
+    chosen = Counter(pool.choose().name for _ in range(2000))
+    assert chosen['fast:8080'] > chosen['flaky:8080'] > chosen['slow:8080'] > 0
+    
+    # A proxy without a latency yet is scored as average, so it gets tried
+    pool = ProxyPool(['http://fast:8080', 'http://new:8080'], clock=clock)
+    pool.succeeded(pool.get('fast:8080'), 0.2)
+    assert pool.get('new:8080').score(0.2) == pool.get('fast:8080').score(0.2)
+
+
+def bench_proxy_pool_quarantines_and_probation():
+    clock = FakeClock()
+    pool = ProxyPool(['http://p1:8080', 'http://p2:8080'], max_failures=3, quarantine_base=60.0,
+                     quarantine_max=200.0, probation_requests=2, clock=clock)
+    p1, p2 = pool.get('p1:8080'), pool.get('p2:8080')
+    
+    assert not pool.failed(p1)
+    assert not pool.failed(p1)
+    assert pool.failed(p1)
+    assert p1.quarantined_until == clock() + 60
+    assert all(pool.choose() is p2 for _ in range(50))
+    
+    # Back on probation, a single failure sends it straight back, for twice as long
+    clock.advance(60)
+    assert p1.probation
+    assert pool.failed(p1)
+    assert p1.quarantined_until == clock() + 120
+    clock.advance(120)
+    assert pool.banned(p1)
+    assert p1.quarantined_until == clock() + 200
+    
+    # With every proxy quarantined, the one back soonest is used
+    pool.banned(p2)
+    assert p2.quarantined_until < p1.quarantined_until
+    assert pool.choose() is p2
+    
+    # Passing probation restores full traffic and resets the backoff
+    clock.advance(200)
+    pool.succeeded(p1, 0.1)
+    assert p1.probation
+    pool.succeeded(p1, 0.1)
+    assert not p1.probation
+    assert p1.quarantines == 0
+
+
+def bench_proxy_pool_exclude():
+    pool = ProxyPool(['http://p1:8080', 'http://p2:8080', 'http://p3:8080'], clock=FakeClock())
+    
+    assert 'p1:8080' not in {pool.choose(exclude='p1:8080').name for _ in range(100)}
+    # The only proxy is still used when it is the one excluded
+    single = ProxyPool(['http://p1:8080'], clock=FakeClock())
+    assert single.choose(exclude='p1:8080').name == 'p1:8080'
+
+
+@pytest.mark.parametrize('status', [403, 407])
+def bench_proxy_ban_quarantines_and_retries_elsewhere(status):
+    crawler = make_crawler()
+    clock = FakeClock()
+    pool = ProxyPool(['http://user:secret@p1:8080', 'http://p2:8080', 'http://p3:8080'], clock=clock)
+    middleware = ProxyMiddleware(pool, [403, 407], crawler.stats, max_retry_times=2)
+    spider = make_spider(crawler)
+    
+    request = Request('https://www.gumtree.co.za/a/1')
+    middleware.process_request(request, spider)
+    failed = pool.get(request.meta['proxy_pool_endpoint'])
+    
+    retry_request = middleware.process_response(request, Response(request.url, status=status, request=request), spider)
+    assert retry_request.url == request.url
+    assert retry_request.dont_filter
+    assert failed.quarantined_until > clock()
+    assert crawler.stats.get_value(f'proxy/{failed.name}/bans') == 1
+    assert crawler.stats.get_value(f'proxy/{failed.name}/quarantines') == 1
+    
+    # The retry goes through another proxy, and credentials only go to the proxy they belong to
+    middleware.process_request(retry_request, spider)
+    chosen = pool.get(retry_request.meta['proxy_pool_endpoint'])
+    assert chosen is not failed
+    assert 'proxy_failed_endpoint' not in retry_request.meta
+    assert retry_request.meta['proxy'] == chosen.url
+    assert retry_request.headers.get('Proxy-Authorization') == chosen.credentials
+    
+    # Bans past PROXY_RETRY_TIMES are handed on as the response
+    retry_request.meta['proxy_retry_times'] = 2
+    response = Response(request.url, status=status, request=retry_request)
+    assert middleware.process_response(retry_request, response, spider) is response
+
+
+def bench_proxy_connection_errors_retry_elsewhere():
+    crawler = make_crawler()
+    pool = ProxyPool(['http://p1:8080', 'http://p2:8080'], max_failures=1, clock=FakeClock())
+    middleware = ProxyMiddleware(pool, [403, 407], crawler.stats)
+    spider = make_spider(crawler)
+    request = Request('https://www.gumtree.co.za/a/1')
+    middleware.process_request(request, spider)
+    
+    retry_request = middleware.process_exception(request, TimeoutError(), spider)
+    assert pool.get(request.meta['proxy_pool_endpoint']).quarantined_until > 0
+    middleware.process_request(retry_request, spider)
+    assert retry_request.meta['proxy_pool_endpoint'] != request.meta['proxy_pool_endpoint']
+    # IgnoreRequest (such as RetryMiddleware's delayed retries) isn't the proxy's fault
+    assert middleware.process_exception(retry_request, IgnoreRequest(), spider) is None
+    assert pool.get(retry_request.meta['proxy_pool_endpoint']).failures_in_row == 0
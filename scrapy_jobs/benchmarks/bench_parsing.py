@@ -0,0 +1,162 @@
+"""
+Parsing benchmarks: spider callbacks and item processors
+
+Each call builds a fresh HtmlResponse, so HTML parsing is part of the
+measured cost just as it is during a crawl. The ``records`` variants load
+slotted JobRecords (JOB_RECORDS_FAST_PATH) instead of JobItems.
+"""
+
+import tracemalloc
+
+import pytest
+from itemloaders import ItemLoader
+from scrapy.http import HtmlResponse, Request
+
+from scrapy_jobs.items import JobItem, JobRecordLoader
+from scrapy_jobs.spiders.gumtree_spider import GumtreeJobsSpider
+from benchmarks.synthetic import ad_path, make_job_ads, render_detail_page, render_listing_page
+
+BASE_URL = 'https://www.gumtree.co.za'
+ADS_PER_LISTING_PAGE = 20
+
+
+@pytest.fixture(scope='module')
+def spider():
+    return GumtreeJobsSpider()
+
+
+@pytest.fixture(scope='module')
+def record_spider():
+    spider = GumtreeJobsSpider()
+    spider.job_records = True
+    return spider
+
+
+@pytest.fixture(scope='module')
+def ads():
+    return make_job_ads(1000)
+
+
+@pytest.fixture(scope='module')
+def listing_pages(ads):
+    pages = []
+    for start in range(0, len(ads), ADS_PER_LISTING_PAGE):
+        page = start // ADS_PER_LISTING_PAGE + 1
+        html = render_listing_page(ads[start:start + ADS_PER_LISTING_PAGE], f'/s-jobs/v1c8p{page + 1}')
+        pages.append((f'{BASE_URL}/s-jobs/v1c8p{page}', html.encode('utf-8')))
+    return pages
+
+
+@pytest.fixture(scope='module')
+def detail_pages(ads):
+    return [(BASE_URL + ad_path(ad), render_detail_page(ad).encode('utf-8')) for ad in ads]
+
+
+@pytest.fixture(scope='module')
+def redesigned_listing_pages(ads):
+    pages = []
+    for start in range(0, len(ads), ADS_PER_LISTING_PAGE):
+        page = start // ADS_PER_LISTING_PAGE + 1
+        html = render_listing_page(ads[start:start + ADS_PER_LISTING_PAGE], f'/s-jobs/v1c8p{page + 1}', 'redesign')
+        pages.append((f'{BASE_URL}/s-jobs/v1c8p{page}', html.encode('utf-8')))
+    return pages
+
+
+@pytest.fixture(scope='module')
+def redesigned_detail_pages(ads):
+    return [(BASE_URL + ad_path(ad), render_detail_page(ad, 'redesign').encode('utf-8')) for ad in ads]
+
+
+def bench_parse_job_listings(bench, spider, listing_pages):
+    def parse(page):
+        url, body = page
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        return sum(1 for _ in spider.parse_job_listings(response))
+    
+    result = bench('spider/parse_job_listings', parse, listing_pages)
+    assert result['items'] == len(listing_pages) * (ADS_PER_LISTING_PAGE + 1)
+
+
+def bench_parse_job_detail(bench, spider, detail_pages):
+    def parse(page):
+        url, body = page
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        return sum(1 for _ in spider.parse_job_detail(response))
+    
+    result = bench('spider/parse_job_detail', parse, detail_pages)
+    assert result['items'] == len(detail_pages)
+
+
+def bench_parse_job_detail_records(bench, record_spider, detail_pages):
+    def parse(page):
+        url, body = page
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        return sum(1 for _ in record_spider.parse_job_detail(response))
+    
+    result = bench('spider/parse_job_detail/records', parse, detail_pages)
+    assert result['items'] == len(detail_pages)
+
+
+def bench_parse_redesigned_pages(bench, redesigned_listing_pages, redesigned_detail_pages):
+    # A fresh spider, whose selectors start out on the old layout's variants
+    spider = GumtreeJobsSpider()
+    
+    def parse(page):
+        url, body = page
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        callback = spider.parse_job_listings if '/s-jobs/' in url else spider.parse_job_detail
+        return sum(1 for _ in callback(response))
+    
+    pages = redesigned_listing_pages + redesigned_detail_pages
+    result = bench('spider/parse_redesigned_pages', parse, pages)
+    assert result['items'] == len(redesigned_listing_pages) * (ADS_PER_LISTING_PAGE + 1) + len(redesigned_detail_pages)
+    # Fallback selectors only run until the new variants have won promote_after pages in a row
+    assert spider.selectors.wasted < 0.01 * spider.selectors.evaluations
+
+
+def load_job(loader, ad):
+    loader.add_value('title', f"  {ad['title']}\n")
+    loader.add_value('description', ad['description'])
+    loader.add_value('company_name', ad['company_name'])
+    loader.add_value('location', f"{ad['location']}, South Africa")
+    loader.add_value('salary', f"Salary: {ad['salary']}" if ad['salary'] else None)
+    loader.add_value('source_url', BASE_URL + ad_path(ad))
+    loader.add_value('external_id', ad['external_id'])
+    return loader.load_item()
+
+
+def bench_job_item_processors(bench, ads):
+    def load(ad):
+        load_job(ItemLoader(item=JobItem()), ad)
+        return 1
+    
+    bench('items/job_item_processors', load, ads)
+
+
+def bench_job_record_processors(bench, ads):
+    def load(ad):
+        load_job(JobRecordLoader(), ad)
+        return 1
+    
+    result = bench('items/job_record_processors', load, ads)
+    assert result['items'] == len(ads)
+
+
+def retained_bytes(build, ads):
+    """Memory still held by the objects ``build`` returns for ``ads``"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = [build(ad) for ad in ads]
+        retained = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert len(kept) == len(ads)
+    return retained
+
+
+def bench_job_record_memory(ads):
+    # Field values are the same strings either way, the containers holding them differ
+    item_bytes = retained_bytes(lambda ad: load_job(ItemLoader(item=JobItem()), ad), ads)
+    record_bytes = retained_bytes(lambda ad: load_job(JobRecordLoader(), ad), ads)
+    assert record_bytes < item_bytes
@@ -0,0 +1,139 @@
+"""
+Pipeline benchmarks: each item pipeline in isolation
+
+Items come from the spider parsing synthetic detail pages, so they carry
+the same fields and processor output as items from a real crawl.
+"""
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+
+from scrapy_jobs.items import JobItem
+from scrapy_jobs.pipelines import (
+    CategoryMappingPipeline, DatabasePipeline, DeduplicationPipeline, StatsPipeline, ValidationPipeline,
+)
+from scrapy_jobs.spiders.gumtree_spider import GumtreeJobsSpider
+from benchmarks.harness import create_sqlite_database
+from benchmarks.synthetic import ad_path, make_job_ads, render_detail_page
+
+
+@pytest.fixture(scope='module')
+def spider():
+    return GumtreeJobsSpider()
+
+
+@pytest.fixture(scope='module')
+def job_items(spider):
+    items = []
+    for ad in make_job_ads(1000, seed=7):
+        url = 'https://www.gumtree.co.za' + ad_path(ad)
+        body = render_detail_page(ad).encode('utf-8')
+        response = HtmlResponse(url, body=body, encoding='utf-8', request=Request(url))
+        items.extend(spider.parse_job_detail(response))
+    return [ValidationPipeline().process_item(item, spider) for item in items]
+
+
+def bench_validation_pipeline(bench, spider, job_items):
+    pipeline = ValidationPipeline()
+    
+    def process(item):
+        pipeline.process_item(JobItem(item), spider)
+        return 1
+    
+    bench('pipelines/validation', process, job_items)
+
+
+def bench_deduplication_pipeline(bench, spider, job_items):
+    pipeline = DeduplicationPipeline()
+    
+    def process(item):
+        pipeline.process_item(item, spider)
+        return 1
+    
+    # Synthetic ads repeat title/company/location, keep one of each
+    unique_items = list({(item['title'], item['company_name'], item['location']): item for item in job_items}.values())
+    bench('pipelines/deduplication', process, unique_items, setup=pipeline.seen_items.clear)
+
+
+def bench_category_mapping_pipeline(bench, spider, job_items):
+    pipeline = CategoryMappingPipeline()
+    
+    def process(item):
+        pipeline.process_item(JobItem(item), spider)
+        return 1
+    
+    bench('pipelines/category_mapping/keywords', process, job_items)
+
+
+def bench_category_mapping_model_batches(bench, job_items, tmp_path_factory):
+    pytest.importorskip('sklearn')
+    from scrapy_jobs.classifier import JobCategoryClassifier, job_text
+    
+    ads = make_job_ads(3000, seed=11)
+    model_path = str(tmp_path_factory.mktemp('model') / 'job_category.joblib')
+    JobCategoryClassifier.train(
+        [job_text(ad['title'], ad['description']) for ad in ads], [ad['category_id'] for ad in ads]
+    ).save(model_path)
+    pipeline = CategoryMappingPipeline(model_path=model_path)
+    
+    batches = [
+        [(item['title'], item.get('description', '')) for item in job_items[start:start + 32]]
+        for start in range(0, len(job_items), 32)
+    ]
+    
+    def classify(batch):
+        return len(pipeline.classify_job_categories(batch))
+    
+    bench('pipelines/category_mapping/model_batch_32', classify, batches)
+
+
+def bench_database_pipeline(bench, spider, job_items, tmp_path):
+    database = create_sqlite_database(str(tmp_path / 'bench.sqlite'))
+    pipeline = DatabasePipeline(database_url=f'sqlite:///{database}', batch_size=100)
+    pipeline.open_spider(spider)
+    
+    def process(item):
+        pipeline.process_item(JobItem(item), spider)
+        return 1
+    
+    try:
+        # Later rounds upsert the rows written by the first one
+        bench('pipelines/database_sqlite', process, job_items, setup=pipeline.flush)
+    finally:
+        pipeline.close_spider(spider)
+
+
+def bench_database_batch_size_keeps_rows(spider, tmp_path):
+    # Two copies of one job: the stored title mustn't depend on whether they share a batch
+    copies = [
+        JobItem(title='Guard', location='Durban', company_name='Acme', description='first',
+                source_site='gumtree', external_id='e1'),
+        JobItem(title='Guard2', location='Durban', company_name='Acme', description='second',
+                source_site='gumtree', external_id='e1'),
+    ]
+    stored = {}
+    for native_upsert in (True, False):
+        for batch_size in (1, 10):
+            database = create_sqlite_database(str(tmp_path / f'batch_{native_upsert}_{batch_size}.sqlite'))
+            pipeline = DatabasePipeline(database_url=f'sqlite:///{database}', batch_size=batch_size)
+            pipeline.open_spider(spider)
+            pipeline.native_upsert = native_upsert
+            for item in copies:
+                pipeline.process_item(JobItem(item), spider)
+            pipeline.flush()
+            stored[native_upsert, batch_size] = [
+                tuple(row) for row in pipeline.connection.execute('SELECT title, description FROM jobs')
+            ]
+            pipeline.close_spider(spider)
+    
+    assert set(map(tuple, stored.values())) == {(('Guard', 'second'),)}, stored
+
+
+def bench_stats_pipeline(bench, spider, job_items):
+    pipeline = StatsPipeline()
+    
+    def process(item):
+        pipeline.process_item(item, spider)
+        return 1
+    
+    bench('pipelines/stats', process, job_items)
@@ -0,0 +1,81 @@
+"""
+pytest plugin for the benchmark suite
+    
+    python -m pytest benchmarks                      # compare with baseline.json
+    python -m pytest benchmarks --save-baseline      # record a new baseline
+    python -m pytest benchmarks -k detail            # a subset
+
+A benchmark fails when its throughput drops, or its allocations per item
+grow, by more than ``--max-slowdown`` (default 0.4, or BENCH_MAX_SLOWDOWN)
+relative to the stored baseline.
+"""
+
+import os
+
+import pytest
+
+from benchmarks.harness import BASELINE_PATH, load_baseline, measure, regressions, save_baseline
+
+RESULTS = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmarks')
+    group.addoption('--save-baseline', action='store_true', help='Write the results to the baseline file')
+    group.addoption('--baseline', default=BASELINE_PATH, help='Baseline file to compare against')
+    group.addoption('--max-slowdown', type=float, default=float(os.getenv('BENCH_MAX_SLOWDOWN', 0.4)),
+                    help='Allowed relative slowdown before a benchmark fails')
+
+
+def pytest_configure(config):
+    config.stash[RESULTS] = {}
+
+
+class Benchmark:
+    """Callable fixture: bench(name, func, inputs, setup=None) measures and checks one benchmark"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.results = config.stash[RESULTS]
+        self.baseline = load_baseline(config.getoption('baseline'))
+    
+    def __call__(self, name, func, inputs, repeat=5, setup=None):
+        result = measure(func, inputs, repeat=repeat, setup=setup)
+        self.results[name] = result
+        
+        if not self.config.getoption('save_baseline'):
+            problems = regressions(result, self.baseline.get(name), self.config.getoption('max_slowdown'))
+            if problems:
+                pytest.fail(f"{name} regressed: {'; '.join(problems)}")
+        return result
+
+
+@pytest.fixture(scope='session')
+def bench(pytestconfig):
+    return Benchmark(pytestconfig)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = config.stash.get(RESULTS, {})
+    if not results:
+        return
+    
+    baseline = load_baseline(config.getoption('baseline'))
+    terminalreporter.section('benchmarks')
+    terminalreporter.write_line(
+        f"{'benchmark':<44}{'items/sec':>12}{'baseline':>12}{'p50 us':>10}{'p90 us':>10}"
+        f"{'p99 us':>10}{'KiB/item':>10}"
+    )
+    for name, result in sorted(results.items()):
+        previous = baseline.get(name, {}).get('items_per_sec')
+        previous = f"{previous:.0f}" if previous else '-'
+        terminalreporter.write_line(
+            f"{name:<44}{result['items_per_sec']:>12.0f}{previous:>12}"
+            f"{result['p50_us']:>10.1f}{result['p90_us']:>10.1f}{result['p99_us']:>10.1f}"
+            f"{result['alloc_kib_per_item']:>10.2f}"
+        )
+    
+    if config.getoption('save_baseline'):
+        # Keep entries of benchmarks that were deselected in this run
+        save_baseline({**baseline, **results}, config.getoption('baseline'))
+        terminalreporter.write_line(f"Saved baseline to {config.getoption('baseline')}")
@@ -0,0 +1,163 @@
+"""
+Measurement helpers for the benchmark suite
+
+``measure`` runs a callable over a list of inputs and reports throughput,
+per-call latency percentiles and memory allocated per item. Results are
+compared against ``baseline.json`` so slowdowns show up before a release.
+
+Throughput is also recorded relative to a fixed pure-Python reference
+workload timed just before each benchmark, so a baseline recorded on one
+machine still means something on a slower or busier CI runner.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import platform
+import tracemalloc
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+# The part of the workwise-sa schema the database pipeline writes to
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, slug TEXT, logo TEXT, location TEXT,
+    openPositions INTEGER, hiringScore INTEGER, createdAt TEXT, updatedAt TEXT
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT, description TEXT, location TEXT, salary TEXT,
+    jobType TEXT, workMode TEXT, companyId INTEGER, categoryId INTEGER, isFeatured BOOLEAN,
+    source_url TEXT, source_site TEXT, external_id TEXT, apply_url TEXT, createdAt TEXT, updatedAt TEXT
+);
+"""
+
+REFERENCE_TEXT = 'General worker needed in Sandton, R5 000 per month. Apply now! ' * 4
+REFERENCE_WORD_RE = re.compile(r'\w+')
+
+
+def reference_workload():
+    # String, regex, dict and list work, the mix spider parsing and pipelines do
+    counts = {}
+    for word in REFERENCE_WORD_RE.findall(REFERENCE_TEXT.lower()):
+        counts[word] = counts.get(word, 0) + 1
+    return sorted(counts.items(), key=lambda entry: (-entry[1], entry[0]))
+
+
+def calibrate(rounds=5, calls=500):
+    """Reference workload calls per second on this machine, best of ``rounds``"""
+    best = 0.0
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(calls):
+            reference_workload()
+        best = max(best, calls / (time.perf_counter() - started))
+    return best
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def measure(func, inputs, repeat=5, setup=None):
+    """Benchmark ``func`` over ``inputs``
+    
+    ``func(value)`` returns the number of items it produced. Every round calls
+    it once per input (after ``setup()`` when given); throughput is taken
+    from the fastest round, latency percentiles from all calls. A final round
+    under tracemalloc measures the peak memory each call allocates.
+    """
+    # Warm up caches and lazily compiled patterns
+    reference_rate = calibrate()
+    if setup:
+        setup()
+    for value in inputs[:50]:
+        func(value)
+    
+    latencies = []
+    best_rate = 0.0
+    items = 0
+    for _ in range(repeat):
+        if setup:
+            setup()
+        items = 0
+        started = time.perf_counter()
+        for value in inputs:
+            call_started = time.perf_counter()
+            items += func(value)
+            latencies.append(time.perf_counter() - call_started)
+        best_rate = max(best_rate, items / (time.perf_counter() - started))
+    
+    if setup:
+        setup()
+    allocated = 0
+    tracemalloc.start()
+    try:
+        for value in inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func(value)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    
+    latencies.sort()
+    return {
+        'calls': len(inputs),
+        'items': items,
+        'items_per_sec': round(best_rate, 1),
+        # Items per reference workload call, comparable across machines
+        'relative_speed': round(best_rate / reference_rate, 4),
+        'p50_us': round(percentile(latencies, 0.50) * 1e6, 1),
+        'p90_us': round(percentile(latencies, 0.90) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+        'alloc_kib_per_item': round(allocated / max(items, 1) / 1024, 2),
+    }
+
+
+def create_sqlite_database(path):
+    """Create an SQLite database with the jobs and companies tables, returning its path"""
+    connection = sqlite3.connect(path)
+    connection.executescript(SQLITE_SCHEMA)
+    connection.close()
+    return path
+
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('benchmarks', {})
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    data = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'benchmarks': dict(sorted(results.items())),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+        f.write('\n')
+
+
+def regressions(result, baseline, max_slowdown=0.4):
+    """Describe how ``result`` is worse than ``baseline`` beyond the allowed margin"""
+    problems = []
+    if not baseline:
+        return problems
+    
+    if result['relative_speed'] < baseline['relative_speed'] * (1 - max_slowdown):
+        problems.append(
+            f"relative speed {result['relative_speed']:.4f} vs baseline {baseline['relative_speed']:.4f} "
+            f"({result['items_per_sec']:.0f}/s vs {baseline['items_per_sec']:.0f}/s)"
+        )
+    if result['alloc_kib_per_item'] > baseline['alloc_kib_per_item'] * (1 + max_slowdown) + 1:
+        problems.append(
+            f"allocations {result['alloc_kib_per_item']:.1f} KiB/item vs baseline "
+            f"{baseline['alloc_kib_per_item']:.1f} KiB/item"
+        )
+    return problems
@@ -0,0 +1,177 @@
+"""
+Local stand-in HTTP proxies with configurable health
+
+Each proxy forwards plain HTTP requests (sent to it with absolute URIs) to
+their origin, behaving according to its spec:
+
+    good            forwards every request
+    slow[:ms]       adds ms of latency to each request (default 300)
+    flaky[:rate]    answers that share of requests with 502 (default 0.3)
+    banned[:after]  answers 403 to everything after that many requests (default 50)
+    dead            doesn't listen, so connections are refused
+
+    python -m benchmarks.proxies good good slow:500 flaky banned:20 dead
+"""
+
+import time
+import random
+import socket
+import argparse
+import threading
+import http.client
+import multiprocessing
+from urllib.parse import urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROXY_KINDS = {'good': None, 'slow': 300, 'flaky': 0.3, 'banned': 50, 'dead': None}
+
+
+def parse_proxy_spec(spec):
+    """('slow', 500.0) from 'slow:500', with the kind's default when no value is given"""
+    kind, _, value = spec.partition(':')
+    if kind not in PROXY_KINDS:
+        raise ValueError(f"Unknown proxy kind {kind!r}, expected one of {sorted(PROXY_KINDS)}")
+    return kind, float(value) if value else PROXY_KINDS[kind]
+
+
+class StandInProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def setup(self):
+        super().setup()
+        # One keep-alive connection to the origin per client connection
+        self.connections = {}
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        proxy = self.server.proxy
+        proxy.count('requests')
+        if proxy.kind == 'slow':
+            time.sleep(proxy.value / 1000.0)
+        elif proxy.kind == 'flaky' and random.random() < proxy.value:
+            proxy.count('errors')
+            return self.respond(502, b'Bad Gateway')
+        elif proxy.kind == 'banned' and proxy.counts['requests'] > proxy.value:
+            proxy.count('banned')
+            return self.respond(403, b'Forbidden')
+        
+        target = urlsplit(self.path)
+        try:
+            status, body, content_type = self.forward(target)
+        except (OSError, http.client.HTTPException):
+            proxy.count('errors')
+            return self.respond(502, b'Bad Gateway')
+        proxy.count('forwarded')
+        self.respond(status, body, content_type)
+    
+    def forward(self, target):
+        connection = self.connections.get(target.netloc)
+        if connection is None:
+            connection = self.connections[target.netloc] = http.client.HTTPConnection(target.netloc, timeout=30)
+        path = target.path + (f'?{target.query}' if target.query else '')
+        connection.request('GET', path or '/', headers={'User-Agent': self.headers.get('User-Agent', '')})
+        response = connection.getresponse()
+        return response.status, response.read(), response.getheader('Content-Type', 'text/html')
+    
+    def respond(self, status, body, content_type='text/html; charset=utf-8'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInProxy:
+    """One stand-in proxy of the given kind, served from a background thread"""
+    
+    def __init__(self, spec, host='127.0.0.1', port=0):
+        self.spec = spec
+        self.kind, self.value = parse_proxy_spec(spec)
+        self.counts = {'requests': 0, 'forwarded': 0, 'errors': 0, 'banned': 0}
+        self.counts_lock = threading.Lock()
+        self.server = None
+        if self.kind == 'dead':
+            # Reserve a free port and release it, so nothing is listening there
+            with socket.socket() as sock:
+                sock.bind((host, port))
+                self.address = sock.getsockname()[:2]
+        else:
+            self.server = ThreadingHTTPServer((host, port), StandInProxyHandler)
+            self.server.daemon_threads = True
+            self.server.proxy = self
+            self.address = self.server.server_address[:2]
+    
+    @property
+    def url(self):
+        host, port = self.address
+        return f'http://{host}:{port}'
+    
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+    
+    def start(self):
+        if self.server:
+            threading.Thread(target=self.server.serve_forever, name=f'StandInProxy-{self.spec}', daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+class ProxiesProcess:
+    """Run stand-in proxies in a child process, like SiteProcess"""
+    
+    def __init__(self, specs):
+        self.specs = list(specs)
+        self.connection = None
+        self.process = None
+        self.urls = []
+    
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve_proxies_until_stopped, args=(child_connection, self.specs),
+                                       daemon=True)
+        self.process.start()
+        self.urls = self.connection.recv()
+        return self
+    
+    def stop(self):
+        """Stop the proxies and return their request counts by URL"""
+        self.connection.send('stop')
+        counts = self.connection.recv()
+        self.process.join()
+        return counts
+
+
+def serve_proxies_until_stopped(connection, specs):
+    proxies = [StandInProxy(spec).start() for spec in specs]
+    connection.send([proxy.url for proxy in proxies])
+    connection.recv()
+    for proxy in proxies:
+        proxy.stop()
+    connection.send({proxy.url: dict(proxy.counts, kind=proxy.spec) for proxy in proxies})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve stand-in HTTP proxies of varying health')
+    parser.add_argument('specs', nargs='+', help='Proxy kinds: good, slow[:ms], flaky[:rate], banned[:after], dead')
+    args = parser.parse_args()
+    
+    proxies = [StandInProxy(spec).start() for spec in args.specs]
+    for proxy in proxies:
+        print(f"{proxy.spec:<16}{proxy.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        for proxy in proxies:
+            proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
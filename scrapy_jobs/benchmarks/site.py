@@ -0,0 +1,208 @@
+"""
+Local stand-in for Gumtree serving synthetic job ads
+
+Listing pages (``/s-jobs/v1c8p<N>``) link to ADS_PER_PAGE detail pages each,
+detail pages (``/a-jobs/<location>/<title>/<external id>``) are rendered on
+request from the ad's index, so a site of 500k ads costs no memory. Responses
+can be delayed and a share of them answered with 503 to exercise retries.
+With a rate limit, a request over the limit blocks the site for the penalty
+period, answering 429 with Retry-After until it is over.
+
+    python -m benchmarks.site --ads 100000 --port 8765 --latency-ms 50 --error-rate 0.01
+    python -m benchmarks.site --ads 10000 --rate-limit 50 --penalty-s 2
+"""
+
+import re
+import time
+import random
+import argparse
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import FIRST_EXTERNAL_ID, make_job_ad, render_detail_page, render_listing_page
+
+ADS_PER_PAGE = 20
+
+LISTING_PATH_RE = re.compile(r'^/s-jobs/v1c8p(\d+)$')
+DETAIL_PATH_RE = re.compile(r'^/a-jobs/[^/]+/[^/]+/(\d+)$')
+
+
+class SyntheticSiteHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real site
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        site = self.server.site
+        if site.latency:
+            # Uniform jitter around the mean latency
+            time.sleep(site.latency * random.uniform(0.5, 1.5))
+        if site.error_rate and random.random() < site.error_rate:
+            site.count('errors')
+            return self.respond(503, b'Service Unavailable')
+        retry_after = site.rate_limited()
+        if retry_after:
+            site.count('throttled')
+            return self.respond(429, b'Too Many Requests', {'Retry-After': str(retry_after)})
+        
+        listing = LISTING_PATH_RE.match(self.path)
+        if listing:
+            site.count('listing_pages')
+            return self.respond(200, site.listing_page(int(listing.group(1))))
+        
+        detail = DETAIL_PATH_RE.match(self.path)
+        index = int(detail.group(1)) - FIRST_EXTERNAL_ID if detail else -1
+        if 0 <= index < site.ads:
+            site.count('detail_pages')
+            return self.respond(200, site.detail_page(index))
+        
+        site.count('not_found')
+        self.respond(404, b'Not Found')
+    
+    def respond(self, status, body, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SyntheticJobSite:
+    """Threaded HTTP server for ``ads`` synthetic ads, started in the background"""
+    
+    def __init__(self, ads, host='127.0.0.1', port=0, latency_ms=0, error_rate=0.0, seed=42, rate_limit=0,
+                 penalty_s=1):
+        self.ads = ads
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.seed = seed
+        self.counts = {'listing_pages': 0, 'detail_pages': 0, 'errors': 0, 'not_found': 0, 'throttled': 0}
+        self.counts_lock = threading.Lock()
+        # Token bucket holding one second of requests, and the end of the current penalty
+        self.rate_limit = rate_limit
+        self.penalty = penalty_s
+        self.tokens = rate_limit
+        self.tokens_updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.server = ThreadingHTTPServer((host, port), SyntheticSiteHandler)
+        self.server.daemon_threads = True
+        self.server.site = self
+        self.thread = None
+    
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    @property
+    def start_url(self):
+        return f'{self.base_url}/s-jobs/v1c8p1'
+    
+    @property
+    def pages(self):
+        return -(-self.ads // ADS_PER_PAGE)
+    
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+    
+    def rate_limited(self):
+        """Retry-After seconds if this request is over the rate limit or in a penalty, else 0"""
+        if not self.rate_limit:
+            return 0
+        with self.counts_lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return max(round(self.blocked_until - now), 1)
+            self.tokens = min(self.rate_limit, self.tokens + (now - self.tokens_updated) * self.rate_limit)
+            self.tokens_updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            self.blocked_until = now + self.penalty
+            return self.penalty
+    
+    def listing_page(self, page):
+        """Listing page ``page``, empty past the last page"""
+        first = (page - 1) * ADS_PER_PAGE
+        ads = [make_job_ad(index, self.seed) for index in range(first, min(first + ADS_PER_PAGE, self.ads))]
+        next_page = f'/s-jobs/v1c8p{page + 1}' if page < self.pages else None
+        return render_listing_page(ads, next_page).encode('utf-8')
+    
+    def detail_page(self, index):
+        return render_detail_page(make_job_ad(index, self.seed)).encode('utf-8')
+    
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='SyntheticJobSite', daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SiteProcess:
+    """Run a SyntheticJobSite in a child process, so serving pages doesn't compete with the crawler for the GIL"""
+    
+    def __init__(self, ads, latency_ms=0, error_rate=0.0, seed=42, rate_limit=0, penalty_s=1):
+        self.args = (ads, latency_ms, error_rate, seed, rate_limit, penalty_s)
+        self.connection = None
+        self.process = None
+        self.start_url = None
+    
+    def start(self):
+        context = multiprocessing.get_context('spawn')
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=serve_until_stopped, args=(child_connection,) + self.args, daemon=True)
+        self.process.start()
+        self.start_url = self.connection.recv()
+        return self
+    
+    def stop(self):
+        """Stop the site and return its request counts"""
+        self.connection.send('stop')
+        counts = self.connection.recv()
+        self.process.join()
+        return counts
+
+
+def serve_until_stopped(connection, ads, latency_ms, error_rate, seed, rate_limit, penalty_s):
+    site = SyntheticJobSite(
+        ads, latency_ms=latency_ms, error_rate=error_rate, seed=seed, rate_limit=rate_limit, penalty_s=penalty_s
+    ).start()
+    connection.send(site.start_url)
+    connection.recv()
+    site.stop()
+    connection.send(site.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve a synthetic Gumtree-style job site')
+    parser.add_argument('--ads', type=int, default=10000, help='Number of job ads on the site')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Mean response delay')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503')
+    parser.add_argument('--rate-limit', type=float, default=0, help='Requests per second allowed (0 for no limit)')
+    parser.add_argument('--penalty-s', type=int, default=1, help='Seconds the site stays blocked after the limit is hit')
+    args = parser.parse_args()
+    
+    site = SyntheticJobSite(
+        args.ads, args.host, args.port, args.latency_ms, args.error_rate,
+        rate_limit=args.rate_limit, penalty_s=args.penalty_s
+    ).start()
+    print(f"Serving {args.ads} ads on {site.pages} listing pages at {site.start_url}")
+    try:
+        site.thread.join()
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Synthetic Gumtree-style job ads for benchmarks
+
+Ads are generated from per-category vocabularies that deliberately include
+wording the keyword tables do not know about ("till", "forecourt",
+"toddlers"), plus shared filler, so both classifiers see realistic noise.
+They can be rendered as listing and detail pages using the markup the
+Gumtree spider's selectors expect.
+"""
+
+import re
+import random
+from html import escape
+
+CATEGORY_VOCABULARY = {
+    1: {  # Retail
+        'titles': ['Cashier', 'Till Operator', 'Sales Assistant', 'Shop Assistant', 'Merchandiser',
+                   'Store Packer', 'Retail Floor Staff', 'Shelf Packer', 'Checkout Operator'],
+        'phrases': ['operate the till and cash up at the end of each shift', 'assist customers on the shop floor',
+                    'pack shelves and check price tags', 'handle returns and refunds at the counter',
+                    'meet monthly sales targets', 'stock counts and merchandising at the mall branch',
+                    'friendly service at the checkout'],
+    },
+    2: {  # General Worker
+        'titles': ['General Worker', 'Labourer', 'Helper', 'Warehouse Picker', 'Factory Hand',
+                   'Driver Assistant', 'Packer', 'Handyman', 'Construction Helper'],
+        'phrases': ['load and offload trucks', 'picking and packing orders in the warehouse',
+                    'assist on building sites with mixing cement', 'general duties around the factory',
+                    'must be able to lift heavy boxes', 'forklift licence an advantage',
+                    'help the driver with deliveries'],
+    },
+    3: {  # Security
+        'titles': ['Security Guard', 'Security Officer', 'Patroller', 'Access Control Officer',
+                   'CCTV Operator', 'Armed Response Officer', 'Night Watchman'],
+        'phrases': ['PSIRA grade C registration required', 'patrol the premises at night',
+                    'monitor CCTV cameras in the control room', 'access control at the main gate',
+                    'armed response experience preferred', 'search vehicles entering the estate',
+                    'write incident reports in the occurrence book'],
+    },
+    4: {  # Petrol Attendant
+        'titles': ['Petrol Attendant', 'Forecourt Attendant', 'Fuel Attendant', 'Pump Attendant',
+                   'Forecourt Assistant', 'Garage Attendant'],
+        'phrases': ['fill up vehicles and check oil and tyre pressure', 'work on the forecourt in shifts',
+                    'clean windscreens and assist motorists', 'handle card payments at the pumps',
+                    'diesel and unleaded pumps at a busy garage', 'service station on the N1'],
+    },
+    5: {  # Childcare
+        'titles': ['Nanny', 'Au Pair', 'Babysitter', 'Childminder', 'Creche Assistant',
+                   'Aftercare Teacher', 'Live-in Nanny'],
+        'phrases': ['look after two toddlers during the day', 'school runs and homework help',
+                    'prepare meals for the kids', 'experience with newborns required',
+                    'bath and bedtime routines for the children', 'must love children and be patient',
+                    'first aid certificate for infants'],
+    },
+    6: {  # Cleaning
+        'titles': ['Cleaner', 'Domestic Worker', 'Housekeeper', 'Janitor', 'Office Cleaner',
+                   'Char', 'Laundry Assistant', 'Hospital Cleaner'],
+        'phrases': ['washing, ironing and laundry', 'clean offices after hours', 'mopping and vacuuming floors',
+                    'sanitise bathrooms and kitchens', 'sleep-in domestic position',
+                    'dusting and polishing furniture', 'changing linen in guest rooms'],
+    },
+    7: {  # Landscaping
+        'titles': ['Gardener', 'Garden Worker', 'Landscaper', 'Grounds Keeper', 'Groundsman',
+                   'Lawn Mower Operator', 'Tree Feller Assistant'],
+        'phrases': ['mow lawns and trim hedges', 'pruning roses and planting seedlings',
+                    'irrigation repairs and watering', 'weeding flower beds at the complex',
+                    'operate brush cutters and weed eaters', 'remove garden refuse',
+                    'maintenance of the estate grounds'],
+    },
+}
+
+FILLER_PHRASES = [
+    'Immediate start', 'Matric preferred but not essential', 'Must have own transport',
+    'Reliable and hardworking candidates only', 'Send CV via WhatsApp', 'No experience needed',
+    'References required', 'Weekly pay', 'Apply now', 'Only shortlisted candidates will be contacted',
+    'Must be fluent in English', 'Uniform provided', 'South African ID required',
+]
+
+# Titles that say nothing about the category
+GENERIC_TITLES = ['Staff Needed', 'Vacancy', 'Urgent Hiring', 'Workers Wanted', 'Job Opportunity']
+
+LOCATIONS = [
+    'Johannesburg', 'Cape Town', 'Durban', 'Pretoria', 'Sandton', 'Soweto', 'Centurion', 'Midrand',
+    'Port Elizabeth', 'Bloemfontein', 'Polokwane', 'Randburg', 'Bellville', 'Pinetown',
+]
+
+COMPANIES = [
+    'Shoprite', 'Pick n Pay', 'Spar', 'Engen', 'Sasol', 'G4S', 'Fidelity', 'Bidvest', 'Tsebo',
+    'Top Care', 'Green Thumb Landscaping', 'Sparkle Cleaning', 'Little Stars Creche', 'Builders Warehouse',
+]
+
+
+# External IDs are FIRST_EXTERNAL_ID + ad index
+FIRST_EXTERNAL_ID = 1000000000
+
+
+def make_job_ads(count, seed=42):
+    """Return ``count`` synthetic job ads as dicts with a ``category_id`` label"""
+    rng = random.Random(seed)
+    return [build_job_ad(rng, index) for index in range(count)]
+
+
+def make_job_ad(index, seed=42):
+    """Return the ad at ``index`` on its own, without generating the ones before it"""
+    return build_job_ad(random.Random(seed * 1000003 + index), index)
+
+
+def build_job_ad(rng, index):
+    categories = list(CATEGORY_VOCABULARY)
+    category_id = rng.choice(categories)
+    vocabulary = CATEGORY_VOCABULARY[category_id]
+    if rng.random() < 0.15:
+        # Terse ad: a vague title and a single telling sentence
+        title = rng.choice(GENERIC_TITLES)
+        sentences = rng.sample(vocabulary['phrases'], 1) + rng.sample(FILLER_PHRASES, rng.randint(1, 3))
+    else:
+        title = rng.choice(vocabulary['titles'])
+        sentences = rng.sample(vocabulary['phrases'], rng.randint(2, 4)) + rng.sample(FILLER_PHRASES, rng.randint(2, 5))
+    # Some ads borrow a sentence from another category, as real ads do
+    if rng.random() < 0.2:
+        other = CATEGORY_VOCABULARY[rng.choice(categories)]
+        sentences.append(rng.choice(other['phrases']))
+    rng.shuffle(sentences)
+    
+    location = rng.choice(LOCATIONS)
+    return {
+        'external_id': str(FIRST_EXTERNAL_ID + index),
+        'title': f"{title} - {location}",
+        'description': '. '.join(sentence.capitalize() for sentence in sentences) + '.',
+        'location': location,
+        'salary': f"R{rng.randrange(3500, 15000, 250)} per month" if rng.random() < 0.6 else None,
+        'company_name': rng.choice(COMPANIES),
+        'category_id': category_id,
+    }
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def ad_path(ad):
+    """Gumtree-style detail page path, e.g. /a-jobs/sandton/cashier-sandton/1000000042"""
+    return f"/a-jobs/{slugify(ad['location'])}/{slugify(ad['title'])}/{ad['external_id']}"
+
+
+def render_listing_page(ads, next_page=None, layout='classic'):
+    """HTML of a listing page linking to ``ads``, with a Next page link if given
+    
+    ``layout='redesign'`` marks links up like the newer site (data-testid
+    attributes, .pagination-next), which only the spider's fallback
+    selectors match.
+    """
+    link_attribute = 'data-testid="listing-link"' if layout == 'redesign' else 'class="related-ad-title"'
+    links = '\n'.join(
+        f'<div class="related-item"><a {link_attribute} href="{ad_path(ad)}">{escape(ad["title"])}</a>'
+        f'<span class="related-ad-location">{escape(ad["location"])}</span></div>'
+        for ad in ads
+    )
+    next_attribute = 'class="pagination-next"' if layout == 'redesign' else 'aria-label="Next page"'
+    pagination = f'<a {next_attribute} href="{next_page}">Next</a>' if next_page else ''
+    return (
+        '<html><head><title>Jobs in South Africa | Gumtree</title></head><body>'
+        f'<div class="related-content">{links}</div>'
+        f'<div class="pagination">{pagination}</div>'
+        '</body></html>'
+    )
+
+
+def render_detail_page(ad, layout='classic'):
+    """HTML of an ad's detail page, seller name shown on roughly half of the ads (layouts as in render_listing_page)"""
+    index = int(ad['external_id'])
+    paragraphs = ad['description'].split('. ')
+    if ad['salary']:
+        paragraphs.insert(1, f"Salary: {ad['salary']}")
+    if index % 2:
+        seller = f'<div class="vip-seller-name">{escape(ad["company_name"])}</div>'
+    else:
+        seller = ''
+        paragraphs.insert(0, f"Join {ad['company_name']} today")
+    description = ''.join(f'<p>{escape(paragraph)}</p>' for paragraph in paragraphs)
+    urgent = '<span class="urgent">Urgent</span>' if index % 10 == 0 else ''
+    if layout == 'redesign':
+        title_attribute, location_attribute, description_attribute = (
+            'data-testid="ad-title"', 'data-testid="ad-location"', 'data-testid="ad-description"'
+        )
+    else:
+        title_attribute, location_attribute, description_attribute = (
+            'class="myAdTitle"', 'class="ad-location"', 'class="ad-description"'
+        )
+    
+    return (
+        f'<html><head><title>{escape(ad["title"])} | Gumtree</title></head><body>'
+        f'<ol class="breadcrumb"><li>Jobs</li><li>{escape(ad["location"])}</li></ol>'
+        f'<h1 {title_attribute}>{escape(ad["title"])}</h1>'
+        f'<div {location_attribute}>{escape(ad["location"])}</div>'
+        f'<span class="ad-date">{index % 6 + 1} days ago</span>'
+        f'{seller}'
+        f'<div {description_attribute}>{description}</div>'
+        f'{urgent}'
+        '</body></html>'
+    )
@@ -17,16 +17,15 @@ import logging
 import argparse
 from datetime import datetime
 from pathlib import Path
-import subprocess
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add project root to path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
-from twisted.internet import reactor, defer
+# Scrapy project directory, where scrapy.cfg lives
+SCRAPY_PROJECT_DIR = Path(__file__).parent
+
+from scrapy.utils.project import data_path, get_project_settings
 
 # Configure logging
 logging.basicConfig(
@@ -44,6 +43,9 @@ logger = logging.getLogger(__name__)
 class JobScrapingOrchestrator:
     """Main orchestrator for job scraping operations"""
     
+    # Crawls that stopped on their own or on a CLOSESPIDER_* limit
+    SUCCESSFUL_FINISH_REASONS = ('finished', 'closespider_itemcount', 'closespider_pagecount')
+    
     def __init__(self, config_file=None):
         self.config = self.load_config(config_file)
         self.stats = {
@@ -53,7 +55,9 @@ class JobScrapingOrchestrator:
             'errors': 0,
             'start_time': datetime.now().isoformat(),
         }
-        
+        # Jobs touched by this session have updatedAt (UTC) at or after this
+        self.session_started_at = datetime.utcnow().isoformat()
+    
     def load_config(self, config_file=None):
         """Load configuration from file or use defaults"""
         default_config = {
@@ -66,10 +70,19 @@ class JobScrapingOrchestrator:
             ],
             'concurrent_spiders': 2,
             'database_url': os.getenv('DATABASE_URL', 'sqlite:///database.db'),
-            'output_format': 'database',  # or 'json', 'csv'
+            # or 'json' / 'ndjson', 'csv', 'parquet', exported alongside the database; exports hold only
+            # the items a run saves, i.e. new and changed jobs, not unchanged ones seen in earlier runs
+            'output_format': 'database',
             'enable_algorithms': True,
+            'category_model_path': os.getenv(
+                'CATEGORY_MODEL_PATH', str(Path(__file__).parent / 'models' / 'job_category.joblib')
+            ),
+            'category_min_confidence': 0.5,
             'update_metrics': True,
             'max_items_per_spider': 1000,
+            'spider_timeout': 3600,  # seconds, per spider
+            'shards': 1,  # worker processes per spider
+            'persistent_dedup': False,  # skip items unchanged since a previous run (DEDUP_STORE_ENABLED)
             'scraping_session_id': datetime.now().strftime('%Y%m%d_%H%M%S'),
         }
         
@@ -79,4 +92,332 @@ class JobScrapingOrchestrator:
                     user_config = json.load(f)
                 default_config.update(user_config)
             except Exception as e:
-                logger.error(f\"Error loading config file: {e}\")\n        \n        return default_config\n    \n    def run_spider(self, spider_name):\n        \"\"\"Run a single spider\"\"\"\n        logger.info(f\"Starting spider: {spider_name}\")\n        \n        try:\n            # Use subprocess to run scrapy in isolation\n            cmd = [\n                'scrapy', 'crawl', spider_name,\n                '-s', f'SCRAPING_SESSION_ID={self.config[\"scraping_session_id\"]}',\n                '-s', f'DATABASE_URL={self.config[\"database_url\"]}',\n                '-s', f'CLOSESPIDER_ITEMCOUNT={self.config[\"max_items_per_spider\"]}',\n                '-L', 'INFO'\n            ]\n            \n            # Change to scrapy project directory\n            scrapy_dir = Path(__file__).parent\n            result = subprocess.run(\n                cmd, \n                cwd=scrapy_dir,\n                capture_output=True, \n                text=True, \n                timeout=3600  # 1 hour timeout\n            )\n            \n            if result.returncode == 0:\n                logger.info(f\"Spider {spider_name} completed successfully\")\n                return {'spider': spider_name, 'status': 'success', 'output': result.stdout}\n            else:\n                logger.error(f\"Spider {spider_name} failed: {result.stderr}\")\n                return {'spider': spider_name, 'status': 'error', 'error': result.stderr}\n                \n        except subprocess.TimeoutExpired:\n            logger.error(f\"Spider {spider_name} timed out\")\n            return {'spider': spider_name, 'status': 'timeout'}\n        except Exception as e:\n            logger.error(f\"Error running spider {spider_name}: {e}\")\n            return {'spider': spider_name, 'status': 'error', 'error': str(e)}\n    \n    def run_all_spiders(self):\n        \"\"\"Run all configured spiders concurrently\"\"\"\n        logger.info(f\"Starting {len(self.config['spiders'])} spiders\")\n        \n        results = []\n        \n        # Run spiders concurrently\n        with ThreadPoolExecutor(max_workers=self.config['concurrent_spiders']) as executor:\n            future_to_spider = {\n                executor.submit(self.run_spider, spider): spider \n                for spider in self.config['spiders']\n            }\n            \n            for future in as_completed(future_to_spider):\n                spider = future_to_spider[future]\n                try:\n                    result = future.result()\n                    results.append(result)\n                    self.stats['scrapers_run'] += 1\n                    \n                    if result['status'] == 'success':\n                        logger.info(f\"✓ Spider {spider} completed\")\n                    else:\n                        logger.error(f\"✗ Spider {spider} failed\")\n                        self.stats['errors'] += 1\n                        \n                except Exception as e:\n                    logger.error(f\"Exception in spider {spider}: {e}\")\n                    self.stats['errors'] += 1\n        \n        return results\n    \n    def update_company_metrics(self):\n        \"\"\"Update company hiring metrics after scraping\"\"\"\n        if not self.config.get('update_metrics', True):\n            return\n            \n        logger.info(\"Updating company hiring metrics...\")\n        \n        try:\n            # This would integrate with your existing topHiringAlgorithm.ts\n            # For now, we'll create a simple Python equivalent\n            self.calculate_hiring_metrics()\n            logger.info(\"Company metrics updated successfully\")\n        except Exception as e:\n            logger.error(f\"Error updating company metrics: {e}\")\n    \n    def calculate_hiring_metrics(self):\n        \"\"\"Calculate and update hiring metrics for companies\"\"\"\n        # This integrates with your existing algorithm\n        # Import your database connection\n        try:\n            import sqlite3\n            \n            db_path = self.config['database_url'].replace('sqlite:///', '')\n            conn = sqlite3.connect(db_path)\n            cursor = conn.cursor()\n            \n            # Get companies with job counts\n            cursor.execute(\"\"\"\n                SELECT c.id, c.name, COUNT(j.id) as open_positions,\n                       COUNT(CASE WHEN j.createdAt > datetime('now', '-30 days') THEN 1 END) as recent_jobs\n                FROM companies c\n                LEFT JOIN jobs j ON c.id = j.companyId\n                GROUP BY c.id, c.name\n            \"\"\")\n            \n            companies = cursor.fetchall()\n            \n            # Update company metrics\n            for company_id, name, open_positions, recent_jobs in companies:\n                # Calculate hiring score (simplified version of your algorithm)\n                hiring_score = min(open_positions * 2 + recent_jobs * 5, 100)\n                \n                cursor.execute(\n                    \"UPDATE companies SET openPositions = ?, hiringScore = ? WHERE id = ?\",\n                    (open_positions, hiring_score, company_id)\n                )\n            \n            conn.commit()\n            conn.close()\n            \n            logger.info(f\"Updated metrics for {len(companies)} companies\")\n            \n        except Exception as e:\n            logger.error(f\"Error calculating hiring metrics: {e}\")\n    \n    def run_job_classification(self):\n        \"\"\"Run job classification algorithms on newly scraped jobs\"\"\"\n        if not self.config.get('enable_algorithms', True):\n            return\n            \n        logger.info(\"Running job classification algorithms...\")\n        \n        try:\n            # This would integrate with your ML classification algorithms\n            # For now, it's handled in the CategoryMappingPipeline\n            logger.info(\"Job classification completed\")\n        except Exception as e:\n            logger.error(f\"Error in job classification: {e}\")\n    \n    def generate_report(self, results):\n        \"\"\"Generate a scraping report\"\"\"\n        self.stats['end_time'] = datetime.now().isoformat()\n        \n        report = {\n            'session_id': self.config['scraping_session_id'],\n            'statistics': self.stats,\n            'spider_results': results,\n            'config': self.config\n        }\n        \n        # Save report\n        report_file = f\"scraping_report_{self.config['scraping_session_id']}.json\"\n        with open(report_file, 'w') as f:\n            json.dump(report, f, indent=2)\n        \n        # Log summary\n        logger.info(\"\\n\" + \"=\"*50)\n        logger.info(\"SCRAPING SESSION SUMMARY\")\n        logger.info(\"=\"*50)\n        logger.info(f\"Session ID: {self.config['scraping_session_id']}\")\n        logger.info(f\"Spiders Run: {self.stats['scrapers_run']}\")\n        logger.info(f\"Errors: {self.stats['errors']}\")\n        logger.info(f\"Report saved to: {report_file}\")\n        logger.info(\"=\"*50)\n        \n        return report\n    \n    def run(self):\n        \"\"\"Main execution method\"\"\"\n        logger.info(\"Starting job scraping orchestration...\")\n        \n        try:\n            # Run all spiders\n            results = self.run_all_spiders()\n            \n            # Post-processing\n            self.update_company_metrics()\n            self.run_job_classification()\n            \n            # Generate report\n            report = self.generate_report(results)\n            \n            logger.info(\"Job scraping orchestration completed successfully\")\n            return report\n            \n        except Exception as e:\n            logger.error(f\"Fatal error in orchestration: {e}\")\n            self.stats['errors'] += 1\n            raise\n\n\ndef main():\n    \"\"\"CLI entry point\"\"\"\n    parser = argparse.ArgumentParser(description='Workwise-SA Job Scraping Orchestrator')\n    parser.add_argument('--config', '-c', help='Configuration file path')\n    parser.add_argument('--spider', '-s', help='Run specific spider only')\n    parser.add_argument('--max-items', '-m', type=int, help='Maximum items per spider')\n    parser.add_argument('--concurrent', type=int, default=2, help='Number of concurrent spiders')\n    parser.add_argument('--dry-run', action='store_true', help='Test run without saving to database')\n    \n    args = parser.parse_args()\n    \n    # Create orchestrator\n    orchestrator = JobScrapingOrchestrator(args.config)\n    \n    # Override config with CLI args\n    if args.spider:\n        orchestrator.config['spiders'] = [args.spider]\n    if args.max_items:\n        orchestrator.config['max_items_per_spider'] = args.max_items\n    if args.concurrent:\n        orchestrator.config['concurrent_spiders'] = args.concurrent\n    if args.dry_run:\n        orchestrator.config['database_url'] = ':memory:'  # Use in-memory database\n    \n    try:\n        report = orchestrator.run()\n        sys.exit(0 if orchestrator.stats['errors'] == 0 else 1)\n    except KeyboardInterrupt:\n        logger.info(\"Scraping interrupted by user\")\n        sys.exit(2)\n    except Exception as e:\n        logger.error(f\"Fatal error: {e}\")\n        sys.exit(1)\n\n\nif __name__ == '__main__':\n    main()"
+                logger.error(f"Error loading config file: {e}")
+        
+        return default_config
+    
+    def session_settings(self):
+        """Setting overrides shared by every spider of the session"""
+        return {
+            'SCRAPING_SESSION_ID': self.config['scraping_session_id'],
+            'DATABASE_URL': self.config['database_url'],
+            'CLOSESPIDER_ITEMCOUNT': self.config['max_items_per_spider'],
+            'CLOSESPIDER_TIMEOUT': self.config['spider_timeout'],
+            'LOG_LEVEL': 'INFO',
+            'EXPORT_FORMAT': self.config['output_format'],
+            'DEDUP_STORE_ENABLED': self.config['persistent_dedup'],
+        }
+    
+    def crawl_settings(self):
+        """Project settings shared by every spider of the session"""
+        settings = get_project_settings()
+        # Same precedence as `scrapy crawl -s`, above the spiders' custom_settings
+        settings.setdict(self.session_settings(), priority='cmdline')
+        return settings
+    
+    def spider_result(self, spider_name, stats, error=None):
+        """Structured result of a finished crawl, built from its Scrapy stats"""
+        finish_reason = stats.get('finish_reason')
+        
+        if error is not None:
+            status = 'error'
+        elif finish_reason == 'closespider_timeout':
+            status = 'timeout'
+        elif finish_reason in self.SUCCESSFUL_FINISH_REASONS:
+            status = 'success'
+        else:
+            status = 'error'
+        
+        result = {
+            'spider': spider_name,
+            'status': status,
+            'finish_reason': finish_reason,
+            'items_scraped': stats.get('item_scraped_count', 0),
+            'stats': stats,
+        }
+        if error is not None:
+            result['error'] = error
+        return result
+    
+    def run_all_spiders(self):
+        """Run all configured spiders, split across worker processes when ``shards`` > 1"""
+        logger.info(f"Starting {len(self.config['spiders'])} spiders")
+        
+        # Relative paths in the settings (SQLite database, log file, HTTP cache) resolve against the project
+        working_dir = os.getcwd()
+        os.chdir(SCRAPY_PROJECT_DIR)
+        try:
+            if self.config['shards'] > 1:
+                results = [self.run_sharded_spider(spider_name) for spider_name in self.config['spiders']]
+            else:
+                results = self.run_spiders_in_process()
+        finally:
+            os.chdir(working_dir)
+        
+        for result in results:
+            self.stats['scrapers_run'] += 1
+            self.stats['jobs_scraped'] += result.get('items_scraped', 0)
+            
+            if result['status'] == 'success':
+                logger.info(f"✓ Spider {result['spider']} completed: {result['items_scraped']} items")
+            else:
+                logger.error(f"✗ Spider {result['spider']} failed ({result.get('finish_reason') or result.get('error')})")
+                self.stats['errors'] += 1
+        
+        return results
+    
+    def run_spiders_in_process(self):
+        """Run all configured spiders in this process, on one reactor
+        
+        At most ``concurrent_spiders`` crawls run at a time. The Twisted reactor
+        can't be restarted, so this can only be called once per process.
+        """
+        from scrapy.crawler import CrawlerProcess
+        from twisted.internet import defer
+        from scrapy_jobs.frontier import jsonable_stats
+        
+        results = []
+        
+        def crawler_stats(crawler):
+            return jsonable_stats(crawler.stats.get_stats()) if crawler.stats else {}
+        
+        def crawl_finished(_, spider_name, crawler):
+            results.append(self.spider_result(spider_name, crawler_stats(crawler)))
+        
+        def crawl_failed(failure, spider_name, crawler):
+            logger.error(f"Exception in spider {spider_name}: {failure.getErrorMessage()}")
+            results.append(self.spider_result(spider_name, crawler_stats(crawler), failure.getErrorMessage()))
+        
+        process = CrawlerProcess(self.crawl_settings())
+        semaphore = defer.DeferredSemaphore(max(self.config['concurrent_spiders'], 1))
+        crawls = []
+        
+        for spider_name in self.config['spiders']:
+            try:
+                crawler = process.create_crawler(spider_name)
+            except KeyError as e:
+                logger.error(f"Error running spider {spider_name}: {e}")
+                results.append({'spider': spider_name, 'status': 'error', 'error': str(e)})
+                continue
+            
+            logger.info(f"Scheduling spider: {spider_name}")
+            d = semaphore.run(process.crawl, crawler)
+            d.addCallbacks(
+                crawl_finished, crawl_failed,
+                callbackArgs=(spider_name, crawler), errbackArgs=(spider_name, crawler),
+            )
+            crawls.append(d)
+        
+        if crawls:
+            # Installed by the first create_crawler() call, as TWISTED_REACTOR asks
+            from twisted.internet import reactor
+            
+            # callLater, as crawls that fail right away fire this before the reactor runs
+            defer.DeferredList(crawls).addBoth(lambda _: reactor.callLater(0, reactor.stop))
+            process.start(stop_after_crawl=False)
+        
+        return results
+    
+    def run_sharded_spider(self, spider_name):
+        """Run one spider in ``shards`` worker processes sharing a request frontier"""
+        from scrapy_jobs.frontier import merge_shard_stats, run_shards
+        
+        shards = self.config['shards']
+        frontier_dir = data_path(get_project_settings().get('FRONTIER_DIR', 'frontier'), createdir=True)
+        frontier_path = os.path.join(frontier_dir, f"{spider_name}_{self.config['scraping_session_id']}.sqlite3")
+        
+        logger.info(f"Starting spider {spider_name} in {shards} shards")
+        shard_results = run_shards(spider_name, shards, frontier_path, self.session_settings())
+        
+        shard_stats = [shard.get('stats', {}) for shard in shard_results]
+        errors = [shard['error'] for shard in shard_results if 'error' in shard]
+        result = self.spider_result(spider_name, merge_shard_stats(shard_stats), '; '.join(errors) or None)
+        # The spider only succeeded if every shard did
+        for stats in shard_stats:
+            shard_status = self.spider_result(spider_name, stats)['status']
+            if result['status'] == 'success' and shard_status != 'success':
+                result['status'] = shard_status
+        result['shard_stats'] = shard_stats
+        
+        # The frontier only lives as long as the crawl
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(frontier_path + suffix):
+                os.remove(frontier_path + suffix)
+        return result
+    
+    def update_company_metrics(self):
+        """Update company hiring metrics after scraping"""
+        if not self.config.get('update_metrics', True):
+            return
+        
+        logger.info("Updating company hiring metrics...")
+        
+        try:
+            # This would integrate with your existing topHiringAlgorithm.ts
+            # For now, we'll create a simple Python equivalent
+            self.calculate_hiring_metrics()
+            logger.info("Company metrics updated successfully")
+        except Exception as e:
+            logger.error(f"Error updating company metrics: {e}")
+    
+    def calculate_hiring_metrics(self):
+        """Refresh hiring metrics of the companies whose jobs this session wrote"""
+        from scrapy_jobs.company_metrics import update_company_metrics
+        
+        is_postgres = self.config['database_url'].startswith(('postgresql', 'postgres://'))
+        conn = self.connect_database()
+        try:
+            result = update_company_metrics(
+                conn,
+                since=self.session_started_at,
+                session_id=self.config['scraping_session_id'],
+                is_postgres=is_postgres,
+            )
+        finally:
+            conn.close()
+        
+        self.stats['companies_updated'] = result['companies']
+    
+    def run_job_classification(self):
+        """Run job classification algorithms on newly scraped jobs"""
+        if not self.config.get('enable_algorithms', True):
+            return
+        
+        logger.info("Running job classification algorithms...")
+        
+        try:
+            from scrapy_jobs.classifier import classify_jobs_in_database, load_classifier
+            
+            classifier = load_classifier(self.config['category_model_path'])
+            is_postgres = self.config['database_url'].startswith(('postgresql', 'postgres://'))
+            conn = self.connect_database()
+            try:
+                # Batch re-classification of every job saved or updated in this session
+                result = classify_jobs_in_database(
+                    conn,
+                    classifier,
+                    since=self.session_started_at,
+                    is_postgres=is_postgres,
+                    min_confidence=self.config['category_min_confidence'],
+                )
+            finally:
+                conn.close()
+            
+            self.stats['jobs_processed'] += result['classified']
+            logger.info(
+                f"Job classification completed: {result['classified']} jobs, "
+                f"{result['by_model']} by model, {result['changed']} re-categorised"
+            )
+        except Exception as e:
+            logger.error(f"Error in job classification: {e}")
+    
+    def connect_database(self):
+        """Open a connection to the configured SQLite or PostgreSQL database"""
+        database_url = self.config['database_url']
+        if database_url.startswith(('postgresql', 'postgres://')):
+            import psycopg2
+            return psycopg2.connect(database_url)
+        
+        import sqlite3
+        return sqlite3.connect(database_url.replace('sqlite:///', ''))
+    
+    def generate_report(self, results):
+        """Generate a scraping report"""
+        self.stats['end_time'] = datetime.now().isoformat()
+        
+        report = {
+            'session_id': self.config['scraping_session_id'],
+            'statistics': self.stats,
+            'spider_results': results,
+            'config': self.config
+        }
+        
+        # Save report
+        report_file = f"scraping_report_{self.config['scraping_session_id']}.json"
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        
+        # Log summary
+        logger.info("\n" + "="*50)
+        logger.info("SCRAPING SESSION SUMMARY")
+        logger.info("="*50)
+        logger.info(f"Session ID: {self.config['scraping_session_id']}")
+        logger.info(f"Spiders Run: {self.stats['scrapers_run']}")
+        logger.info(f"Errors: {self.stats['errors']}")
+        logger.info(f"Report saved to: {report_file}")
+        logger.info("="*50)
+        
+        return report
+    
+    def run(self):
+        """Main execution method"""
+        logger.info("Starting job scraping orchestration...")
+        
+        try:
+            # Run all spiders
+            results = self.run_all_spiders()
+            
+            # Post-processing
+            self.update_company_metrics()
+            self.run_job_classification()
+            
+            # Generate report
+            report = self.generate_report(results)
+            
+            logger.info("Job scraping orchestration completed successfully")
+            return report
+        
+        except Exception as e:
+            logger.error(f"Fatal error in orchestration: {e}")
+            self.stats['errors'] += 1
+            raise
+
+
+def main():
+    """CLI entry point"""
+    parser = argparse.ArgumentParser(description='Workwise-SA Job Scraping Orchestrator')
+    parser.add_argument('--config', '-c', help='Configuration file path')
+    parser.add_argument('--spider', '-s', help='Run specific spider only')
+    parser.add_argument('--max-items', '-m', type=int, help='Maximum items per spider')
+    parser.add_argument('--concurrent', type=int, default=2, help='Number of concurrent spiders')
+    parser.add_argument('--shards', type=int, help='Split each spider across this many worker processes')
+    parser.add_argument('--output-format', choices=['database', 'json', 'ndjson', 'csv', 'parquet'],
+                        help='Also export the new and changed items of this run to files in this format')
+    parser.add_argument('--persistent-dedup', action='store_true',
+                        help='Skip items unchanged since a previous run instead of saving them again')
+    parser.add_argument('--dry-run', action='store_true', help='Test run without saving to database')
+    
+    args = parser.parse_args()
+    
+    # Create orchestrator
+    orchestrator = JobScrapingOrchestrator(args.config)
+    
+    # Override config with CLI args
+    if args.spider:
+        orchestrator.config['spiders'] = [args.spider]
+    if args.max_items:
+        orchestrator.config['max_items_per_spider'] = args.max_items
+    if args.concurrent:
+        orchestrator.config['concurrent_spiders'] = args.concurrent
+    if args.shards:
+        orchestrator.config['shards'] = args.shards
+    if args.output_format:
+        orchestrator.config['output_format'] = args.output_format
+    if args.persistent_dedup:
+        orchestrator.config['persistent_dedup'] = True
+    if args.dry_run:
+        orchestrator.config['database_url'] = ':memory:'  # Use in-memory database
+    
+    try:
+        report = orchestrator.run()
+        sys.exit(0 if orchestrator.stats['errors'] == 0 else 1)
+    except KeyboardInterrupt:
+        logger.info("Scraping interrupted by user")
+        sys.exit(2)
+    except Exception as e:
+        logger.error(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
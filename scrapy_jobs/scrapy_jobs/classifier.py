@@ -0,0 +1,278 @@
+import os
+import sys
+import csv
+import json
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from scrapy_jobs.matching import JOB_KEYWORD_MATCHER
+
+logger = logging.getLogger(__name__)
+
+# Default location of the trained model, relative to the Scrapy project directory
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', 'job_category.joblib')
+
+# Category used when neither the model nor the keywords decide (General Worker)
+DEFAULT_CATEGORY = 2
+
+
+def job_text(title, description=''):
+    """Text the classifiers look at for one job"""
+    return f"{title or ''} {description or ''}"
+
+
+class JobCategoryClassifier:
+    """TF-IDF + linear model classifier for job categories
+    
+    Wraps a fitted scikit-learn pipeline. Prediction is vectorised, so
+    classifying a list of jobs costs one sparse matrix product instead of one
+    model call per job.
+    """
+    
+    def __init__(self, model, metadata=None):
+        self.model = model
+        self.metadata = metadata or {}
+    
+    @classmethod
+    def train(cls, texts, labels, max_features=50000, C=10.0):
+        """Fit a new classifier on job texts and their category IDs"""
+        import numpy as np
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+        
+        model = Pipeline([
+            ('tfidf', TfidfVectorizer(
+                lowercase=True,
+                strip_accents='unicode',
+                ngram_range=(1, 2),
+                min_df=2,
+                max_features=max_features,
+                sublinear_tf=True,
+                dtype=np.float32,
+            )),
+            ('clf', LogisticRegression(C=C, max_iter=1000)),
+        ])
+        model.fit(list(texts), list(labels))
+        
+        metadata = {
+            'trained_at': datetime.utcnow().isoformat(),
+            'samples': len(labels),
+            'categories': [int(label) for label in model.classes_],
+        }
+        return cls(model, metadata)
+    
+    def predict(self, texts):
+        """Return the most likely category ID for each text"""
+        if not texts:
+            return []
+        return [int(label) for label in self.model.predict(texts)]
+    
+    def predict_with_confidence(self, texts):
+        """Return (category IDs, probabilities of those categories) for a list of texts"""
+        if not texts:
+            return [], []
+        probabilities = self.model.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        labels = [int(label) for label in self.model.classes_[best]]
+        return labels, probabilities[range(len(texts)), best].tolist()
+    
+    def save(self, path):
+        import joblib
+        
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        joblib.dump({'model': self.model, 'metadata': self.metadata}, path, compress=3)
+        logger.info(f"Saved job category model to {path}")
+    
+    @classmethod
+    def load(cls, path):
+        import joblib
+        
+        data = joblib.load(path)
+        return cls(data['model'], data.get('metadata'))
+
+
+_loaded_classifiers = {}
+_load_lock = threading.Lock()
+
+
+def load_classifier(path=None):
+    """Load a saved classifier once per process, returning None if there is no model"""
+    path = os.path.abspath(path or DEFAULT_MODEL_PATH)
+    
+    with _load_lock:
+        if path not in _loaded_classifiers:
+            classifier = None
+            if os.path.exists(path):
+                try:
+                    classifier = JobCategoryClassifier.load(path)
+                    logger.info(f"Loaded job category model from {path} ({classifier.metadata})")
+                except Exception as e:
+                    logger.error(f"Failed to load job category model {path}: {e}")
+            else:
+                logger.warning(f"No job category model at {path}, using keyword classification")
+            _loaded_classifiers[path] = classifier
+        return _loaded_classifiers[path]
+
+
+def keyword_categories(texts, default=DEFAULT_CATEGORY):
+    """Classify texts with the keyword matcher in one pass"""
+    return [
+        JOB_KEYWORD_MATCHER.best_label(hits, 'category', default=default)
+        for hits in JOB_KEYWORD_MATCHER.match_many(texts)
+    ]
+
+
+def categorize(texts, classifier=None, min_confidence=0.0):
+    """Classify a batch of job texts, returning (category IDs, number decided by the model)
+    
+    Texts the model is unsure about (probability below ``min_confidence``),
+    or all texts when there is no model, fall back to the keyword matcher.
+    """
+    categories = [None] * len(texts)
+    
+    if classifier is not None and texts:
+        try:
+            labels, confidences = classifier.predict_with_confidence(texts)
+            for index, (label, confidence) in enumerate(zip(labels, confidences)):
+                if confidence >= min_confidence:
+                    categories[index] = label
+        except Exception as e:
+            logger.error(f"Job category model failed, using keyword classification: {e}")
+    
+    undecided = [index for index, category in enumerate(categories) if category is None]
+    if undecided:
+        for index, category in zip(undecided, keyword_categories([texts[index] for index in undecided])):
+            categories[index] = category
+    
+    return categories, len(texts) - len(undecided)
+
+
+def classify_jobs_in_database(connection, classifier=None, since=None, is_postgres=False,
+                              min_confidence=0.0, batch_size=1000):
+    """Re-classify jobs updated since ``since`` (all jobs if None) in batches"""
+    placeholder = '%s' if is_postgres else '?'
+    query = "SELECT id, title, description, categoryId FROM jobs"
+    params = ()
+    if since:
+        query += f" WHERE updatedAt >= {placeholder}"
+        params = (since,)
+    
+    read_cursor = connection.cursor()
+    write_cursor = connection.cursor()
+    result = {'classified': 0, 'by_model': 0, 'changed': 0}
+    
+    try:
+        read_cursor.execute(query, params)
+        while True:
+            rows = read_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            
+            categories, by_model = categorize(
+                [job_text(row[1], row[2]) for row in rows], classifier, min_confidence
+            )
+            changes = [
+                (category, row[0])
+                for row, category in zip(rows, categories)
+                if row[3] != category
+            ]
+            if changes:
+                write_cursor.executemany(
+                    f"UPDATE jobs SET categoryId = {placeholder} WHERE id = {placeholder}", changes
+                )
+            
+            result['classified'] += len(rows)
+            result['by_model'] += by_model
+            result['changed'] += len(changes)
+        
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        read_cursor.close()
+        write_cursor.close()
+    
+    return result
+
+
+def load_training_data(path):
+    """Read (texts, category IDs) from a CSV or JSON lines file with title, description, category_id"""
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.jsonl', '.ndjson')):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+    
+    records = [record for record in records if record.get('category_id') not in (None, '')]
+    texts = [job_text(record.get('title'), record.get('description')) for record in records]
+    labels = [int(record['category_id']) for record in records]
+    return texts, labels
+
+
+def load_training_data_from_database(database_url):
+    """Read (texts, category IDs) for every categorised job in the database"""
+    if database_url.startswith('sqlite'):
+        import sqlite3
+        connection = sqlite3.connect(database_url.replace('sqlite:///', ''))
+    else:
+        import psycopg2
+        connection = psycopg2.connect(database_url)
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT title, description, categoryId FROM jobs WHERE categoryId IS NOT NULL")
+        rows = cursor.fetchall()
+    finally:
+        connection.close()
+    
+    return [job_text(title, description) for title, description, _ in rows], [int(row[2]) for row in rows]
+
+
+def main():
+    """Train a job category model: python -m scrapy_jobs.classifier --data jobs.csv"""
+    parser = argparse.ArgumentParser(description='Train the Workwise-SA job category classifier')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--data', help='CSV or JSON lines file with title, description, category_id')
+    source.add_argument('--database-url', help='Train on the categorised jobs already in this database')
+    parser.add_argument('--output', '-o', default=DEFAULT_MODEL_PATH, help='Where to save the model')
+    parser.add_argument('--test-size', type=float, default=0.2, help='Share of samples held out for evaluation')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    if args.data:
+        texts, labels = load_training_data(args.data)
+    else:
+        texts, labels = load_training_data_from_database(args.database_url)
+    
+    if len(set(labels)) < 2:
+        logger.error(f"Need at least two categories to train, got {sorted(set(labels))}")
+        sys.exit(1)
+    
+    if args.test_size > 0:
+        from sklearn.model_selection import train_test_split
+        
+        train_texts, test_texts, train_labels, test_labels = train_test_split(
+            texts, labels, test_size=args.test_size, random_state=42
+        )
+        classifier = JobCategoryClassifier.train(train_texts, train_labels)
+        
+        predicted = classifier.predict(test_texts)
+        model_accuracy = sum(p == t for p, t in zip(predicted, test_labels)) / len(test_labels)
+        keyword_accuracy = sum(p == t for p, t in zip(keyword_categories(test_texts), test_labels)) / len(test_labels)
+        logger.info(
+            f"Held-out accuracy on {len(test_labels)} jobs: model {model_accuracy:.3f}, "
+            f"keywords {keyword_accuracy:.3f}"
+        )
+    
+    # The saved model is trained on everything
+    classifier = JobCategoryClassifier.train(texts, labels)
+    classifier.save(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Jobs created within this many days count as recent
+RECENT_DAYS = 30
+
+# Running aggregates per company, refreshed for the companies a session touched
+SUMMARY_TABLE_SQL = """CREATE TABLE IF NOT EXISTS company_hiring_metrics (
+        company_id INTEGER PRIMARY KEY,
+        open_positions INTEGER NOT NULL,
+        recent_jobs INTEGER NOT NULL,
+        hiring_score INTEGER NOT NULL,
+        oldest_recent_job_at TEXT,
+        scraping_session_id TEXT,
+        computed_at TEXT NOT NULL
+    )"""
+
+INDEXES_SQL = (
+    # Finds the jobs a session wrote or touched
+    "CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updatedAt)",
+    # Aggregates one company's jobs without scanning the others
+    "CREATE INDEX IF NOT EXISTS idx_jobs_company_created_at ON jobs (companyId, createdAt)",
+    # Finds companies whose oldest recent job has aged out of the window
+    "CREATE INDEX IF NOT EXISTS idx_company_hiring_metrics_oldest_recent "
+    "ON company_hiring_metrics (oldest_recent_job_at)",
+)
+
+TOUCHED_COMPANIES_SQL = """INSERT INTO touched_companies (company_id)
+    SELECT companyId FROM jobs WHERE updatedAt >= ? AND companyId IS NOT NULL
+    UNION
+    SELECT company_id FROM company_hiring_metrics WHERE oldest_recent_job_at <= ?"""
+
+ALL_COMPANIES_SQL = """INSERT INTO touched_companies (company_id)
+    SELECT DISTINCT companyId FROM jobs WHERE companyId IS NOT NULL"""
+
+# Score as in the TypeScript top hiring algorithm: 2 per open position, 5 per recent job, capped at 100
+SUMMARY_UPSERT_SQL = """INSERT INTO company_hiring_metrics (
+        company_id, open_positions, recent_jobs, hiring_score,
+        oldest_recent_job_at, scraping_session_id, computed_at
+    )
+    SELECT company_id, open_positions, recent_jobs,
+           CASE WHEN open_positions * 2 + recent_jobs * 5 > 100 THEN 100
+                ELSE open_positions * 2 + recent_jobs * 5 END,
+           oldest_recent_job_at, ?, ?
+    FROM (
+        SELECT t.company_id,
+               COUNT(j.id) AS open_positions,
+               COUNT(CASE WHEN j.createdAt > ? THEN 1 END) AS recent_jobs,
+               MIN(CASE WHEN j.createdAt > ? THEN j.createdAt END) AS oldest_recent_job_at
+        FROM touched_companies t
+        LEFT JOIN jobs j ON j.companyId = t.company_id
+        GROUP BY t.company_id
+    ) aggregates
+    WHERE true
+    ON CONFLICT (company_id) DO UPDATE SET
+        open_positions = excluded.open_positions,
+        recent_jobs = excluded.recent_jobs,
+        hiring_score = excluded.hiring_score,
+        oldest_recent_job_at = excluded.oldest_recent_job_at,
+        scraping_session_id = excluded.scraping_session_id,
+        computed_at = excluded.computed_at"""
+
+COMPANY_UPDATE_SQL = """UPDATE companies SET
+        openPositions = m.open_positions,
+        hiringScore = m.hiring_score
+    FROM company_hiring_metrics m
+    JOIN touched_companies t ON t.company_id = m.company_id
+    WHERE companies.id = m.company_id"""
+
+# UPDATE ... FROM needs SQLite 3.33
+COMPANY_UPDATE_SUBQUERY_SQL = """UPDATE companies SET
+        openPositions = (SELECT open_positions FROM company_hiring_metrics WHERE company_id = companies.id),
+        hiringScore = (SELECT hiring_score FROM company_hiring_metrics WHERE company_id = companies.id)
+    WHERE id IN (SELECT company_id FROM touched_companies)"""
+
+
+def update_company_metrics(connection, since=None, session_id=None, is_postgres=False, now=None):
+    """Refresh hiring metrics of the companies whose jobs changed since ``since``
+    
+    Besides companies with jobs written or touched since ``since`` (ISO UTC,
+    like jobs.updatedAt), companies whose oldest recent job has left the
+    window are refreshed, so recent job counts stay exact. The first run,
+    or ``since=None``, computes every company with jobs.
+    """
+    now = now or datetime.utcnow()
+    cutoff = (now - timedelta(days=RECENT_DAYS)).isoformat()
+    cursor = connection.cursor()
+    
+    def execute(sql, params=()):
+        cursor.execute(sql.replace('?', '%s') if is_postgres else sql, params)
+    
+    try:
+        execute(SUMMARY_TABLE_SQL)
+        for index_sql in INDEXES_SQL:
+            execute(index_sql)
+        
+        execute("SELECT EXISTS (SELECT 1 FROM company_hiring_metrics)")
+        rebuild = since is None or not cursor.fetchone()[0]
+        
+        execute("CREATE TEMP TABLE IF NOT EXISTS touched_companies (company_id INTEGER PRIMARY KEY)")
+        execute("DELETE FROM touched_companies")
+        if rebuild:
+            execute(ALL_COMPANIES_SQL)
+        else:
+            execute(TOUCHED_COMPANIES_SQL, (since, cutoff))
+        execute("SELECT COUNT(*) FROM touched_companies")
+        companies = cursor.fetchone()[0]
+        
+        execute(SUMMARY_UPSERT_SQL, (session_id, now.isoformat(), cutoff, cutoff))
+        if is_postgres or sqlite3.sqlite_version_info >= (3, 33, 0):
+            execute(COMPANY_UPDATE_SQL)
+        else:
+            execute(COMPANY_UPDATE_SUBQUERY_SQL)
+        
+        execute("DROP TABLE touched_companies")
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    
+    logger.info(f"Updated hiring metrics for {companies} companies ({'full rebuild' if rebuild else 'incremental'})")
+    return {'companies': companies, 'rebuilt': rebuild}
@@ -0,0 +1,97 @@
+import logging
+import os
+import re
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentDedupStore:
+    """On-disk record of items seen in previous scraping sessions
+    
+    Each source site gets its own SQLite file inside ``store_dir`` so that
+    sites can be expired, rebuilt or copied independently. Every row keeps the
+    item key hash, a hash of the item's content and the time the item was
+    last saved to the database. Entries older than ``ttl`` seconds are
+    treated as unseen so stale ads re-enter the pipeline and get refreshed.
+    """
+    
+    def __init__(self, store_dir, ttl=7 * 24 * 3600, commit_every=500):
+        self.store_dir = store_dir
+        self.ttl = ttl
+        self.commit_every = commit_every
+        self.connections = {}
+        self.pending_writes = {}
+        os.makedirs(store_dir, exist_ok=True)
+    
+    def _shard_path(self, source_site):
+        name = re.sub(r'[^A-Za-z0-9_-]+', '_', source_site or 'unknown')
+        return os.path.join(self.store_dir, f"{name}.sqlite3")
+    
+    def _connection(self, source_site):
+        connection = self.connections.get(source_site)
+        if connection is None:
+            connection = sqlite3.connect(self._shard_path(source_site))
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS seen_items (
+                    item_hash TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                )"""
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_seen_items_last_seen ON seen_items (last_seen)")
+            expired = self._purge_expired(connection)
+            connection.commit()
+            
+            logger.info(f"Opened dedup store for {source_site} ({expired} expired entries removed)")
+            self.connections[source_site] = connection
+            self.pending_writes[source_site] = 0
+        return connection
+    
+    def _purge_expired(self, connection):
+        if not self.ttl:
+            return 0
+        cursor = connection.execute("DELETE FROM seen_items WHERE last_seen < ?", (time.time() - self.ttl,))
+        return cursor.rowcount
+    
+    def is_unchanged(self, source_site, item_hash, content_hash):
+        """Return True if the item was seen with the same content within the TTL"""
+        row = self._connection(source_site).execute(
+            "SELECT content_hash, last_seen FROM seen_items WHERE item_hash = ?",
+            (item_hash,)
+        ).fetchone()
+        
+        if not row:
+            return False
+        if self.ttl and time.time() - row[1] > self.ttl:
+            return False
+        return row[0] == content_hash
+    
+    def record(self, source_site, item_hash, content_hash):
+        """Remember that the item was saved to the database"""
+        connection = self._connection(source_site)
+        now = time.time()
+        connection.execute(
+            """INSERT INTO seen_items (item_hash, content_hash, first_seen, last_seen)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(item_hash) DO UPDATE SET
+                   content_hash = excluded.content_hash,
+                   last_seen = excluded.last_seen""",
+            (item_hash, content_hash, now, now)
+        )
+        
+        self.pending_writes[source_site] += 1
+        if self.pending_writes[source_site] >= self.commit_every:
+            connection.commit()
+            self.pending_writes[source_site] = 0
+    
+    def close(self):
+        for source_site, connection in self.connections.items():
+            connection.commit()
+            connection.close()
+        self.connections = {}
+        self.pending_writes = {}
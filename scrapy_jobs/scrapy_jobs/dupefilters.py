@@ -0,0 +1,227 @@
+import hashlib
+import logging
+import math
+import sys
+from array import array
+from pathlib import Path
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint_to_int(fingerprint):
+    """Fold a request fingerprint (bytes) into a non-zero 64-bit integer"""
+    value = int.from_bytes(fingerprint[:8], 'big')
+    # 0 marks an empty slot in FingerprintTable
+    return value or 1
+
+
+class FingerprintTable:
+    """Open-addressing hash set of 64-bit fingerprints backed by an array
+    
+    Each fingerprint costs 8 bytes per slot (about 11 bytes per entry at the
+    maximum load factor) instead of a hex string object plus a set entry.
+    """
+    
+    MAX_LOAD = 0.7
+    
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity / self.MAX_LOAD:
+            size <<= 1
+        self.slots = array('Q', bytes(8 * size))
+        self.mask = size - 1
+        self.count = 0
+    
+    def add(self, value):
+        """Add value, returning False if it was already present"""
+        index = value & self.mask
+        slots = self.slots
+        while True:
+            current = slots[index]
+            if current == 0:
+                break
+            if current == value:
+                return False
+            index = (index + 1) & self.mask
+        
+        slots[index] = value
+        self.count += 1
+        if self.count > self.MAX_LOAD * len(slots):
+            self._grow()
+        return True
+    
+    def __contains__(self, value):
+        index = value & self.mask
+        while True:
+            current = self.slots[index]
+            if current == 0:
+                return False
+            if current == value:
+                return True
+            index = (index + 1) & self.mask
+    
+    def _grow(self):
+        old_slots = self.slots
+        self.slots = array('Q', bytes(16 * len(old_slots)))
+        self.mask = len(self.slots) - 1
+        self.count = 0
+        for value in old_slots:
+            if value:
+                self.add(value)
+    
+    def __len__(self):
+        return self.count
+    
+    @property
+    def nbytes(self):
+        return self.slots.itemsize * len(self.slots)
+
+
+class BloomFilter:
+    """Fixed-capacity Bloom filter over 64-bit fingerprints"""
+    
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+    
+    def _positions(self, value):
+        # Double hashing from the two halves of the fingerprint
+        h1 = value & 0xFFFFFFFF
+        h2 = (value >> 32) | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+    
+    def __contains__(self, value):
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(value))
+    
+    def add(self, value):
+        for pos in self._positions(value):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+    
+    @property
+    def is_full(self):
+        return self.count >= self.capacity
+
+
+class ScalableBloomFilter:
+    """Bloom filter that grows by chaining filters with tightening error rates
+    
+    The overall false-positive rate stays below ``error_rate`` however many
+    fingerprints are added (Almeida et al., "Scalable Bloom Filters").
+    """
+    
+    GROWTH = 2
+    TIGHTENING = 0.5
+    
+    def __init__(self, initial_capacity=100000, error_rate=0.001):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.filters = []
+        self._add_filter()
+    
+    def _add_filter(self):
+        index = len(self.filters)
+        capacity = self.initial_capacity * self.GROWTH ** index
+        error_rate = self.error_rate * (1 - self.TIGHTENING) * self.TIGHTENING ** index
+        self.filters.append(BloomFilter(capacity, error_rate))
+    
+    def add(self, value):
+        """Add value, returning False if it was (probably) already present"""
+        if value in self:
+            return False
+        if self.filters[-1].is_full:
+            self._add_filter()
+        self.filters[-1].add(value)
+        return True
+    
+    def __contains__(self, value):
+        return any(value in bloom for bloom in self.filters)
+    
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+    
+    @property
+    def nbytes(self):
+        return sum(len(bloom.bits) for bloom in self.filters)
+
+
+class CompactDupeFilter(RFPDupeFilter):
+    """Memory-bounded request dupefilter for long crawls
+    
+    Fingerprints are kept as 64-bit integers in a ``FingerprintTable``, or in
+    a ``ScalableBloomFilter`` when ``DUPEFILTER_MODE = 'bloom'`` (a small,
+    configurable share of new requests may then be dropped as false
+    positives). When the spider defines ``extract_external_id``, detail URLs
+    are keyed by the ad's external ID so that variants of the same ad with
+    different tracking parameters collapse to one entry.
+    """
+    
+    def __init__(self, path=None, debug=False, *, fingerprinter=None, mode='table',
+                 bloom_capacity=100000, bloom_error_rate=0.001, key_func=None):
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.fingerprints = None
+        self.mode = mode
+        if mode == 'bloom':
+            self.seen = ScalableBloomFilter(bloom_capacity, bloom_error_rate)
+        else:
+            self.seen = FingerprintTable()
+        self.key_func = key_func
+        
+        if path:
+            # Append-only log of 8-byte fingerprints so JOBDIR crawls can resume
+            seen_path = Path(path, 'requests.seen.bin')
+            if seen_path.exists():
+                saved = array('Q')
+                saved.frombytes(seen_path.read_bytes())
+                for value in saved:
+                    self.seen.add(value)
+                logger.info(f"Loaded {len(saved)} request fingerprints from {seen_path}")
+            self.file = seen_path.open('ab')
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        spider = getattr(crawler, 'spider', None)
+        key_func = getattr(spider, 'extract_external_id', None)
+        return cls(
+            job_dir(settings),
+            settings.getbool('DUPEFILTER_DEBUG'),
+            fingerprinter=crawler.request_fingerprinter,
+            mode=settings.get('DUPEFILTER_MODE', 'table'),
+            bloom_capacity=settings.getint('DUPEFILTER_BLOOM_INITIAL_CAPACITY', 100000),
+            bloom_error_rate=settings.getfloat('DUPEFILTER_BLOOM_ERROR_RATE', 0.001),
+            key_func=key_func,
+        )
+    
+    def request_seen(self, request):
+        fp = self.request_fingerprint(request)
+        if not self.seen.add(fp):
+            return True
+        if self.file:
+            self.file.write(fp.to_bytes(8, sys.byteorder))
+        return False
+    
+    def request_fingerprint(self, request):
+        """Return a 64-bit integer that identifies the specified request"""
+        if self.key_func and request.method == 'GET':
+            external_id = self.key_func(request.url)
+            if external_id:
+                digest = hashlib.sha1(f"external_id:{external_id}".encode('utf-8')).digest()
+                return fingerprint_to_int(digest)
+        return fingerprint_to_int(self.fingerprinter.fingerprint(request))
+    
+    def close(self, reason):
+        logger.info(
+            f"Dupefilter ({self.mode}) saw {len(self.seen)} unique requests "
+            f"using {self.seen.nbytes / 1024:.1f} KiB"
+        )
+        super().close(reason)
@@ -0,0 +1,315 @@
+"""
+Streaming export of scraped items to NDJSON, CSV or Parquet files
+
+Items are written as they pass through the pipeline, so memory use doesn't
+depend on how many items a session scrapes. Files are partitioned by item
+type, source site and scraping session, and rotated once they reach
+``EXPORT_MAX_FILE_BYTES``:
+
+    exports/jobs/source_site=gumtree/session=20261017_031916/part-00000.ndjson.gz
+
+Files being written end in ``.inprogress`` and get their final name when
+they are rotated or the spider closes.
+
+A session's export is a delta, not a snapshot: ExportPipeline runs after
+DeduplicationPipeline, so it only sees the items the session saves to the
+database. Jobs that were unchanged since an earlier session (answered with
+304, or dropped by the persistent dedup store) are not in it. A full copy
+means combining a session's partition with the earlier ones, or reading
+the database.
+"""
+
+import io
+import os
+import csv
+import gzip
+import json
+import logging
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import NotConfigured
+
+from scrapy_jobs.frontier import shard_suffix
+from scrapy_jobs.items import CompanyItem, JobItem, JobRecord, adapt_item
+
+logger = logging.getLogger(__name__)
+
+# Item types exported, with the directory each is written to
+ITEM_TYPES = ((JobItem, 'jobs'), (JobRecord, 'jobs'), (CompanyItem, 'companies'))
+
+# Parquet column types other than string
+PARQUET_TYPES = {
+    'is_featured': 'bool',
+    'is_urgent': 'bool',
+    'is_actively_hiring': 'bool',
+    'category_id': 'int64',
+    'company_id': 'int64',
+    'employee_count': 'int64',
+    'founded_year': 'int64',
+    'open_positions': 'int64',
+}
+
+COMPRESSION_EXTENSIONS = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+def export_value(value):
+    """Scalars as they are, anything else (e.g. lists of skills) as JSON"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return json.dumps(value, default=str, ensure_ascii=False)
+
+
+def partition_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value or 'unknown'))
+
+
+class ExportFile(ABC):
+    """One export file being written, compressed on the fly"""
+    
+    extension = ''
+    
+    def __init__(self, path, columns, compression=None):
+        self.path = path
+        self.columns = columns
+        self.compression = compression
+        self.raw = open(path, 'wb')
+        if compression == 'gzip':
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        elif compression == 'zstd':
+            import zstandard
+            self.stream = zstandard.ZstdCompressor().stream_writer(self.raw, closefd=False)
+        else:
+            self.stream = self.raw
+        self.rows = 0
+    
+    @property
+    def bytes_written(self):
+        """Bytes on disk so far, after compression"""
+        return self.raw.tell()
+    
+    @abstractmethod
+    def write(self, item):
+        """Write one item, given as a mapping (see adapt_item)"""
+    
+    def close(self):
+        if self.stream is not self.raw:
+            self.stream.close()
+        self.raw.close()
+
+
+class NdjsonExportFile(ExportFile):
+    """One JSON object per line, with the fields the item has set"""
+    
+    extension = '.ndjson'
+    
+    def write(self, item):
+        # JobRecords hold unset fields as None, JobItems leave them out
+        line = json.dumps(
+            {key: export_value(value) for key, value in item.items() if value is not None}, ensure_ascii=False
+        )
+        self.stream.write(line.encode('utf-8') + b'\n')
+        self.rows += 1
+
+
+class CsvExportFile(ExportFile):
+    """CSV with a header row and one column per item field"""
+    
+    extension = '.csv'
+    
+    def __init__(self, path, columns, compression=None):
+        super().__init__(path, columns, compression)
+        self.text = io.TextIOWrapper(self.stream, encoding='utf-8', newline='', write_through=True)
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(columns)
+    
+    def write(self, item):
+        self.writer.writerow([export_value(item.get(column)) for column in self.columns])
+        self.rows += 1
+    
+    def close(self):
+        # Leave the underlying streams to ExportFile.close
+        self.text.detach()
+        super().close()
+
+
+class ParquetExportFile(ExportFile):
+    """Parquet file written one row group of ``row_group_size`` items at a time"""
+    
+    extension = '.parquet'
+    
+    def __init__(self, path, columns, compression=None, row_group_size=10000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        # Parquet compresses its column chunks itself
+        super().__init__(path, columns)
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.type_for_alias(PARQUET_TYPES.get(column, 'string'))) for column in columns])
+        self.writer = pq.ParquetWriter(self.raw, self.schema, compression=compression or 'none')
+        self.row_group_size = row_group_size
+        self.buffer = {column: [] for column in columns}
+        self.buffered = 0
+    
+    def write(self, item):
+        for column in self.columns:
+            self.buffer[column].append(self.parquet_value(column, item.get(column)))
+        self.buffered += 1
+        self.rows += 1
+        if self.buffered >= self.row_group_size:
+            self.write_row_group()
+    
+    @staticmethod
+    def parquet_value(column, value):
+        if value is None:
+            return None
+        kind = PARQUET_TYPES.get(column)
+        if kind == 'bool':
+            return bool(value)
+        if kind == 'int64':
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        value = export_value(value)
+        return value if isinstance(value, str) else str(value)
+    
+    def write_row_group(self):
+        if self.buffered:
+            self.writer.write_table(self.pa.Table.from_pydict(self.buffer, schema=self.schema))
+            self.buffer = {column: [] for column in self.columns}
+            self.buffered = 0
+    
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
+        super().close()
+
+
+EXPORT_FORMATS = {
+    'ndjson': NdjsonExportFile,
+    # output_format = 'json' in run_scrapers.py
+    'json': NdjsonExportFile,
+    'csv': CsvExportFile,
+    'parquet': ParquetExportFile,
+}
+
+
+class ExportPipeline:
+    """Stream job and company items to partitioned export files
+    
+    Enabled by ``EXPORT_FORMAT`` ('ndjson', 'csv' or 'parquet'), alongside
+    the database. NDJSON and CSV are compressed with ``EXPORT_COMPRESSION``
+    ('gzip', 'zstd' or None), Parquet column chunks with the same codec.
+    
+    It sits after deduplication and category mapping, so exported jobs carry
+    their category, and each session exports only new and changed items (see
+    the module docstring).
+    """
+    
+    def __init__(self, export_dir, export_format, session_id, compression='gzip', max_file_bytes=128 * 1024 * 1024,
+                 row_group_size=10000, file_prefix='part', stats=None):
+        self.export_dir = export_dir
+        self.file_class = EXPORT_FORMATS[export_format]
+        self.session_id = session_id
+        self.compression = compression
+        self.max_file_bytes = max_file_bytes
+        self.row_group_size = row_group_size
+        self.file_prefix = file_prefix
+        self.stats = stats
+        # Open file and number of the next file per (item type, source site)
+        self.files = {}
+        self.next_part = {}
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        export_format = settings.get('EXPORT_FORMAT')
+        if not export_format or export_format == 'database':
+            raise NotConfigured
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"EXPORT_FORMAT must be one of {sorted(EXPORT_FORMATS)}, got {export_format!r}")
+        
+        compression = settings.get('EXPORT_COMPRESSION') or None
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"EXPORT_COMPRESSION must be 'gzip', 'zstd' or None, got {compression!r}")
+        
+        try:
+            if export_format == 'parquet':
+                import pyarrow.parquet  # noqa: F401
+            elif compression == 'zstd':
+                import zstandard  # noqa: F401
+        except ImportError as e:
+            raise NotConfigured(f"Export to {export_format} with {compression} compression needs {e.name}")
+        
+        return cls(
+            export_dir=settings.get('EXPORT_DIR', 'exports'),
+            export_format=export_format,
+            session_id=settings.get('SCRAPING_SESSION_ID') or datetime.now().strftime('%Y%m%d_%H%M%S'),
+            compression=compression,
+            max_file_bytes=settings.getint('EXPORT_MAX_FILE_BYTES', 128 * 1024 * 1024),
+            row_group_size=settings.getint('EXPORT_PARQUET_ROW_GROUP_SIZE', 10000),
+            # Workers of a sharded crawl share partitions but not files
+            file_prefix='part' + shard_suffix(settings),
+            stats=crawler.stats,
+        )
+    
+    def close_spider(self, spider):
+        for key in list(self.files):
+            self._close_file(key)
+    
+    def process_item(self, item, spider):
+        for item_class, item_type in ITEM_TYPES:
+            if isinstance(item, item_class):
+                break
+        else:
+            return item
+        
+        adapter = adapt_item(item)
+        key = (item_type, adapter.get('source_site') or spider.name)
+        export_file = self.files.get(key) or self._open_file(key, item_class)
+        export_file.write(adapter)
+        if self.stats:
+            self.stats.inc_value(f'export/{item_type}')
+        
+        if export_file.bytes_written >= self.max_file_bytes:
+            self._close_file(key)
+        return item
+    
+    def _open_file(self, key, item_class):
+        item_type, source_site = key
+        directory = os.path.join(
+            self.export_dir, item_type, f'source_site={partition_name(source_site)}',
+            f'session={partition_name(self.session_id)}'
+        )
+        os.makedirs(directory, exist_ok=True)
+        
+        extension = self.file_class.extension
+        if self.file_class is not ParquetExportFile:
+            extension += COMPRESSION_EXTENSIONS[self.compression]
+        # Continue numbering after files left by an earlier run of the same session
+        part = self.next_part.get(key, 0)
+        while os.path.exists(os.path.join(directory, f'{self.file_prefix}-{part:05d}{extension}')):
+            part += 1
+        self.next_part[key] = part + 1
+        
+        path = os.path.join(directory, f'{self.file_prefix}-{part:05d}{extension}')
+        columns = sorted(ItemAdapter.get_field_names_from_class(item_class))
+        if self.file_class is ParquetExportFile:
+            export_file = ParquetExportFile(path + '.inprogress', columns, self.compression, self.row_group_size)
+        else:
+            export_file = self.file_class(path + '.inprogress', columns, self.compression)
+        self.files[key] = export_file
+        return export_file
+    
+    def _close_file(self, key):
+        export_file = self.files.pop(key)
+        export_file.close()
+        path = export_file.path[:-len('.inprogress')]
+        os.replace(export_file.path, path)
+        if self.stats:
+            self.stats.inc_value('export/files')
+            self.stats.inc_value('export/bytes', os.path.getsize(path))
+        logger.info(f"Exported {export_file.rows} items to {path}")
@@ -0,0 +1,118 @@
+import re
+from collections import Counter, namedtuple
+
+# Rand amount such as "5000", "5 000" or "12,500,000"
+AMOUNT = r'\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?'
+RAND_AMOUNT = rf'R\s*{AMOUNT}(?:\s*[-–]\s*R?\s*{AMOUNT})?(?:\s*per\s*month|pm|/month)?'
+
+# Salary patterns (South African formats), in priority order
+SALARY_PATTERNS = [
+    ('rand_amount', RAND_AMOUNT),
+    ('amount_range', rf'{AMOUNT}\s*[-–]\s*{AMOUNT}(?:\s*per\s*month|pm)'),
+    ('salary_label', rf'salary[:\s]*R?\s*{AMOUNT}'),
+]
+
+# Company name patterns in priority order, the ``value`` group holds the
+# name. Patterns that start with the name only try at the start of a run of
+# name characters, which finds the same leftmost match without retrying
+# inside every word.
+COMPANY_PATTERNS = [
+    ('company_label', r'Company[:\s]+(?P<value>[A-Za-z\s&]+)'),
+    ('employer_label', r'Employer[:\s]+(?P<value>[A-Za-z\s&]+)'),
+    ('is_looking_for', r'(?<![A-Za-z\s&])(?P<value>[A-Za-z\s&]+)\s+is\s+looking\s+for'),
+    ('join', r'Join\s+(?P<value>[A-Za-z\s&]+)'),
+    ('seeks', r'(?<![A-Za-z\s&])(?P<value>[A-Za-z\s&]+)\s+seeks?'),
+]
+
+Extraction = namedtuple('Extraction', ['value', 'span', 'pattern'])
+
+
+class ExtractionEngine:
+    """Extract several fields from free text with one precompiled regex scan
+    
+    All patterns of all fields are compiled into a single regex with a named
+    group per pattern, so one left-to-right pass over a description finds
+    every field. Each field gets the leftmost match of its highest-priority
+    pattern that matches anywhere, the same result as trying its patterns
+    one by one with re.search in table order. Every hit is counted per
+    pattern so patterns that never match can be found and pruned.
+    """
+    
+    def __init__(self, pattern_sets, flags=re.IGNORECASE):
+        # pattern_sets: {field: [(pattern name, regex)]}
+        self.pattern_sets = pattern_sets
+        self.flags = flags
+        self.hits = Counter()
+        self.scans = 0
+        self._compiled = {}
+        self.pattern = self._compile(tuple(pattern_sets))
+    
+    def _compile(self, fields):
+        """Combined regex for a subset of fields and its groups per field, compiled once and cached"""
+        compiled = self._compiled.get(fields)
+        if compiled is None:
+            anywhere = []
+            lookaheads = []
+            groups = []
+            for field in fields:
+                alternatives = []
+                field_groups = []
+                for name, regex in self.pattern_sets[field]:
+                    group = f"{field}__{name}"
+                    value_group = f"{group}__value" if '(?P<value>' in regex else group
+                    anywhere.append(regex.replace('(?P<value>', '(?:'))
+                    alternatives.append(f"(?P<{group}>{regex.replace('(?P<value>', f'(?P<{value_group}>')})")
+                    field_groups.append((name, group, value_group))
+                # Optional and zero-width, so one field's match can't hide another's at the same position
+                lookaheads.append(f"(?:(?={'|'.join(alternatives)}))?")
+                groups.append((field, field_groups))
+            # Only stop at positions where some pattern matches
+            pattern = re.compile(f"(?=(?:{'|'.join(anywhere)})){''.join(lookaheads)}", self.flags)
+            compiled = self._compiled[fields] = (pattern, groups)
+        return compiled
+    
+    def scan(self, text, fields=None):
+        """Return {field: Extraction(value, span, pattern)} from each field's highest-priority matching pattern"""
+        results = {}
+        if not text:
+            return results
+        
+        fields = tuple(field for field in self.pattern_sets if fields is None or field in fields)
+        pattern, groups = self._compile(fields)
+        self.scans += 1
+        
+        # Priority of the pattern behind each field's current result, 0 being the best
+        priorities = {}
+        for match in pattern.finditer(text):
+            for field, field_groups in groups:
+                # At one position a field's alternation reports its highest-priority pattern only, which
+                # is enough: a pattern hidden there by a better one can't win the field anyway
+                for priority, (name, group, value_group) in enumerate(field_groups[:priorities.get(field)]):
+                    if match.start(group) != -1:
+                        results[field] = Extraction(match.group(value_group).strip(), match.span(group), name)
+                        priorities[field] = priority
+                        break
+            
+            if len(priorities) == len(fields) and not any(priorities.values()):
+                break
+        
+        for field, extraction in results.items():
+            self.hits[f"{field}__{extraction.pattern}"] += 1
+        return results
+    
+    def hit_counts(self):
+        """Hits per pattern as {'field/pattern': count}, including patterns never hit"""
+        return {
+            f"{field}/{name}": self.hits[f"{field}__{name}"]
+            for field, patterns in self.pattern_sets.items()
+            for name, _ in patterns
+        }
+    
+    def dead_patterns(self):
+        return [name for name, count in self.hit_counts().items() if not count]
+
+
+JOB_EXTRACTOR = ExtractionEngine({
+    'salary': SALARY_PATTERNS,
+    'company': COMPANY_PATTERNS,
+})
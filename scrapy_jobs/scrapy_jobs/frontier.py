@@ -0,0 +1,366 @@
+"""
+Sharded crawling: one spider split across several worker processes
+
+Every worker runs the spider with ``ShardedScheduler``. A request belongs to
+one shard, chosen by its dupefilter fingerprint (or pinned with the
+``frontier_shard`` meta key), and requests for other shards are handed over
+through a ``SharedFrontier`` SQLite file. As each fingerprint has exactly one
+owner, the owner's dupefilter alone decides whether a request is new, and a
+URL always lands in the same shard's HTTP cache.
+
+    python run_scrapers.py --spider gumtree_jobs --shards 4
+"""
+
+import time
+import heapq
+import pickle
+import logging
+import sqlite3
+import itertools
+import multiprocessing
+from datetime import datetime
+
+from scrapy import signals
+from scrapy.core.scheduler import BaseScheduler
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.misc import build_from_crawler, load_object
+from scrapy.utils.request import request_from_dict
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_CLASS = 'scrapy_jobs.frontier.ShardedScheduler'
+
+# Stats combined across shards with max() instead of a sum
+MAX_STATS = ('elapsed_time_seconds', 'finish_time')
+
+
+def shard_suffix(settings):
+    """File name suffix for per-worker files in a sharded crawl, '' otherwise"""
+    if settings.getint('FRONTIER_SHARDS', 1) <= 1:
+        return ''
+    return f"-shard{settings.getint('FRONTIER_SHARD_INDEX', 0)}"
+
+
+def jsonable_stats(stats):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in stats.items()}
+
+
+class SharedFrontier:
+    """SQLite request queue and worker registry shared by the shards of a crawl
+    
+    Workers are registered busy up front, so none of them finishes before the
+    others had a chance to start. A worker counts as gone when its heartbeat
+    is older than ``worker_timeout`` and requests left for it are abandoned.
+    """
+    
+    def __init__(self, path, shards, worker_timeout=300, timeout=30):
+        self.path = path
+        self.shards = shards
+        self.worker_timeout = worker_timeout
+        # Autocommit, transactions are opened explicitly
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS requests (
+                id INTEGER PRIMARY KEY,
+                shard INTEGER NOT NULL,
+                priority INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )"""
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_requests_shard ON requests (shard, priority DESC, id)")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS workers (
+                shard INTEGER PRIMARY KEY,
+                busy INTEGER NOT NULL,
+                heartbeat REAL NOT NULL
+            )"""
+        )
+        now = time.time()
+        self.db.executemany(
+            "INSERT OR IGNORE INTO workers (shard, busy, heartbeat) VALUES (?, 1, ?)",
+            [(shard, now) for shard in range(shards)]
+        )
+    
+    def push(self, rows):
+        """Queue (shard, priority, data) rows"""
+        with self.transaction():
+            self.db.executemany("INSERT INTO requests (shard, priority, data) VALUES (?, ?, ?)", rows)
+    
+    def pop(self, shard, limit):
+        """Take up to ``limit`` of the highest priority requests queued for ``shard``"""
+        # Cheap read first, only take the write lock when there is something to take
+        if not self.pending(shard):
+            return []
+        with self.transaction():
+            rows = self.db.execute(
+                """DELETE FROM requests WHERE id IN (
+                       SELECT id FROM requests WHERE shard = ? ORDER BY priority DESC, id LIMIT ?
+                   ) RETURNING priority, data""",
+                (shard, limit)
+            ).fetchall()
+            if rows:
+                self.db.execute("UPDATE workers SET busy = 1, heartbeat = ? WHERE shard = ?", (time.time(), shard))
+        return rows
+    
+    def pending(self, shard):
+        return self.db.execute("SELECT EXISTS (SELECT 1 FROM requests WHERE shard = ?)", (shard,)).fetchone()[0]
+    
+    def heartbeat(self, shard, busy=None):
+        if busy is None:
+            self.db.execute("UPDATE workers SET heartbeat = ? WHERE shard = ?", (time.time(), shard))
+        else:
+            self.db.execute("UPDATE workers SET busy = ?, heartbeat = ? WHERE shard = ?", (int(busy), time.time(), shard))
+    
+    def is_finished(self):
+        """True once no live worker is busy and no live worker has requests queued"""
+        cutoff = time.time() - self.worker_timeout
+        return not self.db.execute(
+            """SELECT EXISTS (SELECT 1 FROM workers WHERE busy = 1 AND heartbeat > ?)
+                   OR EXISTS (SELECT 1 FROM requests JOIN workers USING (shard) WHERE heartbeat > ?)""",
+            (cutoff, cutoff)
+        ).fetchone()[0]
+    
+    def transaction(self):
+        return FrontierTransaction(self.db)
+    
+    def close(self):
+        self.db.close()
+
+
+class FrontierTransaction:
+    """Write transaction taking the database lock up front"""
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+
+class ShardedScheduler(BaseScheduler):
+    """Scheduler for one worker of a sharded crawl
+    
+    Requests of this worker's shard go straight into an in-memory priority
+    queue. Requests of other shards are buffered and pushed to the
+    ``SharedFrontier`` in batches of ``FRONTIER_BATCH_SIZE`` or every
+    ``FRONTIER_FLUSH_INTERVAL`` seconds. When idle, the worker pulls its
+    shard's requests from the frontier and only closes once every worker
+    is idle and nothing is left to crawl.
+    """
+    
+    HEARTBEAT_INTERVAL = 5
+    
+    def __init__(self, crawler, dupefilter, frontier_path, shards, shard_index,
+                 batch_size=64, flush_interval=0.5, worker_timeout=300):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.df = dupefilter
+        self.frontier_path = frontier_path
+        self.shards = shards
+        self.shard_index = shard_index
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.worker_timeout = worker_timeout
+        self.frontier = None
+        self.spider = None
+        self.queue = []
+        self.counter = itertools.count()
+        self.outbox = []
+        self.last_flush = time.monotonic()
+        self.last_heartbeat = time.monotonic()
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        frontier_path = settings.get('FRONTIER_PATH')
+        if not frontier_path:
+            raise ValueError("ShardedScheduler needs FRONTIER_PATH, the frontier database shared by all shards")
+        
+        shards = settings.getint('FRONTIER_SHARDS', 1)
+        shard_index = settings.getint('FRONTIER_SHARD_INDEX', 0)
+        if not 0 <= shard_index < shards:
+            raise ValueError(f"FRONTIER_SHARD_INDEX must be between 0 and {shards - 1}, got {shard_index}")
+        
+        return cls(
+            crawler,
+            build_from_crawler(load_object(settings['DUPEFILTER_CLASS']), crawler),
+            frontier_path,
+            shards,
+            shard_index,
+            batch_size=settings.getint('FRONTIER_BATCH_SIZE', 64),
+            flush_interval=settings.getfloat('FRONTIER_FLUSH_INTERVAL', 0.5),
+            worker_timeout=settings.getfloat('FRONTIER_WORKER_TIMEOUT', 300),
+        )
+    
+    def open(self, spider):
+        self.spider = spider
+        self.frontier = SharedFrontier(self.frontier_path, self.shards, self.worker_timeout)
+        self.crawler.signals.connect(self.spider_idle, signal=signals.spider_idle)
+        logger.info(f"Crawling shard {self.shard_index} of {self.shards} through {self.frontier_path}")
+        return self.df.open()
+    
+    def close(self, reason):
+        self.flush()
+        self.frontier.heartbeat(self.shard_index, busy=False)
+        self.frontier.close()
+        return self.df.close(reason)
+    
+    def __len__(self):
+        return len(self.queue) + len(self.outbox)
+    
+    def has_pending_requests(self):
+        return bool(self.queue or self.outbox) or bool(self.frontier.pending(self.shard_index))
+    
+    def shard_for(self, request):
+        shard = request.meta.get('frontier_shard')
+        if shard is not None:
+            return shard % self.shards
+        fingerprint = self.df.request_fingerprint(request)
+        if isinstance(fingerprint, str):
+            # RFPDupeFilter fingerprints are hex digests
+            fingerprint = int(fingerprint[:16], 16)
+        return fingerprint % self.shards
+    
+    def enqueue_request(self, request):
+        if not request.dont_filter and self.df.request_seen(request):
+            self.df.log(request, self.spider)
+            return False
+        
+        shard = self.shard_for(request)
+        if shard == self.shard_index:
+            self.push_local(request)
+            self.stats.inc_value('frontier/enqueued/local', spider=self.spider)
+            return True
+        
+        data = pickle.dumps(request.to_dict(spider=self.spider), protocol=pickle.HIGHEST_PROTOCOL)
+        self.outbox.append((shard, request.priority, data))
+        self.stats.inc_value('frontier/enqueued/remote', spider=self.spider)
+        if len(self.outbox) >= self.batch_size:
+            self.flush()
+        return True
+    
+    def next_request(self):
+        now = time.monotonic()
+        if self.outbox and now - self.last_flush >= self.flush_interval:
+            self.flush()
+        if now - self.last_heartbeat >= self.HEARTBEAT_INTERVAL:
+            self.frontier.heartbeat(self.shard_index)
+            self.last_heartbeat = now
+        
+        if not self.queue:
+            self.receive()
+        if not self.queue:
+            return None
+        self.stats.inc_value('frontier/dequeued', spider=self.spider)
+        return heapq.heappop(self.queue)[-1]
+    
+    def push_local(self, request):
+        heapq.heappush(self.queue, (-request.priority, next(self.counter), request))
+    
+    def receive(self):
+        """Move a batch of this shard's requests from the frontier to the local queue"""
+        for priority, data in self.frontier.pop(self.shard_index, self.batch_size):
+            request = request_from_dict(pickle.loads(data), spider=self.spider)
+            # This worker owns the request's fingerprint, so its dupefilter has the final say
+            if not request.dont_filter and self.df.request_seen(request):
+                self.stats.inc_value('frontier/duplicates', spider=self.spider)
+                continue
+            self.push_local(request)
+            self.stats.inc_value('frontier/received', spider=self.spider)
+    
+    def flush(self):
+        if self.outbox:
+            self.frontier.push(self.outbox)
+            self.stats.inc_value('frontier/flushes', spider=self.spider)
+            self.outbox = []
+        self.last_flush = time.monotonic()
+    
+    def spider_idle(self, spider):
+        """Keep the worker open while other workers may still hand it requests"""
+        self.flush()
+        self.frontier.heartbeat(self.shard_index, busy=False)
+        self.last_heartbeat = time.monotonic()
+        if not self.frontier.is_finished():
+            self.stats.inc_value('frontier/idle_waits', spider=spider)
+            raise DontCloseSpider
+
+
+def crawl_shard(spider_name, overrides, spider_kwargs, connection):
+    """Worker process: crawl one shard and send its stats back to the launcher"""
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    
+    try:
+        settings = get_project_settings()
+        settings.setdict(overrides, priority='cmdline')
+        process = CrawlerProcess(settings)
+        crawler = process.create_crawler(spider_name)
+        process.crawl(crawler, **spider_kwargs)
+        process.start()
+        connection.send({'stats': jsonable_stats(crawler.stats.get_stats())})
+    except Exception as e:
+        logger.exception(f"Shard {overrides.get('FRONTIER_SHARD_INDEX')} of {spider_name} failed")
+        connection.send({'error': str(e)})
+    finally:
+        connection.close()
+
+
+def run_shards(spider_name, shards, frontier_path, overrides=None, spider_kwargs=None):
+    """Crawl ``spider_name`` with ``shards`` worker processes and return each worker's result
+    
+    Results are dicts with the worker's ``stats``, or an ``error`` message.
+    """
+    # Register every worker before any of them can finish
+    SharedFrontier(frontier_path, shards).close()
+    
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    for shard_index in range(shards):
+        worker_overrides = dict(
+            overrides or {},
+            SCHEDULER=SCHEDULER_CLASS,
+            FRONTIER_PATH=frontier_path,
+            FRONTIER_SHARDS=shards,
+            FRONTIER_SHARD_INDEX=shard_index,
+        )
+        connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(
+            target=crawl_shard,
+            args=(spider_name, worker_overrides, spider_kwargs or {}, child_connection),
+            name=f'{spider_name}-shard{shard_index}',
+        )
+        process.start()
+        child_connection.close()
+        workers.append((process, connection))
+    
+    results = []
+    for process, connection in workers:
+        try:
+            result = connection.recv()
+        except EOFError:
+            result = None
+        process.join()
+        results.append(result or {'error': f'{process.name} exited with code {process.exitcode}'})
+    return results
+
+
+def merge_shard_stats(shard_stats):
+    """Combine the crawl stats of all shards: numbers are summed, timestamps span all shards"""
+    merged = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            if key not in merged:
+                merged[key] = value
+            elif key in MAX_STATS:
+                merged[key] = max(merged[key], value)
+            elif key == 'start_time':
+                merged[key] = min(merged[key], value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] += value
+    return merged
@@ -0,0 +1,185 @@
+import logging
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+
+from scrapy_jobs.frontier import shard_suffix
+
+logger = logging.getLogger(__name__)
+
+
+class RevalidatingCachePolicy(RFC2616Policy):
+    """HTTP cache policy that revalidates cached pages instead of refetching them
+    
+    Cached responses are considered fresh for at most
+    ``HTTPCACHE_REVALIDATE_AFTER_SECS`` (0 = always revalidate). After that
+    the request is sent with ``If-None-Match`` / ``If-Modified-Since`` built
+    from the stored ``ETag`` / ``Last-Modified`` validators, and a ``304 Not
+    Modified`` answer is served from the cache. Such requests get
+    ``meta['http_cache_revalidated'] = True`` so callbacks can skip parsing
+    a page they have already seen.
+    
+    Use with ``HTTPCACHE_EXPIRATION_SECS = 0``, otherwise the storage drops
+    expired entries, validators included, before they can be revalidated.
+    """
+    
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.revalidate_after = max(settings.getint('HTTPCACHE_REVALIDATE_AFTER_SECS', 0), 0)
+    
+    def _compute_freshness_lifetime(self, response, request, now):
+        # However long the server says a page stays fresh, check back after revalidate_after
+        lifetime = super()._compute_freshness_lifetime(response, request, now)
+        return min(lifetime, self.revalidate_after)
+    
+    def is_cached_response_valid(self, cachedresponse, response, request):
+        if response.status == 304:
+            request.meta['http_cache_revalidated'] = True
+        return super().is_cached_response_valid(cachedresponse, response, request)
+
+
+class SqliteCacheStorage:
+    """HTTP cache storage keeping every response of a spider in one SQLite file
+    
+    Bodies are zlib-compressed and stored next to their status, URL and
+    headers in a table keyed by request fingerprint, so a lookup or a write
+    is a single primary-key operation. The compressed size of all entries is
+    tracked in memory; when it exceeds ``HTTPCACHE_MAX_BYTES`` the least
+    recently used entries are evicted down to 90% of the budget, and the
+    freed pages are handed back to the filesystem with an incremental vacuum
+    while the crawl runs.
+    """
+    
+    # Evict down to this share of the byte budget, so eviction runs in batches
+    EVICT_TO = 0.9
+    COMMIT_EVERY = 100
+    
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'], createdir=True)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.max_bytes = settings.getint('HTTPCACHE_MAX_BYTES', 0)
+        self.compression_level = settings.getint('HTTPCACHE_COMPRESSION_LEVEL', 6)
+        # Each worker of a sharded crawl caches the URLs of its own shard
+        self.file_suffix = shard_suffix(settings)
+        self.db = None
+        self.stats = None
+        self.total_bytes = 0
+        self.pending_writes = 0
+    
+    def open_spider(self, spider):
+        path = os.path.join(self.cachedir, f"{spider.name}{self.file_suffix}.sqlite3")
+        self.db = sqlite3.connect(path)
+        # auto_vacuum only takes effect when set before the first table is created
+        self.db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.db.execute("PRAGMA journal_mode = WAL")
+        self.db.execute("PRAGMA synchronous = NORMAL")
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                fingerprint BLOB PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers BLOB NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at)")
+        self.db.commit()
+        
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+        logger.debug(f"Using SQLite cache storage in {path} ({self.total_bytes} bytes cached)")
+    
+    def close_spider(self, spider):
+        self._evict()
+        self.db.commit()
+        self.db.close()
+        self.stats.set_value('httpcache/bytes', self.total_bytes)
+    
+    def retrieve_response(self, spider, request):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self.db.execute(
+            "SELECT url, status, headers, body, stored_at FROM responses WHERE fingerprint = ?",
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None  # not cached
+        
+        url, status, headers, body, stored_at = row
+        now = time.time()
+        if 0 < self.expiration_secs < now - stored_at:
+            return None  # expired
+        
+        self.db.execute("UPDATE responses SET accessed_at = ? WHERE fingerprint = ?", (now, fingerprint))
+        self._written()
+        
+        headers = Headers(pickle.loads(headers))
+        body = zlib.decompress(body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+    
+    def store_response(self, spider, request, response):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        headers = pickle.dumps(dict(response.headers), protocol=4)
+        body = zlib.compress(response.body, self.compression_level)
+        size = len(response.url) + len(headers) + len(body)
+        now = time.time()
+        
+        previous = self.db.execute("SELECT size FROM responses WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        self.db.execute(
+            """INSERT OR REPLACE INTO responses
+               (fingerprint, url, status, headers, body, size, stored_at, accessed_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (fingerprint, response.url, response.status, headers, body, size, now, now)
+        )
+        self.total_bytes += size - (previous[0] if previous else 0)
+        self._written()
+        
+        if self.max_bytes and self.total_bytes > self.max_bytes:
+            self._evict()
+    
+    def _written(self):
+        self.pending_writes += 1
+        if self.pending_writes >= self.COMMIT_EVERY:
+            self.db.commit()
+            self.pending_writes = 0
+    
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under budget"""
+        if not self.max_bytes or self.total_bytes <= self.max_bytes:
+            return
+        
+        target = self.max_bytes * self.EVICT_TO
+        evicted = 0
+        while self.total_bytes > target:
+            rows = self.db.execute(
+                "SELECT fingerprint, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                break
+            
+            victims = []
+            for fingerprint, size in rows:
+                victims.append((fingerprint,))
+                self.total_bytes -= size
+                if self.total_bytes <= target:
+                    break
+            self.db.executemany("DELETE FROM responses WHERE fingerprint = ?", victims)
+            evicted += len(victims)
+        
+        self.db.commit()
+        # Return the freed pages to the filesystem
+        self.db.execute("PRAGMA incremental_vacuum")
+        self.pending_writes = 0
+        self.stats.inc_value('httpcache/evictions', evicted)
+        logger.debug(f"Evicted {evicted} cached responses, {self.total_bytes} bytes left")
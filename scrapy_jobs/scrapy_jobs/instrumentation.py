@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import bisect
+import inspect
+import logging
+from collections import Counter, deque
+from functools import wraps
+
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import deferred_from_coro
+from scrapy.utils.project import data_path
+from twisted.internet import defer, task
+
+from scrapy_jobs.frontier import shard_suffix
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds: 10 µs to ~100 s, four buckets per doubling
+LATENCY_BUCKETS = [0.00001 * 2 ** (index / 4) for index in range(94)]
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram, cheap enough to update on every call
+    
+    Percentiles are the upper bound of the bucket they fall in (at most ~19%
+    above the true value), capped at the largest observed latency.
+    """
+    
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+    
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                bound = LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+
+class StageMetrics:
+    """Latency histograms, drop reasons and queue depths per crawl stage"""
+    
+    def __init__(self):
+        self.latencies = {}
+        self.drops = {}
+        self.queues = {}
+        self.queue_max = Counter()
+    
+    def observe(self, stage, seconds):
+        histogram = self.latencies.get(stage)
+        if histogram is None:
+            histogram = self.latencies[stage] = LatencyHistogram()
+        histogram.observe(seconds)
+    
+    def drop(self, stage, reason):
+        self.drops.setdefault(stage, Counter())[reason] += 1
+    
+    def set_depth(self, queue, depth):
+        self.queues[queue] = depth
+        if depth > self.queue_max[queue]:
+            self.queue_max[queue] = depth
+    
+    def to_dict(self):
+        return {
+            'stages': {
+                stage: {
+                    'count': histogram.count,
+                    'sum_s': round(histogram.total, 6),
+                    **{f'p{int(q * 100)}_ms': round(histogram.percentile(q) * 1000, 3) for q in QUANTILES},
+                    'max_ms': round(histogram.max * 1000, 3),
+                }
+                for stage, histogram in sorted(self.latencies.items())
+            },
+            'queues': {
+                queue: {'current': depth, 'max': self.queue_max[queue]}
+                for queue, depth in sorted(self.queues.items())
+            },
+            'drops': {stage: dict(reasons) for stage, reasons in sorted(self.drops.items())},
+        }
+    
+    def to_prometheus(self, spider_name):
+        """Prometheus text exposition format (latencies as summaries)"""
+        labels = prometheus_labels
+        lines = [
+            '# HELP scrapy_stage_latency_seconds Time spent per call in each crawl stage',
+            '# TYPE scrapy_stage_latency_seconds summary',
+        ]
+        for stage, histogram in sorted(self.latencies.items()):
+            for q in QUANTILES:
+                lines.append(
+                    f'scrapy_stage_latency_seconds{labels(spider=spider_name, stage=stage, quantile=q)} '
+                    f'{histogram.percentile(q):.6f}'
+                )
+            lines.append(f'scrapy_stage_latency_seconds_sum{labels(spider=spider_name, stage=stage)} {histogram.total:.6f}')
+            lines.append(f'scrapy_stage_latency_seconds_count{labels(spider=spider_name, stage=stage)} {histogram.count}')
+        
+        lines += ['# HELP scrapy_queue_depth Items or requests waiting in each queue', '# TYPE scrapy_queue_depth gauge']
+        for queue, depth in sorted(self.queues.items()):
+            lines.append(f'scrapy_queue_depth{labels(spider=spider_name, queue=queue)} {depth}')
+        lines += ['# HELP scrapy_queue_depth_max Deepest each queue has been', '# TYPE scrapy_queue_depth_max gauge']
+        for queue, depth in sorted(self.queue_max.items()):
+            lines.append(f'scrapy_queue_depth_max{labels(spider=spider_name, queue=queue)} {depth}')
+        
+        lines += ['# HELP scrapy_stage_drops_total Items dropped per stage and reason', '# TYPE scrapy_stage_drops_total counter']
+        for stage, reasons in sorted(self.drops.items()):
+            for reason, count in sorted(reasons.items()):
+                lines.append(f'scrapy_stage_drops_total{labels(spider=spider_name, stage=stage, reason=reason)} {count}')
+        
+        return '\n'.join(lines) + '\n'
+
+
+def prometheus_labels(**values):
+    pairs = []
+    for key, value in values.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def drop_reason(exception):
+    """Short, low-cardinality reason for a DropItem, e.g. 'duplicate_item_found'"""
+    reason = str(exception).split(':', 1)[0].strip().lower()[:60]
+    return '_'.join(reason.replace("'", '').split()) or type(exception).__name__
+
+
+def component_name(method):
+    """Class name of the component a (possibly wrapped) bound method belongs to"""
+    owner = getattr(inspect.unwrap(method), '__self__', None)
+    return type(owner).__name__ if owner is not None else getattr(method, '__qualname__', repr(method))
+
+
+class InstrumentationExtension:
+    """Record per-stage latency, queue depth and drop reasons for a crawl
+    
+    On spider open, every item pipeline ``process_item`` and every downloader
+    middleware hook is wrapped to time each call (until its Deferred fires,
+    so backpressure shows up as latency) and, for pipelines, to count
+    ``DropItem`` reasons. Download times come from ``download_latency`` and
+    callback parsing time from ``ParseTimingMiddleware``. Queue depths of
+    the scheduler, downloader, scraper and of pipelines exposing
+    ``queue_depth()`` are sampled every ``INSTRUMENTATION_SAMPLE_INTERVAL``.
+    
+    Percentiles go into the crawl stats on close, and the metrics are dumped
+    every ``INSTRUMENTATION_DUMP_INTERVAL`` seconds to
+    ``INSTRUMENTATION_DUMP_DIR/<spider>.prom`` (or ``.json``).
+    """
+    
+    def __init__(self, crawler, dump_dir, dump_format='prometheus', dump_interval=30, sample_interval=1.0):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.metrics = StageMetrics()
+        self.dump_dir = dump_dir
+        self.dump_format = dump_format
+        self.dump_interval = dump_interval
+        self.sample_interval = sample_interval
+        self.spider_name = None
+        # Workers of a sharded crawl dump to their own file
+        self.file_suffix = shard_suffix(crawler.settings)
+        self.loops = []
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('INSTRUMENTATION_ENABLED'):
+            raise NotConfigured
+        
+        dump_format = settings.get('INSTRUMENTATION_DUMP_FORMAT', 'prometheus')
+        if dump_format not in ('prometheus', 'json'):
+            raise ValueError(f"INSTRUMENTATION_DUMP_FORMAT must be 'prometheus' or 'json', got {dump_format!r}")
+        
+        extension = cls(
+            crawler,
+            dump_dir=settings.get('INSTRUMENTATION_DUMP_DIR', 'metrics'),
+            dump_format=dump_format,
+            dump_interval=settings.getfloat('INSTRUMENTATION_DUMP_INTERVAL', 30),
+            sample_interval=settings.getfloat('INSTRUMENTATION_SAMPLE_INTERVAL', 1.0),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        return extension
+    
+    def spider_opened(self, spider):
+        self.spider_name = spider.name
+        engine = self.crawler.engine
+        self.instrument_item_pipelines(engine.scraper.itemproc)
+        self.instrument_downloader_middlewares(engine.downloader.middleware)
+        
+        if self.sample_interval > 0:
+            self.start_loop(self.sample_queues, self.sample_interval)
+        if self.dump_dir and self.dump_interval > 0:
+            self.start_loop(self.dump, self.dump_interval)
+    
+    def start_loop(self, func, interval):
+        loop = task.LoopingCall(func)
+        loop.start(interval, now=False)
+        self.loops.append(loop)
+    
+    def spider_closed(self, spider, reason):
+        for loop in self.loops:
+            if loop.running:
+                loop.stop()
+        self.sample_queues()
+        
+        for stage, histogram in self.metrics.latencies.items():
+            self.stats.set_value(f'latency/{stage}/count', histogram.count)
+            for q in QUANTILES:
+                self.stats.set_value(f'latency/{stage}/p{int(q * 100)}_ms', round(histogram.percentile(q) * 1000, 3))
+        for queue, depth in self.metrics.queue_max.items():
+            self.stats.set_value(f'queue/{queue}/max', depth)
+        
+        if self.dump_dir:
+            self.dump()
+    
+    def response_received(self, response, request, spider):
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.metrics.observe('download', latency)
+    
+    def instrument_item_pipelines(self, itemproc):
+        itemproc.methods['process_item'] = deque(
+            self.timed(method, f'pipeline/{component_name(method)}', count_drops=True)
+            for method in itemproc.methods['process_item']
+        )
+    
+    def instrument_downloader_middlewares(self, middleware):
+        for hook in ('process_request', 'process_response', 'process_exception'):
+            middleware.methods[hook] = deque(
+                self.timed(method, f'downloader/{component_name(method)}.{hook}')
+                for method in middleware.methods[hook]
+            )
+    
+    def timed(self, method, stage, count_drops=False):
+        """Wrap a component method so each call's latency (and drop reason) is recorded"""
+        metrics = self.metrics
+        stats = self.stats
+        
+        def record_drop(exception):
+            reason = drop_reason(exception)
+            metrics.drop(stage, reason)
+            stats.inc_value(f'drops/{stage}/{reason}')
+        
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except DropItem as e:
+                metrics.observe(stage, time.perf_counter() - started)
+                if count_drops:
+                    record_drop(e)
+                raise
+            except Exception:
+                metrics.observe(stage, time.perf_counter() - started)
+                raise
+            
+            if inspect.isawaitable(result) and not isinstance(result, defer.Deferred):
+                result = deferred_from_coro(result)
+            if isinstance(result, defer.Deferred):
+                def finished(outcome):
+                    metrics.observe(stage, time.perf_counter() - started)
+                    if count_drops and hasattr(outcome, 'check') and outcome.check(DropItem):
+                        record_drop(outcome.value)
+                    return outcome
+                return result.addBoth(finished)
+            
+            metrics.observe(stage, time.perf_counter() - started)
+            return result
+        
+        return wrapper
+    
+    def sample_queues(self):
+        engine = self.crawler.engine
+        if engine is None:
+            return
+        
+        slot = getattr(engine, '_slot', None) or getattr(engine, 'slot', None)
+        if slot is not None and slot.scheduler is not None:
+            self.metrics.set_depth('scheduler', len(slot.scheduler))
+        self.metrics.set_depth('downloader/active', len(engine.downloader.active))
+        
+        scraper_slot = engine.scraper.slot
+        if scraper_slot is not None:
+            self.metrics.set_depth('scraper/active', len(scraper_slot.active))
+            self.metrics.set_depth('scraper/items_in_pipelines', scraper_slot.itemproc_size)
+        
+        for pipeline in engine.scraper.itemproc.middlewares:
+            if hasattr(pipeline, 'queue_depth'):
+                self.metrics.set_depth(f'pipeline/{type(pipeline).__name__}', pipeline.queue_depth())
+    
+    def dump(self):
+        """Write the current metrics, replacing the previous dump atomically"""
+        directory = data_path(self.dump_dir, createdir=True)
+        extension = 'prom' if self.dump_format == 'prometheus' else 'json'
+        path = os.path.join(directory, f'{self.spider_name}{self.file_suffix}.{extension}')
+        
+        if self.dump_format == 'prometheus':
+            content = self.metrics.to_prometheus(self.spider_name)
+        else:
+            content = json.dumps({'spider': self.spider_name, 'timestamp': time.time(), **self.metrics.to_dict()}, indent=2)
+        
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+
+
+class ParseTimingMiddleware:
+    """Spider middleware timing spider callbacks, reported by InstrumentationExtension
+    
+    Callbacks are generators, so the time is measured around each step of
+    the callback's output, which excludes work done by later middlewares
+    and the rest of the engine while the output is being consumed.
+    """
+    
+    def __init__(self, metrics):
+        self.metrics = metrics
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        for extension in crawler.extensions.middlewares:
+            if isinstance(extension, InstrumentationExtension):
+                return cls(extension.metrics)
+        raise NotConfigured
+    
+    @staticmethod
+    def stage(response):
+        callback = response.request.callback if response.request is not None else None
+        return f"parse/{getattr(callback, '__name__', 'parse')}"
+    
+    def process_spider_output(self, response, result, spider):
+        stage = self.stage(response)
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            started = time.perf_counter()
+            try:
+                output = next(iterator)
+            except StopIteration:
+                self.metrics.observe(stage, elapsed + time.perf_counter() - started)
+                return
+            elapsed += time.perf_counter() - started
+            yield output
+    
+    async def process_spider_output_async(self, response, result, spider):
+        stage = self.stage(response)
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        while True:
+            started = time.perf_counter()
+            try:
+                output = await iterator.__anext__()
+            except StopAsyncIteration:
+                self.metrics.observe(stage, elapsed + time.perf_counter() - started)
+                return
+            elapsed += time.perf_counter() - started
+            yield output
@@ -2,13 +2,29 @@ import scrapy
 from scrapy import Item, Field
 from itemloaders.processors import TakeFirst, MapCompose, Join
 import re
+import dataclasses
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Optional
+
+from collections.abc import KeysView
+
+from itemadapter import ItemAdapter
+from itemadapter.adapter import AdapterInterface
+
+from scrapy_jobs.locations import resolve_location
+
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Salary labels and period suffixes, stripped in a single pass
+SALARY_NOISE_RE = re.compile(r'salary[:\s]*|per month|/month|pm|per annum|/annum|pa')
 
 
 def clean_text(value):
     """Clean text by removing extra whitespace and newlines"""
     if value:
-        return re.sub(r'\s+', ' ', value.strip())
+        return WHITESPACE_RE.sub(' ', value.strip())
     return value
 
 
@@ -18,10 +34,7 @@ def extract_salary_range(salary_text):
         return None
     
     # Remove common prefixes/suffixes
-    salary_text = salary_text.lower()
-    salary_text = re.sub(r'salary[:\s]*', '', salary_text)
-    salary_text = re.sub(r'per month|/month|pm', '', salary_text)
-    salary_text = re.sub(r'per annum|/annum|pa', '', salary_text)
+    salary_text = SALARY_NOISE_RE.sub('', salary_text.lower())
     
     return salary_text.strip()
 
@@ -34,23 +47,12 @@ def parse_location(location):
     # Clean location text
     location = clean_text(location)
     
-    # Standardize common SA locations
-    location_mappings = {
-        'jhb': 'Johannesburg',
-        'jozi': 'Johannesburg',
-        'cpt': 'Cape Town',
-        'ct': 'Cape Town',
-        'dbn': 'Durban',
-        'pta': 'Pretoria',
-        'pe': 'Port Elizabeth',
-        'gqeberha': 'Port Elizabeth',
-        'bloem': 'Bloemfontein',
-    }
-    
-    location_lower = location.lower()
-    for abbrev, full_name in location_mappings.items():
-        if abbrev in location_lower:
-            return full_name
+    # Standardize SA locations against the gazetteer (scrapy_jobs/data/sa_locations.json)
+    resolved = resolve_location(location)
+    if resolved.city:
+        return resolved.city
+    if resolved.province:
+        return resolved.province
     
     return location
 
@@ -218,3 +220,187 @@ class CompanyItem(scrapy.Item):
     scraping_session_id = Field(
         output_processor=TakeFirst()
     )
+
+
+class JobSeenItem(scrapy.Item):
+    """Marks an already saved job as still live without re-parsing its page"""
+    
+    source_site = Field()
+    external_id = Field()
+    source_url = Field()
+    seen_at = Field()
+
+
+@dataclass(slots=True)
+class JobRecord:
+    """Compact job record with the same fields as JobItem, built by JobRecordLoader
+    
+    Slotted instead of dict-backed, so a record holds its values without a
+    per-item dict. Pipelines read and write it through itemadapter; fields
+    that were never set are None rather than missing.
+    """
+    
+    # Basic job information
+    title: Optional[str] = None
+    description: Optional[str] = None
+    
+    # Company information
+    company_name: Optional[str] = None
+    company_logo: Optional[str] = None
+    
+    # Location and remote work
+    location: Optional[str] = None
+    work_mode: Optional[str] = None
+    
+    # Job details
+    job_type: Optional[str] = None
+    salary: Optional[str] = None
+    experience_level: Optional[str] = None
+    
+    # Requirements and skills
+    requirements: Optional[str] = None
+    skills: Optional[list] = None
+    
+    # Dates and metadata
+    posted_date: Optional[str] = None
+    closing_date: Optional[str] = None
+    
+    # Source information
+    source_url: Optional[str] = None
+    source_site: Optional[str] = None
+    external_id: Optional[str] = None
+    
+    # Additional fields
+    apply_url: Optional[str] = None
+    is_featured: Optional[bool] = None
+    is_urgent: Optional[bool] = None
+    
+    # Workwise-SA specific fields
+    category_id: Optional[int] = None
+    company_id: Optional[int] = None
+    
+    # Scraping metadata
+    scraped_at: Optional[str] = None
+    scraping_session_id: Optional[str] = None
+
+
+class JobRecordAdapter(AdapterInterface):
+    """itemadapter adapter for JobRecord, with the field lookup built once rather than per item
+    
+    itemadapter's generic DataclassAdapter looks up the fields of every
+    dataclass it wraps. JobRecord's fields are fixed, so they are looked up
+    once here and the mapping methods work from that.
+    """
+    
+    record_fields = {field.name: field for field in dataclasses.fields(JobRecord)}
+    
+    @classmethod
+    def is_item(cls, item):
+        return type(item) is JobRecord
+    
+    @classmethod
+    def is_item_class(cls, item_class):
+        return item_class is JobRecord
+    
+    @classmethod
+    def get_field_meta_from_class(cls, item_class, field_name):
+        if field_name not in cls.record_fields:
+            raise KeyError(f"{item_class.__name__} does not support field: {field_name}")
+        return cls.record_fields[field_name].metadata
+    
+    @classmethod
+    def get_field_names_from_class(cls, item_class):
+        return list(cls.record_fields)
+    
+    def field_names(self):
+        return KeysView(self.record_fields)
+    
+    def __getitem__(self, field_name):
+        if field_name in self.record_fields:
+            return getattr(self.item, field_name)
+        raise KeyError(field_name)
+    
+    def __setitem__(self, field_name, value):
+        if field_name not in self.record_fields:
+            raise KeyError(f"JobRecord does not support field: {field_name}")
+        setattr(self.item, field_name, value)
+    
+    def __delitem__(self, field_name):
+        if field_name not in self.record_fields or not hasattr(self.item, field_name):
+            raise KeyError(field_name)
+        delattr(self.item, field_name)
+    
+    def __iter__(self):
+        return iter(name for name in self.record_fields if hasattr(self.item, name))
+    
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def register_item_adapters():
+    """Put JobRecordAdapter ahead of itemadapter's generic dataclass adapter
+    
+    ``ItemAdapter.ADAPTER_CLASSES`` is process-wide, so this is called
+    explicitly by whatever produces JobRecords (GumtreeJobsSpider with
+    JOB_RECORDS_FAST_PATH) rather than on import; calling it again is a no-op.
+    Without it JobRecords still work, through the slower generic adapter.
+    """
+    if JobRecordAdapter not in ItemAdapter.ADAPTER_CLASSES:
+        ItemAdapter.ADAPTER_CLASSES.appendleft(JobRecordAdapter)
+
+# Item classes the pipelines treat as jobs
+JOB_ITEM_CLASSES = (JobItem, JobRecord)
+
+# Per JobItem field: its input processor's functions and its output processor
+JOB_FIELD_PROCESSORS = {
+    name: (field['input_processor'].functions if 'input_processor' in field else (), field.get('output_processor'))
+    for name, field in JobItem.fields.items()
+}
+
+
+class JobRecordLoader:
+    """Lightweight stand-in for ItemLoader(item=JobItem()) that loads a JobRecord
+    
+    ``add_value`` calls the cleaning functions of JobItem's input processors
+    directly, and ``load_item`` applies the field's output processor, so a
+    record gets the same values a loaded JobItem would, without ItemLoader's
+    per-value processor and context machinery.
+    """
+    
+    def __init__(self):
+        self.values = {}
+    
+    def add_value(self, field_name, value):
+        if value is None:
+            return
+        values = list(value) if isinstance(value, (list, tuple)) else [value]
+        for function in JOB_FIELD_PROCESSORS[field_name][0]:
+            values = [result for result in map(function, values) if result is not None]
+        if values:
+            self.values.setdefault(field_name, []).extend(values)
+    
+    def load_item(self):
+        record = JobRecord()
+        for field_name, values in self.values.items():
+            output_processor = JOB_FIELD_PROCESSORS[field_name][1]
+            value = output_processor(values) if output_processor else values
+            if value is not None:
+                setattr(record, field_name, value)
+        return record
+
+
+def adapt_item(item):
+    """Mapping access to an item's fields: Scrapy Items already are mappings, other item types get an ItemAdapter"""
+    return item if isinstance(item, scrapy.Item) else ItemAdapter(item)
+
+
+def field_value(adapter, field_name, default=None):
+    """``adapter.get(field_name, default)``, also using the default for fields a JobRecord holds as None"""
+    value = adapter.get(field_name)
+    return default if value is None else value
+
+
+def set_default(adapter, field_name, value):
+    """``adapter.setdefault``, also filling fields a JobRecord holds as None"""
+    if adapter.get(field_name) is None:
+        adapter[field_name] = value
@@ -0,0 +1,129 @@
+import os
+import re
+import json
+import logging
+from collections import namedtuple
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Gazetteer of South African provinces, cities and suburbs
+DEFAULT_GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'sa_locations.json')
+
+TOKEN_RE = re.compile(r'[^\W_]+')
+
+ResolvedLocation = namedtuple('ResolvedLocation', ['city_id', 'city', 'province_id', 'province', 'suburb'])
+
+UNRESOLVED = ResolvedLocation(None, None, None, None, None)
+
+
+class LocationGazetteer:
+    """Token-level gazetteer that resolves free-text locations to canonical places
+    
+    Every alias (``"jhb"``, ``"cape town cbd"``, ``"sandton"``) is indexed in
+    a trie keyed by whole tokens, so a location string is resolved with one
+    left-to-right pass taking the longest alias at each position. Short
+    aliases such as ``"ct"`` or ``"pe"`` only match as complete tokens.
+    Results are memoised per raw string.
+    """
+    
+    def __init__(self, provinces, cities, cache_size=10000):
+        self.provinces = {province['id']: province for province in provinces}
+        self.cities = {city['id']: city for city in cities}
+        self.trie = {}
+        
+        for province in provinces:
+            for alias in [province['name']] + province.get('aliases', []):
+                self._add_alias(alias, ('province', province['id'], None))
+        
+        for city in cities:
+            if city['province'] not in self.provinces:
+                raise ValueError(f"City {city['id']} has unknown province {city['province']}")
+            for alias in [city['name']] + city.get('aliases', []):
+                self._add_alias(alias, ('city', city['id'], None))
+            for suburb in city.get('suburbs', []):
+                self._add_alias(suburb, ('suburb', city['id'], suburb.title()))
+        
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+    
+    @classmethod
+    def from_file(cls, path=None, cache_size=10000):
+        path = path or DEFAULT_GAZETTEER_PATH
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        gazetteer = cls(data['provinces'], data['cities'], cache_size)
+        logger.debug(f"Loaded location gazetteer from {path}: {len(gazetteer.cities)} cities")
+        return gazetteer
+    
+    @staticmethod
+    def tokenize(text):
+        # "Mitchell's Plain" -> ['mitchells', 'plain']
+        return TOKEN_RE.findall(text.lower().replace("'", '').replace('’', ''))
+    
+    def _add_alias(self, alias, entry):
+        node = self.trie
+        for token in self.tokenize(alias):
+            node = node.setdefault(token, {})
+        if None in node and node[None] != entry:
+            raise ValueError(f"Location alias '{alias}' is ambiguous: {node[None]} and {entry}")
+        node[None] = entry
+    
+    def _resolve(self, text):
+        """Resolve a location string to a ResolvedLocation (fields are None when unknown)"""
+        if not text:
+            return UNRESOLVED
+        
+        tokens = self.tokenize(text)
+        city_id = province_id = suburb = None
+        position = 0
+        
+        while position < len(tokens):
+            # Longest alias starting at this token
+            node = self.trie
+            entry = None
+            end = position
+            for index in range(position, len(tokens)):
+                node = node.get(tokens[index])
+                if node is None:
+                    break
+                if None in node:
+                    entry = node[None]
+                    end = index + 1
+            
+            if entry is None:
+                position += 1
+                continue
+            position = end
+            
+            kind, place_id, suburb_name = entry
+            if kind == 'province':
+                province_id = province_id or place_id
+            elif city_id is None:
+                # The first city or suburb mentioned wins
+                city_id = place_id
+                suburb = suburb_name
+        
+        if city_id:
+            # A city implies its province, even if the text names another one
+            province_id = self.cities[city_id]['province']
+        if not city_id and not province_id:
+            return UNRESOLVED
+        
+        return ResolvedLocation(
+            city_id,
+            self.cities[city_id]['name'] if city_id else None,
+            province_id,
+            self.provinces[province_id]['name'],
+            suburb
+        )
+
+
+@lru_cache(maxsize=None)
+def get_gazetteer(path=None):
+    """Load the gazetteer once per process"""
+    return LocationGazetteer.from_file(path)
+
+
+def resolve_location(text):
+    """Resolve a location string with the default South African gazetteer"""
+    return get_gazetteer().resolve(text)
@@ -0,0 +1,139 @@
+import re
+from bisect import bisect_right
+
+
+# Category keywords, keyed by Workwise-SA category ID
+CATEGORY_KEYWORDS = {
+    1: ['cashier', 'teller', 'sales', 'retail', 'store', 'shop'],  # Retail
+    2: ['general', 'worker', 'labourer', 'helper', 'assistant', 'warehouse'],  # General Worker
+    3: ['security', 'guard', 'protection', 'surveillance'],  # Security
+    4: ['petrol', 'fuel', 'attendant', 'service station'],  # Petrol Attendant
+    5: ['nanny', 'childcare', 'babysitter', 'au pair'],  # Childcare
+    6: ['cleaner', 'cleaning', 'janitor', 'housekeeping', 'domestic'],  # Cleaning
+    7: ['gardener', 'landscaping', 'grounds', 'maintenance', 'garden']  # Landscaping
+}
+
+# Job type keywords in priority order; no hit means Full-time
+JOB_TYPE_KEYWORDS = {
+    'Part-time': ['part time', 'part-time', 'weekend', 'casual'],
+    'Contract': ['contract', 'temporary', 'temp', 'fixed term'],
+    'Internship': ['internship', 'intern', 'learnership'],
+}
+
+# Work mode keywords in priority order; no hit means On-site
+WORK_MODE_KEYWORDS = {
+    'Remote': ['remote', 'work from home', 'wfh', 'online'],
+    'Hybrid': ['hybrid', 'flexible'],
+}
+
+
+def _trie_pattern(node):
+    """Render a character trie as a regex whose alternatives share prefixes"""
+    alternatives = []
+    for char in sorted(key for key in node if key):
+        token = r'\s+' if char == ' ' else re.escape(char)
+        alternatives.append(token + _trie_pattern(node[char]))
+    
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and '' not in node:
+        return alternatives[0]
+    
+    pattern = '(?:' + '|'.join(alternatives) + ')'
+    # A keyword ends here, so the longer continuations are optional
+    if '' in node:
+        pattern += '?'
+    return pattern
+
+
+class KeywordMatcher:
+    """Single-pass, word-boundary-aware matcher for several keyword tables
+    
+    All keywords are folded into one trie, compiled once into a single regex,
+    so one scan over a text finds every keyword of every table. Keywords only
+    match whole words (a plural ``s``/``es`` is allowed), so ``intern`` no
+    longer fires on "international" nor ``temp`` on "temperature".
+    """
+    
+    def __init__(self, tables):
+        # tables: {group: {label: [keywords]}}, label order is kept for tie-breaking
+        self.tables = tables
+        self.keyword_labels = {}
+        trie = {}
+        
+        for group, table in tables.items():
+            for label, keywords in table.items():
+                for keyword in keywords:
+                    keyword = self.normalize(keyword)
+                    self.keyword_labels.setdefault(keyword, []).append((group, label))
+                    
+                    node = trie
+                    for char in keyword:
+                        node = node.setdefault(char, {})
+                    node[''] = True
+        
+        # Texts are lowercased up front, which is much cheaper than re.IGNORECASE
+        self.pattern = re.compile(r'\b(' + _trie_pattern(trie) + r')(?:e?s)?\b')
+    
+    @staticmethod
+    def normalize(keyword):
+        return ' '.join(keyword.lower().split())
+    
+    def _empty_hits(self):
+        return {group: {} for group in self.tables}
+    
+    def _add_hit(self, hits, match):
+        keyword = self.normalize(match.group(1))
+        for group, label in self.keyword_labels[keyword]:
+            hits[group].setdefault(label, set()).add(keyword)
+    
+    def match(self, text):
+        """Return {group: {label: set of matched keywords}} for one text"""
+        hits = self._empty_hits()
+        if text:
+            for match in self.pattern.finditer(text.lower()):
+                self._add_hit(hits, match)
+        return hits
+    
+    def match_many(self, texts):
+        """Match a list of texts with a single scan over their concatenation"""
+        results = [self._empty_hits() for _ in texts]
+        if not results:
+            return results
+        
+        # NUL is neither a word nor a space character, so matches never span texts
+        # Lowercase before measuring, lower() can change a string's length
+        lowered = [(text or '').lower() for text in texts]
+        offsets = []
+        position = 0
+        for text in lowered:
+            offsets.append(position)
+            position += len(text) + 1
+        
+        joined = '\x00'.join(lowered)
+        for match in self.pattern.finditer(joined):
+            self._add_hit(results[bisect_right(offsets, match.start()) - 1], match)
+        return results
+    
+    def best_label(self, hits, group, default=None):
+        """Label with the most distinct keyword hits, ties going to the earlier label"""
+        scores = hits[group]
+        if not scores:
+            return default
+        return max((label for label in self.tables[group] if label in scores),
+                   key=lambda label: len(scores[label]))
+    
+    def first_label(self, hits, group, default=None):
+        """First label in table order with any hit"""
+        scores = hits[group]
+        for label in self.tables[group]:
+            if label in scores:
+                return label
+        return default
+
+
+JOB_KEYWORD_MATCHER = KeywordMatcher({
+    'category': CATEGORY_KEYWORDS,
+    'job_type': JOB_TYPE_KEYWORDS,
+    'work_mode': WORK_MODE_KEYWORDS,
+})
@@ -3,11 +3,24 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+import heapq
 import random
 import logging
+import itertools
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import unquote, urlparse
+
 from scrapy import signals
 from scrapy.http import HtmlResponse
+from scrapy.exceptions import DontCloseSpider, IgnoreRequest, NotConfigured
+from scrapy.downloadermiddlewares.retry import RetryMiddleware as BaseRetryMiddleware
 from scrapy.downloadermiddlewares.useragent import UserAgentMiddleware
+from scrapy.utils.defer import maybe_deferred_to_future
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.response import response_status_message
+from w3lib.http import basic_auth_header
 
 logger = logging.getLogger(__name__)
 
@@ -31,23 +44,229 @@ class RotateUserAgentMiddleware(UserAgentMiddleware):
         return None
 
 
+def load_proxy_list(settings):
+    """Proxy URLs from PROXY_LIST plus PROXY_LIST_FILE (one per line, # comments)"""
+    proxies = list(settings.getlist('PROXY_LIST'))
+    path = settings.get('PROXY_LIST_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            proxies.extend(line.split('#', 1)[0].strip() for line in f)
+    # Keep the order, drop blanks and duplicates
+    return list(dict.fromkeys(proxy if '://' in proxy else f'http://{proxy}' for proxy in proxies if proxy))
+
+
+class ProxyEndpoint:
+    """Health of one proxy: latency and error rate EWMAs, failures in a row and quarantine"""
+    
+    def __init__(self, url):
+        parsed = urlparse(url)
+        self.name = f'{parsed.hostname}:{parsed.port}' if parsed.port else parsed.hostname
+        # Credentials go in a Proxy-Authorization header, never in logs or stats
+        self.url = f'{parsed.scheme}://{self.name}'
+        self.credentials = None
+        if parsed.username:
+            self.credentials = basic_auth_header(unquote(parsed.username), unquote(parsed.password or ''))
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures_in_row = 0
+        self.quarantined_until = 0.0
+        self.quarantines = 0
+        self.probation = False
+        self.probation_successes = 0
+    
+    def score(self, default_latency):
+        """Share of traffic: more for fast, reliable proxies, little while on probation"""
+        latency = self.latency if self.latency is not None else default_latency
+        score = (1.0 - self.error_rate) / max(latency, 0.01)
+        if self.probation:
+            score *= 0.1
+        return max(score, 1e-6)
+
+
+class ProxyPool:
+    """Route requests over proxies weighted by health score, quarantining bad ones
+    
+    A proxy that gets banned (PROXY_BAN_CODES) or fails ``max_failures``
+    times in a row is quarantined, for twice as long each time from
+    ``quarantine_base`` up to ``quarantine_max`` seconds. It then comes back
+    on probation with a small share of requests, and either passes
+    ``probation_requests`` requests in a row or goes straight back.
+    """
+    
+    def __init__(self, proxies, max_failures=3, quarantine_base=60.0, quarantine_max=1800.0,
+                 probation_requests=3, alpha=0.2, clock=time.monotonic):
+        self.endpoints = {}
+        for url in proxies:
+            endpoint = ProxyEndpoint(url)
+            self.endpoints[endpoint.name] = endpoint
+        self.max_failures = max_failures
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self.probation_requests = probation_requests
+        self.alpha = alpha
+        self.clock = clock
+    
+    def __len__(self):
+        return len(self.endpoints)
+    
+    def get(self, name):
+        return self.endpoints.get(name)
+    
+    def choose(self, exclude=None):
+        """Pick a proxy by weighted score, or the one out of quarantine soonest if all are quarantined
+        
+        ``exclude`` names a proxy to avoid, such as the one a request just
+        failed through, unless it is the only proxy in the pool.
+        """
+        endpoints = [endpoint for endpoint in self.endpoints.values() if endpoint.name != exclude]
+        if not endpoints:
+            endpoints = list(self.endpoints.values())
+        now = self.clock()
+        available = [endpoint for endpoint in endpoints if endpoint.quarantined_until <= now]
+        if not available:
+            return min(endpoints, key=lambda endpoint: endpoint.quarantined_until)
+        
+        latencies = [endpoint.latency for endpoint in available if endpoint.latency is not None]
+        # Proxies without a latency yet are scored as average, so they get tried
+        default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+        weights = [endpoint.score(default_latency) for endpoint in available]
+        return random.choices(available, weights)[0]
+    
+    def succeeded(self, endpoint, latency):
+        if latency is not None:
+            endpoint.latency = latency if endpoint.latency is None else (
+                (1 - self.alpha) * endpoint.latency + self.alpha * latency
+            )
+        endpoint.error_rate *= 1 - self.alpha
+        endpoint.failures_in_row = 0
+        if endpoint.probation:
+            endpoint.probation_successes += 1
+            if endpoint.probation_successes >= self.probation_requests:
+                endpoint.probation = False
+                endpoint.quarantines = 0
+    
+    def failed(self, endpoint):
+        """Record a failed request, returning True if the proxy was quarantined"""
+        endpoint.error_rate = (1 - self.alpha) * endpoint.error_rate + self.alpha
+        endpoint.failures_in_row += 1
+        if endpoint.probation or endpoint.failures_in_row >= self.max_failures:
+            return self.quarantine(endpoint)
+        return False
+    
+    def banned(self, endpoint):
+        endpoint.error_rate = (1 - self.alpha) * endpoint.error_rate + self.alpha
+        return self.quarantine(endpoint)
+    
+    def quarantine(self, endpoint):
+        now = self.clock()
+        if endpoint.quarantined_until > now:
+            # Responses still arriving from before the quarantine
+            return False
+        duration = min(self.quarantine_max, self.quarantine_base * 2 ** endpoint.quarantines)
+        endpoint.quarantined_until = now + duration
+        endpoint.quarantines += 1
+        endpoint.failures_in_row = 0
+        endpoint.probation = True
+        endpoint.probation_successes = 0
+        logger.warning(f"Proxy {endpoint.name} quarantined for {duration:.0f}s")
+        return True
+
+
 class ProxyMiddleware:
-    """Middleware for handling proxy rotation (placeholder implementation)"""
+    """Send requests through a health-scored ProxyPool
     
-    def __init__(self):
-        # In production, you might want to use a list of proxy servers
-        self.proxies = []
-        # self.proxies = [
-        #     'http://proxy1:port',
-        #     'http://proxy2:port',
-        # ]
+    Proxies come from PROXY_LIST and PROXY_LIST_FILE; without any, the
+    middleware is disabled. Requests that already have a ``proxy`` meta key
+    not chosen by the pool are left alone. Bans and connection errors are
+    the proxy's fault, so those requests are retried straight away through
+    another proxy, up to PROXY_RETRY_TIMES times, before RetryMiddleware
+    gets them.
+    """
+    
+    def __init__(self, pool, ban_codes, stats, max_retry_times=3):
+        self.pool = pool
+        self.ban_codes = set(ban_codes)
+        self.stats = stats
+        self.max_retry_times = max_retry_times
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        proxies = load_proxy_list(settings)
+        if not proxies:
+            raise NotConfigured
+        pool = ProxyPool(
+            proxies,
+            max_failures=settings.getint('PROXY_MAX_FAILURES', 3),
+            quarantine_base=settings.getfloat('PROXY_QUARANTINE_BASE', 60.0),
+            quarantine_max=settings.getfloat('PROXY_QUARANTINE_MAX', 1800.0),
+            probation_requests=settings.getint('PROXY_PROBATION_REQUESTS', 3),
+        )
+        # Not 429: the site throttling us is for RetryMiddleware's rate limit, not the proxy's fault
+        ban_codes = [int(code) for code in settings.getlist('PROXY_BAN_CODES', [403, 407])]
+        middleware = cls(pool, ban_codes, crawler.stats, settings.getint('PROXY_RETRY_TIMES', 3))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        logger.info(f"Routing requests over {len(pool)} proxies")
+        return middleware
     
     def process_request(self, request, spider):
-        # For now, we don't use proxies - but this is where you'd implement proxy rotation
-        if self.proxies:
-            proxy = random.choice(self.proxies)
-            request.meta['proxy'] = proxy
+        if 'proxy' in request.meta and 'proxy_pool_endpoint' not in request.meta:
+            return None
+        # Retries from self.retry go through a different proxy than the one that failed
+        endpoint = self.pool.choose(exclude=request.meta.pop('proxy_failed_endpoint', None))
+        request.meta['proxy'] = endpoint.url
+        request.meta['proxy_pool_endpoint'] = endpoint.name
+        if endpoint.credentials:
+            request.headers['Proxy-Authorization'] = endpoint.credentials
+        else:
+            request.headers.pop(b'Proxy-Authorization', None)
+        self.stats.inc_value(f'proxy/{endpoint.name}/requests', spider=spider)
         return None
+    
+    def process_response(self, request, response, spider):
+        endpoint = self.pool.get(request.meta.get('proxy_pool_endpoint'))
+        if endpoint is None or 'cached' in response.flags:
+            return response
+        if response.status in self.ban_codes:
+            self.stats.inc_value(f'proxy/{endpoint.name}/bans', spider=spider)
+            self.record_quarantine(self.pool.banned(endpoint), endpoint, spider)
+            return self.retry(request, spider) or response
+        if response.status >= 500:
+            self.stats.inc_value(f'proxy/{endpoint.name}/errors', spider=spider)
+            self.record_quarantine(self.pool.failed(endpoint), endpoint, spider)
+        else:
+            self.pool.succeeded(endpoint, request.meta.get('download_latency'))
+        return response
+    
+    def process_exception(self, request, exception, spider):
+        endpoint = self.pool.get(request.meta.get('proxy_pool_endpoint'))
+        if endpoint is None or isinstance(exception, IgnoreRequest):
+            return None
+        self.stats.inc_value(f'proxy/{endpoint.name}/errors', spider=spider)
+        self.record_quarantine(self.pool.failed(endpoint), endpoint, spider)
+        return self.retry(request, spider)
+    
+    def retry(self, request, spider):
+        """Copy of ``request`` to send through another proxy, None once PROXY_RETRY_TIMES is used up"""
+        retry_times = request.meta.get('proxy_retry_times', 0) + 1
+        if retry_times > self.max_retry_times:
+            return None
+        retry_request = request.copy()
+        retry_request.meta['proxy_retry_times'] = retry_times
+        retry_request.meta['proxy_failed_endpoint'] = request.meta['proxy_pool_endpoint']
+        retry_request.dont_filter = True
+        self.stats.inc_value('proxy/retries', spider=spider)
+        return retry_request
+    
+    def record_quarantine(self, quarantined, endpoint, spider):
+        if quarantined:
+            self.stats.inc_value(f'proxy/{endpoint.name}/quarantines', spider=spider)
+    
+    def spider_closed(self, spider, reason):
+        for name, endpoint in self.pool.endpoints.items():
+            if endpoint.latency is not None:
+                self.stats.set_value(f'proxy/{name}/latency_ms', round(endpoint.latency * 1000, 1), spider=spider)
+            self.stats.set_value(f'proxy/{name}/error_rate', round(endpoint.error_rate, 3), spider=spider)
 
 
 class ScrapyJobsSpiderMiddleware:
@@ -145,23 +364,268 @@ class RobotsTxtMiddleware:
         return None
 
 
-class RetryMiddleware:
-    """Custom retry logic middleware"""
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a Retry-After header (delay in seconds or HTTP date), None if unparseable"""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('latin-1')
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - (now or datetime.now(timezone.utc))).total_seconds(), 0.0)
+
+
+class HostTokenBucket:
+    """Token bucket rate limiting the requests sent to one host
     
-    def __init__(self, max_retry_times=3):
-        self.max_retry_times = max_retry_times
+    The rate adapts AIMD-style: it is halved when the host throttles us or
+    its latency climbs well above the lowest latency seen, and raised by
+    ``increase`` requests/s every second while responses are healthy. Until
+    the first throttle it grows multiplicatively (slow start) to find the
+    host's limit quickly.
+    """
+    
+    # Latency must also rise this many seconds above its lowest to count as congestion
+    MIN_LATENCY_INCREASE = 0.25
+    
+    def __init__(self, rate, burst=4, min_rate=0.1, max_rate=50.0, increase=1.0, latency_factor=3.0,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.latency_factor = latency_factor
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self.paused_until = 0.0
+        self.slow_start = True
+        self.last_decrease = float('-inf')
+        # Smoothed latency and the lowest it has been
+        self.latency = None
+        self.base_latency = None
+    
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is available"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.burst, self.tokens + max(now - self.updated, 0.0) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    def pause(self, seconds):
+        """Send nothing for ``seconds`` (Retry-After), then resume with a single request"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.tokens = 1
+        self.updated = self.paused_until
+    
+    def throttled(self, sent_at):
+        """The host pushed back on a request sent at ``sent_at``"""
+        # Responses to requests sent before the last decrease reflect the old rate
+        if sent_at is not None and sent_at < self.last_decrease:
+            return False
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.slow_start = False
+        self.last_decrease = self.clock()
+        return True
+    
+    def succeeded(self, latency, sent_at):
+        """A healthy response arrived after ``latency`` seconds"""
+        if latency is not None:
+            self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+            self.base_latency = min(self.base_latency or self.latency, self.latency)
+            threshold = max(self.latency_factor * self.base_latency, self.base_latency + self.MIN_LATENCY_INCREASE)
+            if self.latency_factor and self.latency > threshold:
+                self.throttled(sent_at)
+                return
+        if self.slow_start:
+            self.rate += 0.5
+        else:
+            # One increase per second at the current rate
+            self.rate += self.increase / self.rate
+        self.rate = min(self.max_rate, self.rate)
+
+
+class RetryMiddleware(BaseRetryMiddleware):
+    """Retry with exponential backoff and rate limit each host with a HostTokenBucket
+    
+    Replaces Scrapy's RetryMiddleware (same RETRY_* settings and retry/*
+    stats). Instead of going straight back to the scheduler, retries wait in
+    a delayed queue for ``RETRY_BACKOFF_BASE * 2 ** (attempt - 1)`` seconds
+    with jitter, or as long as the Retry-After header asks. Throttling
+    responses (429, 502-504) and timeouts halve the host's request rate and,
+    with AutoThrottle, raise the download slot's delay to match, which
+    AutoThrottle then lowers again as latency allows.
+    """
+    
+    THROTTLE_HTTP_CODES = {429, 502, 503, 504}
+    
+    def __init__(self, crawler):
+        super().__init__(crawler.settings)
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.backoff_base = settings.getfloat('RETRY_BACKOFF_BASE', 1.0)
+        self.backoff_max = settings.getfloat('RETRY_BACKOFF_MAX', 60.0)
+        self.retry_after_max = settings.getfloat('RETRY_AFTER_MAX', 300.0)
+        self.rate_limit_enabled = settings.getbool('RATE_LIMIT_ENABLED', True)
+        self.bucket_settings = {
+            'rate': settings.getfloat('RATE_LIMIT_START_RATE', 4.0),
+            'burst': settings.getint('RATE_LIMIT_BURST', 4),
+            'min_rate': settings.getfloat('RATE_LIMIT_MIN_RATE', 0.1),
+            'max_rate': settings.getfloat('RATE_LIMIT_MAX_RATE', 50.0),
+            'increase': settings.getfloat('RATE_LIMIT_INCREASE', 1.0),
+            'latency_factor': settings.getfloat('RATE_LIMIT_LATENCY_FACTOR', 3.0),
+        }
+        self.autothrottle_enabled = settings.getbool('AUTOTHROTTLE_ENABLED')
+        self.autothrottle_max_delay = settings.getfloat('AUTOTHROTTLE_MAX_DELAY', 60.0)
+        self.clock = time.monotonic
+        self.buckets = {}
+        # Delayed retries: (due time, sequence number, request), soonest first
+        self.delayed = []
+        self.sequence = itertools.count()
+        self.timer = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        middleware = cls(crawler)
+        crawler.signals.connect(middleware.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+    
+    def bucket(self, request):
+        host = urlparse_cached(request).hostname or ''
+        if host not in self.buckets:
+            self.buckets[host] = HostTokenBucket(clock=self.clock, **self.bucket_settings)
+        return self.buckets[host]
+    
+    async def process_request(self, request, spider):
+        if not self.rate_limit_enabled:
+            return None
+        bucket = self.bucket(request)
+        wait = bucket.take()
+        if wait:
+            self.stats.inc_value('ratelimit/waits', spider=spider)
+            waited = 0.0
+            while wait:
+                await maybe_deferred_to_future(self.sleep(wait))
+                waited += wait
+                wait = bucket.take()
+            self.stats.inc_value('ratelimit/wait_time', round(waited, 3), spider=spider)
+        request.meta['ratelimit_sent_at'] = bucket.clock()
+        return None
     
     def process_response(self, request, response, spider):
-        if response.status in [500, 502, 503, 504, 408, 429]:
-            retry_times = request.meta.get('retry_times', 0) + 1
-            
-            if retry_times <= self.max_retry_times:
-                logger.warning(f'Retrying {request.url} (attempt {retry_times})')
-                retryreq = request.copy()
-                retryreq.meta['retry_times'] = retry_times
-                retryreq.dont_filter = True
-                return retryreq
-            else:
-                logger.error(f'Max retries exceeded for {request.url}')
+        if 'cached' in response.flags:
+            return response
+        throttled = response.status in self.THROTTLE_HTTP_CODES
+        retry_after = None
+        if throttled:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            self.host_throttled(request, spider, retry_after)
+        elif self.rate_limit_enabled:
+            self.bucket(request).succeeded(request.meta.get('download_latency'), request.meta.get('ratelimit_sent_at'))
         
-        return response
+        if request.meta.get('dont_retry', False) or response.status not in self.retry_http_codes:
+            return response
+        retry_request = self._retry(request, response_status_message(response.status), spider)
+        if retry_request is None:
+            return response
+        self.delay(retry_request, retry_after, spider)
+        raise IgnoreRequest(f"Retry of {request.url} delayed")
+    
+    def process_exception(self, request, exception, spider):
+        if not isinstance(exception, self.exceptions_to_retry) or request.meta.get('dont_retry', False):
+            return None
+        self.host_throttled(request, spider)
+        retry_request = self._retry(request, exception, spider)
+        if retry_request is None:
+            return None
+        self.delay(retry_request, None, spider)
+        raise IgnoreRequest(f"Retry of {request.url} delayed")
+    
+    def host_throttled(self, request, spider, retry_after=None):
+        if not self.rate_limit_enabled:
+            return
+        bucket = self.bucket(request)
+        if retry_after:
+            bucket.pause(min(retry_after, self.retry_after_max))
+        if not bucket.throttled(request.meta.get('ratelimit_sent_at')):
+            return
+        self.stats.inc_value('ratelimit/throttled', spider=spider)
+        logger.debug(f"Throttled by {urlparse_cached(request).hostname}, rate now {bucket.rate:.2f}/s")
+        
+        if self.autothrottle_enabled:
+            # AutoThrottle ignores error responses when lowering the delay, so raise it here
+            downloader = self.crawler.engine.downloader
+            slot = downloader.slots.get(downloader.get_slot_key(request))
+            if slot is not None:
+                slot.delay = min(max(slot.delay, 1 / bucket.rate), self.autothrottle_max_delay)
+    
+    def backoff(self, retry_times, retry_after=None):
+        """Seconds before retry number ``retry_times``: exponential with jitter, or Retry-After if longer"""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (retry_times - 1))
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after:
+            delay = max(delay, min(retry_after, self.retry_after_max))
+        return delay
+    
+    def delay(self, request, retry_after, spider):
+        delay = self.backoff(request.meta['retry_times'], retry_after)
+        heapq.heappush(self.delayed, (self.clock() + delay, next(self.sequence), request))
+        self.stats.inc_value('retry/delayed', spider=spider)
+        self.stats.inc_value('retry/delay_time', round(delay, 3), spider=spider)
+        self.schedule_release()
+    
+    def sleep(self, seconds):
+        from twisted.internet import reactor
+        from twisted.internet.task import deferLater
+        
+        return deferLater(reactor, seconds)
+    
+    def schedule_release(self):
+        from twisted.internet import reactor
+        
+        if not self.delayed:
+            return
+        wait = max(self.delayed[0][0] - self.clock(), 0.0)
+        if self.timer is not None and self.timer.active():
+            if self.timer.getTime() - reactor.seconds() <= wait:
+                return
+            self.timer.cancel()
+        self.timer = reactor.callLater(wait, self.release)
+    
+    def release(self):
+        """Hand the retries that are due to the scheduler"""
+        self.timer = None
+        now = self.clock()
+        while self.delayed and self.delayed[0][0] <= now:
+            _, _, request = heapq.heappop(self.delayed)
+            self.crawler.engine.crawl(request)
+        self.schedule_release()
+    
+    def spider_idle(self, spider):
+        if self.delayed:
+            raise DontCloseSpider
+    
+    def spider_closed(self, spider, reason):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        if self.delayed:
+            logger.warning(f"Spider closed ({reason}) with {len(self.delayed)} delayed retries pending")
+            self.stats.set_value('retry/delayed_dropped', len(self.delayed), spider=spider)
+            self.delayed = []
+        for host, bucket in self.buckets.items():
+            self.stats.set_value(f'ratelimit/rate/{host}', round(bucket.rate, 2), spider=spider)
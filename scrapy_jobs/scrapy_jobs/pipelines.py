@@ -1,365 +1,1090 @@
 import logging
 import hashlib
 import sqlite3
-import psycopg2
 from datetime import datetime
 from urllib.parse import urlparse
 import os
 import sys
 import json
+import time
+import queue
+import string
+import threading
+from collections import OrderedDict, deque
 
 # Add the parent directory to Python path to import from workwise-sa
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
+from scrapy import signals
 from scrapy.exceptions import DropItem
-from scrapy_jobs.items import JobItem, CompanyItem
+from scrapy.utils.project import data_path
+from twisted.internet import defer, task, threads
+from scrapy_jobs.items import JOB_ITEM_CLASSES, CompanyItem, JobSeenItem, adapt_item, field_value, set_default
+from scrapy_jobs.dedup import PersistentDedupStore
+from scrapy_jobs.frontier import shard_suffix
+from scrapy_jobs.matching import CATEGORY_KEYWORDS, JOB_KEYWORD_MATCHER
+from scrapy_jobs.classifier import DEFAULT_CATEGORY, categorize, job_text, load_classifier
 
 logger = logging.getLogger(__name__)
 
+# Sent by DatabasePipeline on the reactor thread with the items of each committed transaction
+items_saved = object()
+
 
 class ValidationPipeline:
     """Validate scraped items before processing"""
     
     def process_item(self, item, spider):
-        # Validate required fields for JobItem
-        if isinstance(item, JobItem):
+        adapter = adapt_item(item)
+        
+        # Validate required fields for JobItem and JobRecord
+        if isinstance(item, JOB_ITEM_CLASSES):
             required_fields = ['title', 'company_name', 'source_url']
             for field in required_fields:
-                if not item.get(field):
-                    raise DropItem(f"Missing required field '{field}' in job: {item.get('title', 'Unknown')}")
+                if not adapter.get(field):
+                    title = field_value(adapter, 'title', 'Unknown')
+                    raise DropItem(f"Missing required field '{field}' in job: {title}")
             
             # Validate job title length
-            if len(item.get('title', '')) > 200:
-                raise DropItem(f"Job title too long: {item['title'][:50]}...")
+            if len(adapter['title']) > 200:
+                raise DropItem(f"Job title too long: {adapter['title'][:50]}...")
             
             # Validate description length
-            if item.get('description') and len(item['description']) > 5000:
-                item['description'] = item['description'][:4997] + "..."
+            if adapter.get('description') and len(adapter['description']) > 5000:
+                adapter['description'] = adapter['description'][:4997] + "..."
             
             # Set default values
-            item.setdefault('scraped_at', datetime.utcnow().isoformat())
-            item.setdefault('work_mode', 'On-site')
-            item.setdefault('job_type', 'Full-time')
-            item.setdefault('is_featured', False)
-            item.setdefault('is_urgent', False)
+            set_default(adapter, 'scraped_at', datetime.utcnow().isoformat())
+            set_default(adapter, 'work_mode', 'On-site')
+            set_default(adapter, 'job_type', 'Full-time')
+            set_default(adapter, 'is_featured', False)
+            set_default(adapter, 'is_urgent', False)
         
         # Validate required fields for CompanyItem
         elif isinstance(item, CompanyItem):
             required_fields = ['name', 'source_url']
             for field in required_fields:
-                if not item.get(field):
-                    raise DropItem(f"Missing required field '{field}' in company: {item.get('name', 'Unknown')}")
+                if not adapter.get(field):
+                    raise DropItem(f"Missing required field '{field}' in company: {adapter.get('name', 'Unknown')}")
             
-            item.setdefault('scraped_at', datetime.utcnow().isoformat())
+            set_default(adapter, 'scraped_at', datetime.utcnow().isoformat())
         
         return item
 
 
 class DeduplicationPipeline:
-    """Remove duplicate items based on content hash"""
+    """Remove duplicate items based on content hash
+    
+    Duplicates within a run are caught by an in-memory set. When
+    ``DEDUP_STORE_ENABLED`` is set, items from previous runs are also tracked
+    in a persistent store and dropped while their content is unchanged and
+    younger than ``DEDUP_STORE_TTL_DAYS``. Items are only recorded in the
+    store once DatabasePipeline has saved them (``items_saved``), so an item
+    whose save failed is tried again on the next run.
+    """
+    
+    # Fields whose changes make a previously seen item worth saving again
+    CONTENT_FIELDS = {
+        'job': ['description', 'salary', 'job_type', 'work_mode', 'is_featured', 'apply_url'],
+        'company': ['description', 'logo', 'location', 'open_positions'],
+    }
     
-    def __init__(self):
+    def __init__(self, store=None, stats=None):
         self.seen_items = set()
+        self.store = store
+        self.stats = stats
     
-    def process_item(self, item, spider):
-        # Create a hash of the item's key fields
-        if isinstance(item, JobItem):
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        store = None
+        if settings.getbool('DEDUP_STORE_ENABLED'):
+            # One store per worker in a sharded crawl, SQLite doesn't take concurrent writers well
+            store = PersistentDedupStore(
+                data_path(settings.get('DEDUP_STORE_DIR', 'dedup') + shard_suffix(settings), createdir=True),
+                ttl=settings.getfloat('DEDUP_STORE_TTL_DAYS', 7) * 24 * 3600,
+            )
+        pipeline = cls(store=store, stats=crawler.stats)
+        if store:
+            crawler.signals.connect(pipeline.record_saved_items, signal=items_saved)
+            # Not close_spider: DatabasePipeline may still be saving the last batch then
+            crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+    
+    def spider_closed(self, spider):
+        self.store.close()
+    
+    def item_key(self, item, adapter):
+        """Return the key hash and content fields of a job or company, None for other items"""
+        if isinstance(item, JOB_ITEM_CLASSES):
             # Create hash from title, company, and location
-            key_string = f"{item.get('title', '')}-{item.get('company_name', '')}-{item.get('location', '')}"
-            item_hash = hashlib.md5(key_string.encode('utf-8')).hexdigest()
-        elif isinstance(item, CompanyItem):
+            key_string = (
+                f"{field_value(adapter, 'title', '')}-{field_value(adapter, 'company_name', '')}-"
+                f"{field_value(adapter, 'location', '')}"
+            )
+            return hashlib.md5(key_string.encode('utf-8')).hexdigest(), self.CONTENT_FIELDS['job']
+        if isinstance(item, CompanyItem):
             # Create hash from company name and website
-            key_string = f"{item.get('name', '')}-{item.get('website', '')}"
-            item_hash = hashlib.md5(key_string.encode('utf-8')).hexdigest()
-        else:
+            key_string = f"{adapter.get('name', '')}-{adapter.get('website', '')}"
+            return hashlib.md5(key_string.encode('utf-8')).hexdigest(), self.CONTENT_FIELDS['company']
+        return None
+    
+    @staticmethod
+    def content_hash(adapter, content_fields):
+        content_string = '-'.join(str(field_value(adapter, field, '')) for field in content_fields)
+        return hashlib.md5(content_string.encode('utf-8')).hexdigest()
+    
+    def process_item(self, item, spider):
+        adapter = adapt_item(item)
+        
+        # Create a hash of the item's key fields
+        key = self.item_key(item, adapter)
+        if key is None:
             return item
+        item_hash, content_fields = key
         
         if item_hash in self.seen_items:
             raise DropItem(f"Duplicate item found: {item_hash}")
-        else:
-            self.seen_items.add(item_hash)
-            return item
+        self.seen_items.add(item_hash)
+        
+        if self.store:
+            source_site = adapter.get('source_site') or spider.name
+            if self.store.is_unchanged(source_site, item_hash, self.content_hash(adapter, content_fields)):
+                if self.stats:
+                    self.stats.inc_value('dedup/unchanged_dropped')
+                raise DropItem(f"Unchanged item seen in a previous run: {item_hash}")
+        
+        return item
+    
+    def record_saved_items(self, items, spider):
+        """Record items in the store once DatabasePipeline has committed them"""
+        for item in items:
+            adapter = adapt_item(item)
+            key = self.item_key(item, adapter)
+            if key is not None:
+                item_hash, content_fields = key
+                source_site = adapter.get('source_site') or spider.name
+                self.store.record(source_site, item_hash, self.content_hash(adapter, content_fields))
 
 
 class CategoryMappingPipeline:
-    """Map job titles to categories using ML-based classification"""
-    
-    def __init__(self):
-        # Define category mappings based on keywords
-        self.category_mappings = {
-            1: ['cashier', 'teller', 'sales', 'retail', 'store', 'shop'],  # Retail
-            2: ['general', 'worker', 'labourer', 'helper', 'assistant', 'warehouse'],  # General Worker
-            3: ['security', 'guard', 'protection', 'surveillance'],  # Security
-            4: ['petrol', 'fuel', 'attendant', 'service station'],  # Petrol Attendant
-            5: ['nanny', 'childcare', 'babysitter', 'au pair'],  # Childcare
-            6: ['cleaner', 'cleaning', 'janitor', 'housekeeping', 'domestic'],  # Cleaning
-            7: ['gardener', 'landscaping', 'grounds', 'maintenance', 'garden']  # Landscaping
-        }
+    """Map job titles to categories using ML-based classification
+    
+    Jobs are classified by the TF-IDF model at ``CATEGORY_MODEL_PATH`` when
+    one has been trained (``python -m scrapy_jobs.classifier``), falling back
+    to keyword matching for low-confidence predictions or when there is no
+    model. With ``CATEGORY_BATCH_SIZE > 1`` jobs are buffered and classified
+    in micro-batches, flushed when full or after ``CATEGORY_BATCH_TIMEOUT_MS``.
+    """
+    
+    def __init__(self, model_path=None, batch_size=1, batch_timeout_ms=0, min_confidence=0.0, stats=None):
+        # Category keywords live in scrapy_jobs.matching, shared with the spider
+        self.category_mappings = CATEGORY_KEYWORDS
+        self.matcher = JOB_KEYWORD_MATCHER
+        self.model_path = model_path
+        self.batch_size = max(int(batch_size or 1), 1)
+        self.batch_timeout = max(batch_timeout_ms or 0, 0) / 1000.0
+        self.min_confidence = min_confidence
+        self.stats = stats
+        # (item, deferred) pairs waiting for the next batch
+        self.pending_jobs = []
+        self.flush_call = None
+    
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            model_path=crawler.settings.get('CATEGORY_MODEL_PATH'),
+            batch_size=crawler.settings.getint('CATEGORY_BATCH_SIZE', 1),
+            batch_timeout_ms=crawler.settings.getint('CATEGORY_BATCH_TIMEOUT_MS', 0),
+            min_confidence=crawler.settings.getfloat('CATEGORY_MIN_CONFIDENCE', 0.0),
+            stats=crawler.stats,
+        )
+    
+    def close_spider(self, spider):
+        self.flush()
     
     def classify_job_category(self, title, description=''):
         """Classify job into a category based on title and description"""
-        text = f"{title} {description}".lower()
+        return self.classify_job_categories([(title, description)])[0]
+    
+    def classify_job_categories(self, jobs):
+        """Classify a list of (title, description) pairs in one vectorised call"""
+        classifier = load_classifier(self.model_path) if self.model_path else None
+        categories, by_model = categorize(
+            [job_text(title, description) for title, description in jobs],
+            classifier,
+            self.min_confidence
+        )
+        
+        if self.stats:
+            self.stats.inc_value('category/model_classified', by_model)
+            self.stats.inc_value('category/keyword_classified', len(jobs) - by_model)
+        return categories
+    
+    def process_item(self, item, spider):
+        # Only set category if not already set
+        adapter = adapt_item(item)
+        if not isinstance(item, JOB_ITEM_CLASSES) or adapter.get('category_id'):
+            return item
         
-        # Score each category
-        category_scores = {}
-        for category_id, keywords in self.category_mappings.items():
-            score = sum(1 for keyword in keywords if keyword in text)
-            if score > 0:
-                category_scores[category_id] = score
+        if self.batch_size == 1:
+            adapter['category_id'] = self.classify_job_category(adapter.get('title'), adapter.get('description'))
+            return item
         
-        if category_scores:
-            # Return category with highest score
-            return max(category_scores.items(), key=lambda x: x[1])[0]
+        from twisted.internet import reactor
         
-        # Default to General Worker if no category matches
-        return 2
+        d = defer.Deferred()
+        self.pending_jobs.append((item, d))
+        if len(self.pending_jobs) >= self.batch_size:
+            self.flush()
+        elif self.flush_call is None:
+            self.flush_call = reactor.callLater(self.batch_timeout, self.flush)
+        return d
     
-    def process_item(self, item, spider):
-        if isinstance(item, JobItem):
-            # Only set category if not already set
-            if not item.get('category_id'):
-                category_id = self.classify_job_category(
-                    item.get('title', ''),
-                    item.get('description', '')
-                )
-                item['category_id'] = category_id
+    def queue_depth(self):
+        """Jobs waiting for the next classification batch"""
+        return len(self.pending_jobs)
+    
+    def flush(self):
+        """Classify the buffered jobs and pass them on down the pipeline"""
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
         
-        return item
+        batch, self.pending_jobs = self.pending_jobs, []
+        if not batch:
+            return
+        
+        adapters = [adapt_item(item) for item, _ in batch]
+        categories = self.classify_job_categories(
+            [(adapter.get('title'), adapter.get('description')) for adapter in adapters]
+        )
+        for adapter, (item, d), category_id in zip(adapters, batch, categories):
+            adapter['category_id'] = category_id
+            d.callback(item)
+
+
+# SQL LOWER() and TRIM() only fold ASCII letters and strip spaces
+ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def normalize_key(value):
+    """Normalise a name for case-insensitive lookups, the way normalized_sql does"""
+    return (value or '').strip(' ').translate(ASCII_LOWERCASE)
+
+
+def normalized_sql(column):
+    """SQL expression of a column normalised for case-insensitive lookups"""
+    return f"LOWER(TRIM(COALESCE({column}, '')))"
+
+
+class CompanyIdCache:
+    """Bounded LRU cache mapping normalised company names to company IDs"""
+    
+    def __init__(self, max_size=5000):
+        self.max_size = max(int(max_size), 1)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def normalize(name):
+        return normalize_key(name)
+    
+    def get(self, name):
+        key = self.normalize(name)
+        company_id = self.entries.get(key)
+        if company_id is None:
+            self.misses += 1
+            return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return company_id
+    
+    def put(self, name, company_id):
+        key = self.normalize(name)
+        self.entries[key] = company_id
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+    
+    def discard(self, name):
+        self.entries.pop(self.normalize(name), None)
+    
+    def __len__(self):
+        return len(self.entries)
 
 
 class DatabasePipeline:
-    """Save items to the workwise-sa database"""
+    """Save items to the workwise-sa database
     
-    def __init__(self, database_url=None):
+    Items are buffered and written in batches: a batch is flushed once it
+    holds ``DATABASE_BATCH_SIZE`` items or its oldest item is older than
+    ``DATABASE_BATCH_TIMEOUT_MS``, and every batch is written in a single
+    transaction. A batch size of 1 keeps the old commit-per-item behaviour.
+    
+    With ``DATABASE_ASYNC_WRITES`` the batching and all database I/O run on a
+    dedicated writer thread fed through a queue of ``DATABASE_WRITE_QUEUE_SIZE``
+    items, so the reactor never waits on the database. ``process_item`` then
+    returns a Deferred that fires once the item is queued; while the queue is
+    full the Deferred stays pending, which makes Scrapy hold back new work.
+    
+    On open the pipeline creates the unique indexes behind its
+    ``INSERT ... ON CONFLICT DO UPDATE`` statements, so saving an item costs
+    the same however large the tables grow. Names are matched through
+    expression indexes on ``LOWER(TRIM(...))``, which also cover rows the app
+    writes itself. If existing duplicate rows prevent a unique index, it falls
+    back to lookup-then-write.
+    
+    Writes go through a single connection, used by one writer at a time. On
+    PostgreSQL jobs with an external ID are bulk-loaded into a staging table, then
+    merged with one ``INSERT ... ON CONFLICT (source_site, external_id)``.
+    """
+    
+    STOP_WRITER = object()
+    
+    # Stats name of each item type in database/<name>_saved and database/<name>_failed
+    ITEM_STAT_NAMES = ((JOB_ITEM_CLASSES, 'jobs'), (CompanyItem, 'companies'), (JobSeenItem, 'jobs_seen'))
+    
+    # Upsert conflict targets, matching the expression indexes in UNIQUE_INDEXES
+    JOB_TITLE_CONFLICT_SQL = (
+        f"(companyId, {normalized_sql('title')}, {normalized_sql('location')}) WHERE external_id IS NULL"
+    )
+    
+    COMPANY_NAME_CONFLICT_SQL = f"({normalized_sql('name')})"
+    
+    # (name, table, columns, predicate) of the indexes backing the upsert conflict targets
+    UNIQUE_INDEXES = (
+        ('idx_jobs_source_external_id', 'jobs', '(source_site, external_id)', ''),
+        ('idx_jobs_company_title_location', 'jobs',
+         f"(companyId, {normalized_sql('title')}, {normalized_sql('location')})", ' WHERE external_id IS NULL'),
+        ('idx_companies_name', 'companies', COMPANY_NAME_CONFLICT_SQL, ''),
+    )
+    
+    # Column order of the tuples built by _job_insert_params
+    JOB_COLUMNS = (
+        'title', 'description', 'location', 'salary', 'jobType', 'workMode',
+        'companyId', 'categoryId', 'isFeatured', 'source_url', 'source_site',
+        'external_id', 'apply_url', 'createdAt', 'updatedAt',
+    )
+    
+    # Columns refreshed when an upserted job already exists
+    JOB_UPSERT_UPDATE_COLUMNS = (
+        'description', 'location', 'salary', 'jobType', 'workMode',
+        'isFeatured', 'source_url', 'apply_url', 'updatedAt',
+    )
+    
+    # Their positions in the tuples built by _job_insert_params
+    JOB_UPSERT_UPDATE_INDEXES = tuple(map(JOB_COLUMNS.index, JOB_UPSERT_UPDATE_COLUMNS))
+    
+    JOB_VALUES_SQL = 'VALUES (' + ', '.join(['?'] * len(JOB_COLUMNS)) + ')'
+    
+    JOB_INSERT_SQL = 'INSERT INTO jobs (' + ', '.join(JOB_COLUMNS) + ') ' + JOB_VALUES_SQL
+    
+    JOB_UPSERT_SET_SQL = ', '.join([f"{column} = excluded.{column}" for column in JOB_UPSERT_UPDATE_COLUMNS])
+    
+    JOB_UPSERT_BY_EXTERNAL_ID_SQL = (
+        JOB_INSERT_SQL
+        + ' ON CONFLICT (source_site, external_id) DO UPDATE SET '
+        + JOB_UPSERT_SET_SQL
+    )
+    
+    JOB_UPSERT_BY_TITLE_SQL = (
+        JOB_INSERT_SQL
+        + ' ON CONFLICT ' + JOB_TITLE_CONFLICT_SQL
+        + ' DO UPDATE SET ' + JOB_UPSERT_SET_SQL
+    )
+    
+    COMPANY_INSERT_SQL = """INSERT INTO companies (name, slug, logo, location, openPositions, createdAt, updatedAt)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)"""
+    
+    COMPANY_LOOKUP_SQL = f"SELECT id FROM companies WHERE {normalized_sql('name')} = {normalized_sql('?')}"
+    
+    JOB_TOUCH_SQL = "UPDATE jobs SET updatedAt = ? WHERE source_site = ? AND external_id = ?"
+    
+    JOB_UPDATE_SQL = """UPDATE jobs SET
+                description = ?, location = ?, salary = ?, jobType = ?, workMode = ?,
+                isFeatured = ?, source_url = ?, apply_url = ?, updatedAt = ?
+                WHERE id = ?"""
+    
+    def __init__(self, database_url=None, batch_size=1, batch_timeout_ms=0, stats=None,
+                 company_cache_size=5000, async_writes=False, write_queue_size=1000, signals=None):
         self.database_url = database_url or os.getenv('DATABASE_URL', 'sqlite:///database.db')
+        self.is_postgres = self.database_url.startswith(('postgresql', 'postgres://'))
         self.connection = None
+        self.native_upsert = False
+        self.batch_size = max(int(batch_size or 1), 1)
+        self.batch_timeout = max(batch_timeout_ms or 0, 0) / 1000.0
+        self.stats = stats
+        self.signals = signals
+        self.spider = None
+        self.pending_items = []
+        self.batch_started_at = None
+        self.flush_task = None
+        self.batch_count = 0
+        self.batch_latency_total = 0.0
+        self.batch_latency_max = 0.0
+        self.company_cache = CompanyIdCache(company_cache_size)
+        # Companies inserted in the open transaction, dropped from the cache on rollback
+        self.uncommitted_companies = []
+        self.async_writes = async_writes
+        self.write_queue = queue.Queue(maxsize=max(int(write_queue_size), 1))
+        # (item, deferred) pairs waiting for room in the write queue (reactor thread only)
+        self.waiting_items = deque()
+        self.writer_thread = None
     
     @classmethod
     def from_crawler(cls, crawler):
         return cls(
-            database_url=crawler.settings.get('DATABASE_URL')
+            database_url=crawler.settings.get('DATABASE_URL'),
+            batch_size=crawler.settings.getint('DATABASE_BATCH_SIZE', 1),
+            batch_timeout_ms=crawler.settings.getint('DATABASE_BATCH_TIMEOUT_MS', 0),
+            stats=crawler.stats,
+            company_cache_size=crawler.settings.getint('COMPANY_CACHE_SIZE', 5000),
+            async_writes=crawler.settings.getbool('DATABASE_ASYNC_WRITES'),
+            write_queue_size=crawler.settings.getint('DATABASE_WRITE_QUEUE_SIZE', 1000),
+            signals=crawler.signals,
         )
     
     def open_spider(self, spider):
         """Initialize database connection when spider opens"""
+        self.spider = spider
         try:
             if self.database_url.startswith('sqlite'):
                 db_path = self.database_url.replace('sqlite:///', '')
-                self.connection = sqlite3.connect(db_path)
+                # The connection is handed over to the writer thread in async mode
+                self.connection = sqlite3.connect(db_path, check_same_thread=not self.async_writes)
                 self.connection.row_factory = sqlite3.Row
-            elif self.database_url.startswith('postgresql'):
+            elif self.is_postgres:
+                # psycopg2 is only needed for PostgreSQL, SQLite crawls don't import it
+                import psycopg2
                 self.connection = psycopg2.connect(self.database_url)
             
             logger.info(f"Connected to database: {self.database_url}")
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
+        
+        if self.connection is None:
+            # e.g. ':memory:' from run_scrapers.py --dry-run
+            logger.warning(f"No database connection for {self.database_url}, items will not be saved")
+        else:
+            self._bootstrap_schema()
+            self._preload_company_cache()
+        
+        if self.async_writes:
+            self.writer_thread = threading.Thread(
+                target=self._writer_loop, name='DatabaseWriter', daemon=True
+            )
+            self.writer_thread.start()
+        # Flush partially filled batches during quiet periods of the crawl
+        elif self.batch_size > 1 and self.batch_timeout > 0:
+            self.flush_task = task.LoopingCall(self._flush_if_due)
+            self.flush_task.start(self.batch_timeout, now=False)
     
     def close_spider(self, spider):
-        """Close database connection when spider closes"""
+        """Flush pending items and close database connection when spider closes"""
+        if self.writer_thread:
+            # Let the writer drain its queue without blocking the reactor
+            d = threads.deferToThread(self._stop_writer)
+            d.addBoth(self._finish_close)
+            return d
+        
+        if self.flush_task and self.flush_task.running:
+            self.flush_task.stop()
+        
+        if self.connection:
+            self.flush()
+        self._finish_close()
+    
+    def _finish_close(self, result=None):
         if self.connection:
             self.connection.close()
+            self.connection = None
             logger.info("Database connection closed")
+        
+        self._record_company_cache_stats()
+        logger.info(
+            f"Company cache: {self.company_cache.hits} hits, "
+            f"{self.company_cache.misses} misses, {len(self.company_cache)} entries"
+        )
+        
+        if self.batch_count:
+            logger.info(
+                f"Database batches: {self.batch_count}, "
+                f"avg latency {self.batch_latency_total / self.batch_count * 1000:.1f} ms, "
+                f"max latency {self.batch_latency_max * 1000:.1f} ms"
+            )
+        
+        return result
     
     def process_item(self, item, spider):
-        """Process and save item to database"""
-        try:
-            if isinstance(item, JobItem):
-                self._save_job_item(item, spider)
-            elif isinstance(item, CompanyItem):
-                self._save_company_item(item, spider)
-            
-            logger.debug(f"Saved item: {item.get('title') or item.get('name')}")
+        """Buffer item and flush the batch when it is full or too old"""
+        if not isinstance(item, (*JOB_ITEM_CLASSES, CompanyItem, JobSeenItem)):
             return item
+        
+        if self.writer_thread:
+            d = defer.Deferred()
+            self.waiting_items.append((item, d))
+            self._enqueue_waiting_items()
+            return d
+        
+        self._add_pending_item(item)
+        return item
+    
+    def _enqueue_waiting_items(self):
+        """Move waiting items into the write queue while it has room"""
+        while self.waiting_items:
+            item, d = self.waiting_items[0]
+            try:
+                self.write_queue.put_nowait(item)
+            except queue.Full:
+                # The writer calls back into the reactor as it frees up space
+                self._inc_stat('database/write_queue_full')
+                return
+            self.waiting_items.popleft()
+            self._max_stat('database/write_queue_depth/max', self.write_queue.qsize())
+            d.callback(item)
+    
+    def _writer_loop(self):
+        """Consume the write queue on the writer thread, flushing batches as they fill up"""
+        from twisted.internet import reactor
+        
+        while True:
+            timeout = None
+            if self.batch_started_at is not None and self.batch_timeout > 0:
+                timeout = max(self.batch_started_at + self.batch_timeout - time.monotonic(), 0)
             
+            try:
+                item = self.write_queue.get(timeout=timeout)
+            except queue.Empty:
+                self.flush()
+                continue
+            
+            if self.waiting_items:
+                reactor.callFromThread(self._enqueue_waiting_items)
+            
+            if item is self.STOP_WRITER:
+                self.flush()
+                return
+            self._add_pending_item(item)
+    
+    def _stop_writer(self):
+        self.write_queue.put(self.STOP_WRITER)
+        self.writer_thread.join()
+    
+    def _add_pending_item(self, item):
+        if not self.pending_items:
+            self.batch_started_at = time.monotonic()
+        self.pending_items.append(item)
+        
+        if len(self.pending_items) >= self.batch_size or self._batch_is_due():
+            self.flush()
+    
+    def flush(self):
+        """Write all pending items to the database in one transaction"""
+        if not self.pending_items:
+            return
+        
+        items = self.pending_items
+        self.pending_items = []
+        self.batch_started_at = None
+        
+        started = time.perf_counter()
+        try:
+            self._write_items(items)
+            self._count_items(items, 'saved')
+            self._send_items_saved(items)
+            logger.debug(f"Saved batch of {len(items)} items")
         except Exception as e:
-            logger.error(f"Error saving item: {e}")
-            # Don't drop the item, just log the error
-            return item
+            logger.error(f"Error saving batch of {len(items)} items: {e}")
+            self._inc_stat('database/batch_errors')
+            # Retry item by item so one bad row doesn't cost the whole batch
+            if len(items) > 1:
+                for item in items:
+                    self._save_single_item(item)
+            else:
+                self._count_items(items, 'failed')
+        finally:
+            self._record_batch_latency(len(items), time.perf_counter() - started)
+    
+    def _save_single_item(self, item):
+        """Save one item in its own transaction, logging failures"""
+        try:
+            self._write_items([item])
+            self._count_items([item], 'saved')
+            self._send_items_saved([item])
+        except Exception as e:
+            adapter = adapt_item(item)
+            logger.error(f"Error saving item {adapter.get('title') or adapter.get('name')}: {e}")
+            self._count_items([item], 'failed')
+    
+    def _flush_if_due(self):
+        if self._batch_is_due():
+            self.flush()
+    
+    def _batch_is_due(self):
+        return (
+            self.batch_timeout > 0
+            and self.batch_started_at is not None
+            and time.monotonic() - self.batch_started_at >= self.batch_timeout
+        )
+    
+    def _record_batch_latency(self, size, elapsed):
+        self.batch_count += 1
+        self.batch_latency_total += elapsed
+        self.batch_latency_max = max(self.batch_latency_max, elapsed)
+        
+        logger.debug(f"Database batch of {size} items took {elapsed * 1000:.1f} ms")
+        if self.stats:
+            latency_ms = int(elapsed * 1000)
+            self.stats.inc_value('database/batches')
+            self.stats.set_value('database/batch_latency_ms/last', latency_ms)
+            self.stats.max_value('database/batch_latency_ms/max', latency_ms)
+            self.stats.inc_value('database/batch_latency_ms/total', latency_ms)
+            self.stats.max_value('database/batch_size/max', size)
+    
+    def _bootstrap_schema(self):
+        """Create the unique indexes the upserts rely on"""
+        unique_indexes = [self._create_unique_index(*index) for index in self.UNIQUE_INDEXES]
+        
+        if self.is_postgres:
+            upsert_supported = True
+        else:
+            # ON CONFLICT needs SQLite 3.24, RETURNING needs 3.35
+            upsert_supported = sqlite3.sqlite_version_info >= (3, 35, 0)
+        self.native_upsert = upsert_supported and all(unique_indexes)
+        
+        if not self.native_upsert:
+            logger.warning("Native upserts unavailable, falling back to lookup-then-write")
+    
+    def _create_unique_index(self, name, table, columns, where=''):
+        """Create (or verify) a unique index, returning False if existing rows prevent it"""
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {table} {columns}{where}")
+            self.connection.commit()
+            return True
+        except Exception as e:
+            self.connection.rollback()
+            logger.warning(f"Could not create unique index {name}, duplicate rows in {table}? ({e})")
+            # Still give the lookup path an index to work with
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name}_lookup ON {table} {columns}{where}")
+            self.connection.commit()
+            return False
+        finally:
+            cursor.close()
+    
+    def _preload_company_cache(self):
+        """Warm the company cache with the most recently created companies"""
+        cursor = self.connection.cursor()
+        
+        try:
+            cursor.execute(
+                self._sql("SELECT id, name FROM companies ORDER BY id DESC LIMIT ?"),
+                (self.company_cache.max_size,)
+            )
+            rows = cursor.fetchall()
+        except Exception as e:
+            logger.warning(f"Could not preload company cache: {e}")
+            self.connection.rollback()
+            return
+        finally:
+            cursor.close()
+        
+        # Insert oldest first so the newest companies are the last to be evicted
+        for company_id, name in reversed(rows):
+            if name:
+                self.company_cache.put(name, company_id)
+        
+        logger.info(f"Preloaded {len(self.company_cache)} companies into cache")
+        if self.stats:
+            self.stats.set_value('company_cache/preloaded', len(self.company_cache))
+    
+    def _record_company_cache_stats(self):
+        if self.stats:
+            self.stats.set_value('company_cache/hits', self.company_cache.hits)
+            self.stats.set_value('company_cache/misses', self.company_cache.misses)
+            self.stats.set_value('company_cache/evictions', self.company_cache.evictions)
+            self.stats.set_value('company_cache/size', len(self.company_cache))
+    
+    def _cache_new_company(self, name, company_id):
+        self.company_cache.put(name, company_id)
+        self.uncommitted_companies.append(name)
+    
+    def _sql(self, query):
+        """Adapt a query written with sqlite-style placeholders to the backend"""
+        if self.is_postgres:
+            return query.replace('?', '%s')
+        return query
+    
+    def _insert_company(self, cursor, params):
+        """Insert a company row and return its ID"""
+        query = self.COMPANY_INSERT_SQL
+        if self.is_postgres:
+            cursor.execute(self._sql(query) + " RETURNING id", params)
+            return cursor.fetchone()[0]
+        
+        cursor.execute(query, params)
+        return cursor.lastrowid
     
-    def _save_job_item(self, item, spider):
-        """Save job item to database"""
+    def _inc_stat(self, key, count=1):
+        if self.stats:
+            self.stats.inc_value(key, count)
+    
+    def _max_stat(self, key, value):
+        if self.stats:
+            self.stats.max_value(key, value)
+    
+    def _count_items(self, items, outcome):
+        """Count saved or failed items in the stats, in total and per item type"""
+        self._inc_stat(f'database/items_{outcome}', len(items))
+        for item_class, name in self.ITEM_STAT_NAMES:
+            count = sum(1 for item in items if isinstance(item, item_class))
+            if count:
+                self._inc_stat(f'database/{name}_{outcome}', count)
+    
+    def _send_items_saved(self, items):
+        """Send items_saved for committed items, on the reactor thread"""
+        if not self.signals:
+            return
+        if threading.current_thread() is self.writer_thread:
+            from twisted.internet import reactor
+            reactor.callFromThread(self.signals.send_catch_log, items_saved, items=items, spider=self.spider)
+        else:
+            self.signals.send_catch_log(items_saved, items=items, spider=self.spider)
+    
+    def queue_depth(self):
+        """Items waiting to be written (sampled by the instrumentation extension)"""
+        return len(self.pending_items) + self.write_queue.qsize() + len(self.waiting_items)
+    
+    def _write_items(self, items):
+        """Write a batch of items to the database in a single transaction"""
         cursor = self.connection.cursor()
         
         try:
+            # Companies first so job rows in the same batch can reference them
+            for item in items:
+                if isinstance(item, CompanyItem):
+                    self._save_company_item(cursor, item)
+            
+            job_items = [adapt_item(item) for item in items if isinstance(item, JOB_ITEM_CLASSES)]
+            if job_items:
+                self._save_job_items(cursor, job_items)
+            
+            # Unchanged jobs (HTTP 304) only get their updatedAt bumped
+            touches = [
+                (item['seen_at'], item['source_site'], item['external_id'])
+                for item in items if isinstance(item, JobSeenItem)
+            ]
+            if touches:
+                cursor.executemany(self._sql(self.JOB_TOUCH_SQL), touches)
+                logger.debug(f"Marked {len(touches)} unchanged jobs as still live")
+            
+            self.connection.commit()
+            self.uncommitted_companies = []
+        
+        except Exception:
+            self.connection.rollback()
+            # Rolled-back companies must not be served from the cache
+            for name in self.uncommitted_companies:
+                self.company_cache.discard(name)
+            self.uncommitted_companies = []
+            raise
+        finally:
+            cursor.close()
+    
+    def _save_job_items(self, cursor, items):
+        """Save job items (see adapt_item) to database using batched upserts"""
+        if not self.native_upsert:
+            self._save_job_items_by_lookup(cursor, items)
+            return
+        
+        # Rows by conflict key, later copies merged in as the upsert would (see _merge_job_row)
+        by_external_id = {}
+        by_title = {}
+        
+        for item in items:
+            company_id = self._get_or_create_company(item.get('company_name'))
+            item['company_id'] = company_id
+            row = self._job_insert_params(item)
+            
+            if item.get('external_id'):
+                self._merge_job_row(by_external_id, (item.get('source_site'), item.get('external_id')), row)
+            else:
+                key = (company_id, normalize_key(item.get('title')), normalize_key(item.get('location')))
+                self._merge_job_row(by_title, key, row)
+        
+        if by_external_id:
+            if self.is_postgres:
+                self._bulk_upsert_jobs_postgres(cursor, list(by_external_id.values()))
+            else:
+                cursor.executemany(self.JOB_UPSERT_BY_EXTERNAL_ID_SQL, list(by_external_id.values()))
+            logger.debug(f"Upserted {len(by_external_id)} jobs by external ID")
+        
+        if by_title:
+            if self.is_postgres:
+                from psycopg2.extras import execute_values
+                execute_values(
+                    cursor,
+                    self.JOB_UPSERT_BY_TITLE_SQL.replace(self.JOB_VALUES_SQL, 'VALUES %s'),
+                    list(by_title.values()),
+                    page_size=1000
+                )
+            else:
+                cursor.executemany(self.JOB_UPSERT_BY_TITLE_SQL, list(by_title.values()))
+            logger.debug(f"Upserted {len(by_title)} jobs by title")
+    
+    def _save_job_items_by_lookup(self, cursor, items):
+        """Save job items (see adapt_item) by looking each one up, for databases without upsert support"""
+        inserts = {}
+        updates = {}
+        
+        for item in items:
             # First, find or create the company
             company_id = self._get_or_create_company(item.get('company_name'))
             item['company_id'] = company_id
+            row = self._job_insert_params(item)
             
             # Check if job already exists (by external_id or unique combination)
             if item.get('external_id'):
+                key = (item.get('source_site'), item.get('external_id'))
                 cursor.execute(
-                    "SELECT id FROM jobs WHERE source_site = ? AND external_id = ?",
-                    (item.get('source_site'), item.get('external_id'))
+                    self._sql("SELECT id FROM jobs WHERE source_site = ? AND external_id = ?"),
+                    key
                 )
             else:
                 # Fallback to title + company combination
+                key = (company_id, normalize_key(item.get('title')), normalize_key(item.get('location')))
                 cursor.execute(
-                    """SELECT id FROM jobs 
-                       WHERE LOWER(title) = LOWER(?) 
-                       AND companyId = ? 
-                       AND LOWER(location) = LOWER(?)""",
-                    (item.get('title'), company_id, item.get('location', ''))
+                    self._sql(f"""SELECT id FROM jobs
+                       WHERE companyId = ?
+                       AND {normalized_sql('title')} = {normalized_sql('?')}
+                       AND {normalized_sql('location')} = {normalized_sql('?')}"""),
+                    (company_id, item.get('title'), item.get('location'))
                 )
             
             existing_job = cursor.fetchone()
             
+            # Later copies of the same job within a batch only refresh the update columns
             if existing_job:
-                # Update existing job
-                self._update_job(cursor, existing_job[0], item)
-                logger.debug(f"Updated existing job: {item['title']}")
+                updates[existing_job[0]] = self._job_update_params(existing_job[0], item)
             else:
-                # Insert new job
-                self._insert_job(cursor, item)
-                logger.debug(f"Inserted new job: {item['title']}")
-            
-            self.connection.commit()
-            
-        except Exception as e:
-            logger.error(f"Error saving job item: {e}")
-            self.connection.rollback()
-            raise
-        finally:
-            cursor.close()
+                self._merge_job_row(inserts, key, row)
+        
+        if inserts:
+            cursor.executemany(self._sql(self.JOB_INSERT_SQL), list(inserts.values()))
+            logger.debug(f"Inserted {len(inserts)} new jobs")
+        if updates:
+            cursor.executemany(self._sql(self.JOB_UPDATE_SQL), list(updates.values()))
+            logger.debug(f"Updated {len(updates)} existing jobs")
+    
+    def _merge_job_row(self, rows, key, row):
+        """Add a job row under its conflict key, or refresh the update columns of an earlier copy
+        
+        Keeps the first copy's title, company and createdAt, as an upsert of
+        the later copy in its own batch would, so the stored row doesn't
+        depend on DATABASE_BATCH_SIZE.
+        """
+        earlier = rows.get(key)
+        if earlier is None:
+            rows[key] = row
+            return
+        
+        merged = list(earlier)
+        for index in self.JOB_UPSERT_UPDATE_INDEXES:
+            merged[index] = row[index]
+        rows[key] = tuple(merged)
+    
+    def _bulk_upsert_jobs_postgres(self, cursor, rows):
+        """Stage job rows with execute_values and merge them in one statement"""
+        from psycopg2.extras import execute_values
+        
+        columns = ', '.join(self.JOB_COLUMNS)
+        # Session-local staging table, emptied at the end of every transaction
+        cursor.execute(
+            f"""CREATE TEMP TABLE IF NOT EXISTS jobs_staging
+                ON COMMIT DELETE ROWS
+                AS SELECT {columns} FROM jobs WITH NO DATA"""
+        )
+        execute_values(
+            cursor,
+            f"INSERT INTO jobs_staging ({columns}) VALUES %s",
+            rows,
+            page_size=1000
+        )
+        cursor.execute(
+            f"""INSERT INTO jobs ({columns})
+                SELECT {columns} FROM jobs_staging
+                ON CONFLICT (source_site, external_id) DO UPDATE SET {self.JOB_UPSERT_SET_SQL}"""
+        )
     
     def _get_or_create_company(self, company_name):
         """Get existing company ID or create new company"""
         if not company_name:
             return None
         
+        company_id = self.company_cache.get(company_name)
+        if company_id is not None:
+            return company_id
+        
         cursor = self.connection.cursor()
+        slug = company_name.lower().replace(' ', '-').replace('&', 'and')
+        now = datetime.utcnow().isoformat()
+        params = (company_name, slug, 'default-logo.svg', 'South Africa', 1, now, now)
         
         try:
+            if self.native_upsert:
+                # The no-op update makes RETURNING yield the existing row's ID
+                cursor.execute(
+                    self._sql(
+                        self.COMPANY_INSERT_SQL
+                        + f" ON CONFLICT {self.COMPANY_NAME_CONFLICT_SQL} DO UPDATE SET updatedAt = companies.updatedAt"
+                        + " RETURNING id"
+                    ),
+                    params
+                )
+                company_id = cursor.fetchone()[0]
+                self._cache_new_company(company_name, company_id)
+                logger.debug(f"Resolved company: {company_name} (ID: {company_id})")
+                return company_id
+            
             # Check if company exists
-            cursor.execute("SELECT id FROM companies WHERE LOWER(name) = LOWER(?)", (company_name,))
+            cursor.execute(self._sql(self.COMPANY_LOOKUP_SQL), (company_name,))
             result = cursor.fetchone()
             
             if result:
+                self.company_cache.put(company_name, result[0])
                 return result[0]
             
             # Create new company
-            slug = company_name.lower().replace(' ', '-').replace('&', 'and')
-            cursor.execute(
-                """INSERT INTO companies (name, slug, logo, location, openPositions, createdAt, updatedAt)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (company_name, slug, 'default-logo.svg', 'South Africa', 1, 
-                 datetime.utcnow().isoformat(), datetime.utcnow().isoformat())
-            )
+            company_id = self._insert_company(cursor, params)
             
-            company_id = cursor.lastrowid
+            self._cache_new_company(company_name, company_id)
             logger.info(f"Created new company: {company_name} (ID: {company_id})")
             return company_id
-            
+        
         finally:
             cursor.close()
     
-    def _insert_job(self, cursor, item):
-        """Insert new job into database"""
-        cursor.execute(
-            """INSERT INTO jobs (
-                title, description, location, salary, jobType, workMode,
-                companyId, categoryId, isFeatured, source_url, source_site,
-                external_id, apply_url, createdAt, updatedAt
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                item.get('title'),
-                item.get('description'),
-                item.get('location'),
-                item.get('salary'),
-                item.get('job_type', 'Full-time'),
-                item.get('work_mode', 'On-site'),
-                item.get('company_id'),
-                item.get('category_id', 2),  # Default to General Worker
-                item.get('is_featured', False),
-                item.get('source_url'),
-                item.get('source_site'),
-                item.get('external_id'),
-                item.get('apply_url'),
-                datetime.utcnow().isoformat(),
-                datetime.utcnow().isoformat()
-            )
+    def _job_insert_params(self, item):
+        """Build the parameter tuple for inserting a new job"""
+        now = datetime.utcnow().isoformat()
+        return (
+            item.get('title'),
+            item.get('description'),
+            item.get('location'),
+            item.get('salary'),
+            field_value(item, 'job_type', 'Full-time'),
+            field_value(item, 'work_mode', 'On-site'),
+            item.get('company_id'),
+            field_value(item, 'category_id', DEFAULT_CATEGORY),  # Default to General Worker
+            field_value(item, 'is_featured', False),
+            item.get('source_url'),
+            item.get('source_site'),
+            item.get('external_id'),
+            item.get('apply_url'),
+            now,
+            now
         )
     
-    def _update_job(self, cursor, job_id, item):
-        """Update existing job in database"""
-        cursor.execute(
-            """UPDATE jobs SET 
-                description = ?, location = ?, salary = ?, jobType = ?, workMode = ?,
-                isFeatured = ?, source_url = ?, apply_url = ?, updatedAt = ?
-                WHERE id = ?""",
-            (
-                item.get('description'),
-                item.get('location'),
-                item.get('salary'),
-                item.get('job_type', 'Full-time'),
-                item.get('work_mode', 'On-site'),
-                item.get('is_featured', False),
-                item.get('source_url'),
-                item.get('apply_url'),
-                datetime.utcnow().isoformat(),
-                job_id
-            )
+    def _job_update_params(self, job_id, item):
+        """Build the parameter tuple for updating an existing job"""
+        return (
+            item.get('description'),
+            item.get('location'),
+            item.get('salary'),
+            field_value(item, 'job_type', 'Full-time'),
+            field_value(item, 'work_mode', 'On-site'),
+            field_value(item, 'is_featured', False),
+            item.get('source_url'),
+            item.get('apply_url'),
+            datetime.utcnow().isoformat(),
+            job_id
         )
     
-    def _save_company_item(self, item, spider):
+    def _save_company_item(self, cursor, item):
         """Save company item to database"""
-        cursor = self.connection.cursor()
+        now = datetime.utcnow().isoformat()
+        slug = item['name'].lower().replace(' ', '-').replace('&', 'and')
+        insert_params = (
+            item['name'],
+            slug,
+            item.get('logo', 'default-logo.svg'),
+            item.get('location', 'South Africa'),
+            item.get('open_positions', 1),
+            now,
+            now
+        )
+        update_params = (
+            item.get('logo'),
+            item.get('location'),
+            item.get('open_positions'),
+            now
+        )
         
-        try:
-            # Check if company already exists
-            cursor.execute("SELECT id FROM companies WHERE LOWER(name) = LOWER(?)", (item['name'],))
+        if self.native_upsert:
+            cursor.execute(
+                self._sql(
+                    self.COMPANY_INSERT_SQL
+                    + f""" ON CONFLICT {self.COMPANY_NAME_CONFLICT_SQL} DO UPDATE SET
+                    logo = COALESCE(?, companies.logo),
+                    location = COALESCE(?, companies.location),
+                    openPositions = COALESCE(?, companies.openPositions),
+                    updatedAt = ?
+                    RETURNING id"""
+                ),
+                insert_params + update_params
+            )
+            self._cache_new_company(item['name'], cursor.fetchone()[0])
+            logger.debug(f"Upserted company: {item['name']}")
+            return
+        
+        # Check if company already exists
+        company_id = self.company_cache.get(item['name'])
+        if company_id is None:
+            cursor.execute(self._sql(self.COMPANY_LOOKUP_SQL), (item['name'],))
             existing_company = cursor.fetchone()
-            
             if existing_company:
-                # Update existing company
-                cursor.execute(
-                    """UPDATE companies SET 
-                        logo = COALESCE(?, logo),
-                        location = COALESCE(?, location),
-                        openPositions = COALESCE(?, openPositions),
-                        updatedAt = ?
-                        WHERE id = ?""",
-                    (
-                        item.get('logo'),
-                        item.get('location'),
-                        item.get('open_positions'),
-                        datetime.utcnow().isoformat(),
-                        existing_company[0]
-                    )
-                )
-                logger.debug(f"Updated existing company: {item['name']}")
-            else:
-                # Insert new company
-                slug = item['name'].lower().replace(' ', '-').replace('&', 'and')
-                cursor.execute(
-                    """INSERT INTO companies (name, slug, logo, location, openPositions, createdAt, updatedAt)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (
-                        item['name'],
-                        slug,
-                        item.get('logo', 'default-logo.svg'),
-                        item.get('location', 'South Africa'),
-                        item.get('open_positions', 1),
-                        datetime.utcnow().isoformat(),
-                        datetime.utcnow().isoformat()
-                    )
-                )
-                logger.debug(f"Inserted new company: {item['name']}")
-            
-            self.connection.commit()
-            
-        except Exception as e:
-            logger.error(f"Error saving company item: {e}")
-            self.connection.rollback()
-            raise
-        finally:
-            cursor.close()
+                company_id = existing_company[0]
+                self.company_cache.put(item['name'], company_id)
+        
+        if company_id is not None:
+            # Update existing company
+            cursor.execute(
+                self._sql("""UPDATE companies SET
+                    logo = COALESCE(?, logo),
+                    location = COALESCE(?, location),
+                    openPositions = COALESCE(?, openPositions),
+                    updatedAt = ?
+                    WHERE id = ?"""),
+                update_params + (company_id,)
+            )
+            logger.debug(f"Updated existing company: {item['name']}")
+        else:
+            # Insert new company
+            company_id = self._insert_company(cursor, insert_params)
+            self._cache_new_company(item['name'], company_id)
+            logger.debug(f"Inserted new company: {item['name']}")
 
 
 class StatsPipeline:
-    """Pipeline to track scraping statistics"""
+    """Pipeline to track scraping statistics
+    
+    Items reaching this pipeline are counted as scraped. Saved counts and
+    errors are taken from DatabasePipeline's stats once the spider has
+    closed, so they only include items whose database write was committed.
+    Add it after DatabasePipeline in ITEM_PIPELINES.
+    """
     
-    def __init__(self):
+    def __init__(self, crawler_stats=None, file_suffix=''):
+        self.crawler_stats = crawler_stats
+        self.file_suffix = file_suffix
         self.stats = {
             'jobs_scraped': 0,
             'jobs_saved': 0,
@@ -368,23 +1093,33 @@ class StatsPipeline:
             'errors': 0
         }
     
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler.stats, file_suffix=shard_suffix(crawler.settings))
+        # After all pipelines have closed, when the last database batch has been written
+        crawler.signals.connect(pipeline.spider_closed, signal=signals.spider_closed)
+        return pipeline
+    
     def process_item(self, item, spider):
-        if isinstance(item, JobItem):
+        if isinstance(item, JOB_ITEM_CLASSES):
             self.stats['jobs_scraped'] += 1
-            self.stats['jobs_saved'] += 1
         elif isinstance(item, CompanyItem):
             self.stats['companies_scraped'] += 1
-            self.stats['companies_saved'] += 1
         
         return item
     
-    def close_spider(self, spider):
+    def spider_closed(self, spider):
         """Log statistics when spider closes"""
+        if self.crawler_stats:
+            self.stats['jobs_saved'] = self.crawler_stats.get_value('database/jobs_saved', 0)
+            self.stats['companies_saved'] = self.crawler_stats.get_value('database/companies_saved', 0)
+            self.stats['errors'] = self.crawler_stats.get_value('database/items_failed', 0)
+        
         logger.info("Scraping Statistics:")
         for key, value in self.stats.items():
             logger.info(f"  {key}: {value}")
         
         # Save stats to file
-        stats_file = f"scrapy_stats_{spider.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        stats_file = f"scrapy_stats_{spider.name}{self.file_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         with open(stats_file, 'w') as f:
             json.dump(self.stats, f, indent=2)
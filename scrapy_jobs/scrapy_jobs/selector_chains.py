@@ -0,0 +1,128 @@
+import logging
+from collections import Counter
+
+from lxml import etree
+from parsel.csstranslator import css2xpath
+
+logger = logging.getLogger(__name__)
+
+# Gumtree selectors per field, as (variant name, CSS selector) in fallback
+# order. Variants that stop matching after a redesign keep their place here,
+# SelectorRegistry learns which one currently hits.
+GUMTREE_SELECTORS = {
+    'job_links': [
+        ('related_ad_title', 'a.related-ad-title::attr(href)'),
+        ('listing_link', '.listing-link::attr(href)'),
+        ('testid', '[data-testid="listing-link"]::attr(href)'),
+    ],
+    'next_page': [
+        ('aria_label', 'a[aria-label="Next page"]::attr(href)'),
+        ('pagination_next', '.pagination-next::attr(href)'),
+    ],
+    'title': [
+        ('my_ad_title', 'h1.myAdTitle::text'),
+        ('testid', '[data-testid="ad-title"]::text'),
+        ('ad_title', '.ad-title::text'),
+    ],
+    'description': [
+        ('ad_description', '.ad-description p::text, .ad-description div::text, .ad-description::text'),
+        ('testid', '[data-testid="ad-description"] *::text'),
+    ],
+    'location': [
+        ('ad_location', '.ad-location::text'),
+        ('testid', '[data-testid="ad-location"]::text'),
+    ],
+}
+
+
+class SelectorChain:
+    """Selector variants for one field, the current winner tried first"""
+    
+    def __init__(self, field, variants):
+        self.field = field
+        # (name, CSS, compiled XPath), compiled once instead of on every page
+        self.variants = [(name, css, etree.XPath(css2xpath(css), smart_strings=False)) for name, css in variants]
+        self.order = list(range(len(self.variants)))
+        # Variant that hit while the winner missed, and how many pages in a row it did
+        self.challenger = None
+        self.challenger_wins = 0
+    
+    @property
+    def winner(self):
+        return self.variants[self.order[0]][0]
+
+
+class SelectorRegistry:
+    """Extract page fields with fallback chains of CSS selectors, learning which variant hits
+    
+    Each field tries its variants starting with the current winner. When the
+    winner misses and another variant hits on ``promote_after`` pages in a
+    row, that variant becomes the winner, so after a site redesign the dead
+    selectors stop being evaluated on every page, while a single odd page
+    doesn't reorder the chain. ``on_change(field, old, new)`` is called when
+    a field's winner changes, an early sign of a layout change. Evaluations
+    and misses before a hit (wasted evaluations) are counted.
+    """
+    
+    def __init__(self, chains, promote_after=3, on_change=None):
+        self.chains = {field: SelectorChain(field, variants) for field, variants in chains.items()}
+        self.promote_after = promote_after
+        self.on_change = on_change
+        self.hits = Counter()
+        self.evaluations = 0
+        self.wasted = 0
+        self.changes = Counter()
+    
+    def get(self, response, field):
+        """First value of ``field`` from the first variant that matches, or None"""
+        values = self.getall(response, field)
+        return values[0] if values else None
+    
+    def getall(self, response, field):
+        """All values of ``field`` from the first variant that matches"""
+        chain = self.chains[field]
+        root = response.selector.root
+        for position, index in enumerate(chain.order):
+            name, _, xpath = chain.variants[index]
+            self.evaluations += 1
+            values = xpath(root)
+            if values:
+                self.hits[f'{field}/{name}'] += 1
+                self.wasted += position
+                if position:
+                    self._fallback_hit(chain, index)
+                else:
+                    chain.challenger = None
+                    chain.challenger_wins = 0
+                return values
+        # Nothing matched: the field is missing from this page, not a reason to reorder
+        return []
+    
+    def _fallback_hit(self, chain, index):
+        if chain.challenger != index:
+            chain.challenger = index
+            chain.challenger_wins = 0
+        chain.challenger_wins += 1
+        if chain.challenger_wins < self.promote_after:
+            return
+        
+        old = chain.winner
+        chain.order.remove(index)
+        chain.order.insert(0, index)
+        chain.challenger = None
+        chain.challenger_wins = 0
+        self.changes[chain.field] += 1
+        logger.debug(f"Selector for {chain.field} switched from {old} to {chain.winner}")
+        if self.on_change:
+            self.on_change(chain.field, old, chain.winner)
+    
+    def winners(self):
+        return {field: chain.winner for field, chain in self.chains.items()}
+    
+    def hit_counts(self):
+        """Hits per variant as {'field/variant': count}, including variants never hit"""
+        return {
+            f'{field}/{name}': self.hits[f'{field}/{name}']
+            for field, chain in self.chains.items()
+            for name, _, _ in chain.variants
+        }
@@ -1,11 +1,16 @@
+import os
 import scrapy
 from scrapy import Request
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 import re
 from datetime import datetime, timedelta
 from itemloaders import ItemLoader
 
-from scrapy_jobs.items import JobItem, CompanyItem
+from scrapy_jobs.dupefilters import FingerprintTable
+from scrapy_jobs.items import JobItem, CompanyItem, JobSeenItem, JobRecordLoader, register_item_adapters
+from scrapy_jobs.matching import JOB_KEYWORD_MATCHER
+from scrapy_jobs.extraction import JOB_EXTRACTOR
+from scrapy_jobs.selector_chains import GUMTREE_SELECTORS, SelectorRegistry
 
 
 class GumtreeJobsSpider(scrapy.Spider):
@@ -32,6 +37,20 @@ class GumtreeJobsSpider(scrapy.Spider):
         'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     
+    # Listing page paths end in p<N>, e.g. /s-jobs/v1c8p3
+    LISTING_PAGE_RE = re.compile(r'^(?P<prefix>/.*p)(?P<page>\d+)$')
+    
+    # This worker's shard in a sharded crawl, see start_requests
+    shard_index = 0
+    
+    # Load jobs into slotted JobRecords instead of JobItems (JOB_RECORDS_FAST_PATH)
+    job_records = False
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Selector fallbacks for links, title, description, location and pagination
+        self.selectors = SelectorRegistry(GUMTREE_SELECTORS, on_change=self.selector_changed)
+    
     def start_requests(self):
         """Generate initial requests"""
         headers = {
@@ -42,25 +61,58 @@ class GumtreeJobsSpider(scrapy.Spider):
             'Upgrade-Insecure-Requests': '1',
         }
         
-        for url in self.start_urls:
+        # 'next' follows the Next page link, 'window' keeps a window of p<N> pages in flight
+        self.pagination_mode = self.settings.get('PAGINATION_MODE', 'next')
+        self.pagination_window = max(self.settings.getint('PAGINATION_WINDOW', 5), 1)
+        self.pagination_max_pages = self.settings.getint('PAGINATION_MAX_PAGES', 200)
+        self.job_records = self.settings.getbool('JOB_RECORDS_FAST_PATH', self.job_records)
+        if self.job_records:
+            register_item_adapters()
+        # Per category: highest page scheduled, and the page at which the category stops
+        self.pages_scheduled = {}
+        self.stop_pages = {}
+        self.known_external_ids = None
+        if self.pagination_mode == 'window' and self.settings.getbool('PAGINATION_EARLY_STOP', True):
+            self.known_external_ids = self.load_known_external_ids()
+        
+        # In a sharded crawl each worker starts its share of the categories and keeps
+        # their listing pages, as it holds their pagination state
+        self.shard_index = self.settings.getint('FRONTIER_SHARD_INDEX', 0)
+        shards = max(self.settings.getint('FRONTIER_SHARDS', 1), 1)
+        
+        for url in self.start_urls[self.shard_index::shards]:
+            listing_page = self.LISTING_PAGE_RE.match(urlparse(url).path)
+            if self.pagination_mode == 'window' and listing_page:
+                category = listing_page.group('prefix')
+                start_page = int(listing_page.group('page'))
+                self.pages_scheduled[category] = start_page - 1
+                yield from self.schedule_listing_pages(url, category, start_page, headers)
+                continue
+            
             yield Request(
                 url=url,
                 headers=headers,
                 callback=self.parse_job_listings,
-                dont_filter=True
+                dont_filter=True,
+                meta={'frontier_shard': self.shard_index}
             )
     
     def parse_job_listings(self, response):
         """Parse job listing pages"""
         
         # Extract job links - Gumtree uses various selectors
-        job_links = response.css('a.related-ad-title::attr(href)').getall()
-        if not job_links:
-            job_links = response.css('.listing-link::attr(href)').getall()
-        if not job_links:
-            job_links = response.css('[data-testid=\"listing-link\"]::attr(href)').getall()
+        job_links = self.selectors.getall(response, 'job_links')
         
         self.logger.info(f'Found {len(job_links)} job links on {response.url}')
+        
+        category = response.meta.get('listing_category')
+        if category is not None:
+            page = response.meta['listing_page']
+            if not job_links or self.page_is_known(response.url, job_links):
+                # Past the last page, or caught up with the previous run
+                self.stop_category(category, page, 'no job links' if not job_links else 'only known jobs')
+                return
+        
         # Follow each job link
         for job_link in job_links:
             job_url = urljoin(response.url, job_link)
@@ -70,10 +122,13 @@ class GumtreeJobsSpider(scrapy.Spider):
                 meta={'source_site': 'gumtree'}
             )
         
+        if category is not None:
+            # Keep the window of listing pages full
+            yield from self.schedule_listing_pages(response.url, category, page + 1)
+            return
+        
         # Follow pagination
-        next_page = response.css('a[aria-label=\"Next page\"]::attr(href)').get()
-        if not next_page:
-            next_page = response.css('.pagination-next::attr(href)').get()
+        next_page = self.selectors.get(response, 'next_page')
         
         if next_page:
             next_url = urljoin(response.url, next_page)
@@ -81,39 +136,120 @@ class GumtreeJobsSpider(scrapy.Spider):
             yield Request(
                 url=next_url,
                 callback=self.parse_job_listings,
-                dont_filter=True
+                dont_filter=True,
+                meta={'frontier_shard': self.shard_index}
             )
     
+    def schedule_listing_pages(self, url, category, first_page, headers=None):
+        """Request listing pages up to a window ahead of first_page"""
+        last_page = min(
+            first_page + self.pagination_window - 1,
+            self.stop_pages.get(category, self.pagination_max_pages + 1) - 1
+        )
+        parsed = urlparse(url)
+        
+        for page in range(self.pages_scheduled[category] + 1, last_page + 1):
+            self.pages_scheduled[category] = page
+            self.crawler.stats.inc_value('pagination/pages_scheduled')
+            yield Request(
+                url=parsed._replace(path=f'{category}{page}', query='', fragment='').geturl(),
+                headers=headers,
+                callback=self.parse_job_listings,
+                dont_filter=True,
+                meta={'listing_category': category, 'listing_page': page, 'frontier_shard': self.shard_index}
+            )
+    
+    def page_is_known(self, url, job_links):
+        """True if every ad on a listing page is already in the database"""
+        if not self.known_external_ids:
+            return False
+        
+        for job_link in job_links:
+            external_id = self.extract_external_id(urljoin(url, job_link))
+            if not external_id or int(external_id) >= 2 ** 64 or int(external_id) not in self.known_external_ids:
+                return False
+        return True
+    
+    def stop_category(self, category, page, reason):
+        if page < self.stop_pages.get(category, self.pagination_max_pages + 1):
+            self.stop_pages[category] = page
+            self.crawler.stats.inc_value('pagination/early_stops')
+            self.logger.info(f'Stopping pagination of {category} at page {page} ({reason})')
+    
+    def load_known_external_ids(self):
+        """Load the external IDs of Gumtree jobs already in the database"""
+        database_url = self.settings.get('DATABASE_URL') or os.getenv('DATABASE_URL', 'sqlite:///database.db')
+        query = "SELECT external_id FROM jobs WHERE source_site = 'gumtree' AND external_id IS NOT NULL"
+        
+        try:
+            if database_url.startswith('sqlite'):
+                import sqlite3
+                connection = sqlite3.connect(database_url.replace('sqlite:///', ''))
+            else:
+                import psycopg2
+                connection = psycopg2.connect(database_url)
+            
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query)
+                rows = cursor.fetchall()
+            finally:
+                connection.close()
+        except Exception as e:
+            self.logger.warning(f'Could not load known job IDs, early stop disabled: {e}')
+            return None
+        
+        # Gumtree IDs are numeric, so a compact integer table is enough
+        known_ids = FingerprintTable(len(rows))
+        for (external_id,) in rows:
+            if external_id and external_id.isdigit() and 0 < int(external_id) < 2 ** 64:
+                known_ids.add(int(external_id))
+        
+        self.logger.info(f'Loaded {len(known_ids)} known job IDs for early stop')
+        return known_ids
+    
     def parse_job_detail(self, response):
         """Parse individual job detail pages"""
         
-        loader = ItemLoader(item=JobItem(), response=response)
+        # 304 Not Modified: the ad is unchanged since it was last parsed and saved
+        if response.meta.get('http_cache_revalidated'):
+            external_id = self.extract_external_id(response.url)
+            if external_id:
+                self.crawler.stats.inc_value('jobs/still_live')
+                yield JobSeenItem(
+                    source_site='gumtree',
+                    external_id=external_id,
+                    source_url=response.url,
+                    seen_at=datetime.utcnow().isoformat()
+                )
+                return
+        
+        if self.job_records:
+            # Same cleaning functions as JobItem's processors, applied directly
+            loader = JobRecordLoader()
+        else:
+            loader = ItemLoader(item=JobItem(), response=response)
         
         # Basic job information
-        title = response.css('h1.myAdTitle::text').get()
-        if not title:
-            title = response.css('[data-testid="ad-title"]::text').get()
-        if not title:
-            title = response.css('.ad-title::text').get()
+        title = self.selectors.get(response, 'title')
         
         loader.add_value('title', title)
         
         # Job description
-        description_parts = response.css('.ad-description p::text, .ad-description div::text, .ad-description::text').getall()
-        if not description_parts:
-            description_parts = response.css('[data-testid="ad-description"] *::text').getall()
+        description_parts = self.selectors.getall(response, 'description')
         
         description = ' '.join(description_parts).strip()
         loader.add_value('description', description)
         
+        # One scan of the description finds both the salary and a company name
+        extracted = JOB_EXTRACTOR.scan(description)
+        
         # Company information
-        company_name = self.extract_company_name(response, description)
+        company_name = self.extract_company_name(response, description, extracted)
         loader.add_value('company_name', company_name)
         
         # Location
-        location = response.css('.ad-location::text').get()
-        if not location:
-            location = response.css('[data-testid="ad-location"]::text').get()
+        location = self.selectors.get(response, 'location')
         if not location:
             # Try to extract from breadcrumbs or other location indicators
             location_breadcrumb = response.css('.breadcrumb li:last-child::text').get()
@@ -123,7 +259,7 @@ class GumtreeJobsSpider(scrapy.Spider):
         loader.add_value('location', location or 'South Africa')
         
         # Extract salary if mentioned in description
-        salary = self.extract_salary(description)
+        salary = self.extract_salary(description, extracted)
         if salary:
             loader.add_value('salary', salary)
         
@@ -155,74 +291,46 @@ class GumtreeJobsSpider(scrapy.Spider):
         
         yield loader.load_item()
     
-    def extract_company_name(self, response, description):
+    def extract_company_name(self, response, description, extracted=None):
         """Extract company name from various sources"""
         # Try to get from seller info
         company = response.css('.vip-seller-name::text, .seller-name::text').get()
         
         if not company:
-            # Try to extract from description using common patterns
-            company_patterns = [
-                r'Company[:\s]+([A-Za-z\s&]+)',
-                r'Employer[:\s]+([A-Za-z\s&]+)',
-                r'([A-Za-z\s&]+)\s+is\s+looking\s+for',
-                r'Join\s+([A-Za-z\s&]+)',
-                r'([A-Za-z\s&]+)\s+seeks?',
-            ]
-            
-            for pattern in company_patterns:
-                match = re.search(pattern, description, re.IGNORECASE)
-                if match:
-                    company = match.group(1).strip()
-                    break
+            # Try to extract from description using common patterns (see scrapy_jobs.extraction)
+            if extracted is None:
+                extracted = JOB_EXTRACTOR.scan(description, fields=('company',))
+            if 'company' in extracted:
+                company = extracted['company'].value
         
         if not company or len(company) < 2:
             company = "Private Employer"
         
         # Clean up company name
-        company = re.sub(r'\s+', ' ', company).strip()
+        company = ' '.join(company.split())
         return company[:100]  # Limit length
     
-    def extract_salary(self, text):
+    def extract_salary(self, text, extracted=None):
         """Extract salary information from text"""
         if not text:
             return None
         
-        # South African salary patterns
-        salary_patterns = [
-            r'R\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?(?:\s*[-–]\s*R?\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?)?(?:\s*per\s*month|pm|/month)?',
-            r'\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?\s*[-–]\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?(?:\s*per\s*month|pm)',
-            r'salary[:\s]*R?\s*\d{1,3}[,\s]*\d{3}(?:[,\s]*\d{3})?',
-        ]
-        
-        for pattern in salary_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(0).strip()
+        # South African salary patterns (see scrapy_jobs.extraction)
+        if extracted is None:
+            extracted = JOB_EXTRACTOR.scan(text, fields=('salary',))
+        if 'salary' in extracted:
+            return extracted['salary'].value
         
         return None
     
     def classify_job_type(self, title, description):
         """Classify job type and work mode based on title and description"""
-        text = f"{title} {description}".lower() if title and description else ""
-        
-        # Job type classification
-        if any(word in text for word in ['part time', 'part-time', 'weekend', 'casual']):
-            job_type = 'Part-time'
-        elif any(word in text for word in ['contract', 'temporary', 'temp', 'fixed term']):
-            job_type = 'Contract'
-        elif any(word in text for word in ['internship', 'intern', 'learnership']):
-            job_type = 'Internship'
-        else:
-            job_type = 'Full-time'
+        text = f"{title} {description}" if title and description else ""
         
-        # Work mode classification
-        if any(word in text for word in ['remote', 'work from home', 'wfh', 'online']):
-            work_mode = 'Remote'
-        elif any(word in text for word in ['hybrid', 'flexible']):
-            work_mode = 'Hybrid'
-        else:
-            work_mode = 'On-site'
+        # One scan finds job type and work mode keywords (see scrapy_jobs.matching)
+        hits = JOB_KEYWORD_MATCHER.match(text)
+        job_type = JOB_KEYWORD_MATCHER.first_label(hits, 'job_type', default='Full-time')
+        work_mode = JOB_KEYWORD_MATCHER.first_label(hits, 'work_mode', default='On-site')
         
         return job_type, work_mode
     
@@ -259,7 +367,8 @@ class GumtreeJobsSpider(scrapy.Spider):
     def extract_external_id(self, url):
         """Extract external ID from Gumtree URL"""
         # Gumtree URLs typically contain an ID like: /a-jobs/city/ad-title/1001234567890
-        match = re.search(r'/(\d{10,})/?$', url)
+        # Match on the path only so tracking parameters don't hide the ID
+        match = re.search(r'/(\d{10,})/?$', urlparse(url).path)
         if match:
             return match.group(1)
         return None
@@ -267,3 +376,26 @@ class GumtreeJobsSpider(scrapy.Spider):
     def parse(self, response):
         """Default parse method - delegate to parse_job_listings"""
         return self.parse_job_listings(response)
+    
+    def selector_changed(self, field, old, new):
+        """A different selector now finds ``field``, usually because the page layout changed"""
+        self.logger.warning(f'Selector for {field} switched from {old} to {new}, the page layout may have changed')
+        crawler = getattr(self, 'crawler', None)
+        if crawler:
+            crawler.stats.inc_value(f'selectors/changes/{field}')
+            crawler.stats.set_value(f'selectors/winner/{field}', new)
+    
+    def closed(self, reason):
+        """Record extraction pattern and selector hits so dead ones can be pruned"""
+        for name, count in self.selectors.hit_counts().items():
+            self.crawler.stats.set_value(f'selectors/hits/{name}', count)
+        self.crawler.stats.set_value('selectors/evaluations', self.selectors.evaluations)
+        self.crawler.stats.set_value('selectors/wasted_evaluations', self.selectors.wasted)
+        
+        for name, count in JOB_EXTRACTOR.hit_counts().items():
+            self.crawler.stats.set_value(f'extraction/hits/{name}', count)
+        self.crawler.stats.set_value('extraction/scans', JOB_EXTRACTOR.scans)
+        
+        dead_patterns = JOB_EXTRACTOR.dead_patterns()
+        if dead_patterns and JOB_EXTRACTOR.scans:
+            self.logger.info(f"Extraction patterns without hits: {', '.join(dead_patterns)}")